@@ -0,0 +1,137 @@
+"""Reads and writes the metadata sidecars of the generated architectures.
+
+For each architecture <name>.xml, >>arc_gen.py<< writes <name>_meta.json, holding
+the channel composition, padding results, tile and metal dimensions, multiplexer-size
+histograms, measured delays, RR-graph node and edge counts, channel widths,
+content hashes of the produced files, the generator settings, and the number and
+duration of the HSPICE simulations and of the whole generation. Consumers
+read the sidecar instead of scraping the padding log, the architecture,
+or the RR-graph. If the sidecar is missing (architectures generated before it
+was introduced), they fall back to scraping.
+"""
+
+import os
+import json
+import hashlib
+
+##########################################################################
+def get_filename(arc_file):
+    """Returns the name of the sidecar of the architecture.
+
+    Parameters
+    ----------
+    arc_file : str
+        Architecture file name, or any of the file names derived from it
+        (RR-graph, RR-graph archive or header, or padding log).
+
+    Returns
+    -------
+    str
+        Sidecar file name.
+    """
+
+    for suffix in ("_rr.xml.lz4", "_rr.xml.zst", "_rr_header.xml.lz4", "_rr.xml", "_padding.log", ".xml"):
+        if arc_file.endswith(suffix):
+            return arc_file[:-len(suffix)] + "_meta.json"
+
+    return arc_file + "_meta.json"
+##########################################################################
+
+##########################################################################
+def load(arc_file):
+    """Loads the sidecar of the architecture.
+
+    Parameters
+    ----------
+    arc_file : str
+        Architecture file name (see >>get_filename<<).
+
+    Returns
+    -------
+    Dict[str, various]
+        Metadata or None if there is no sidecar.
+    """
+
+    try:
+        with open(get_filename(arc_file), "r") as inf:
+            return json.load(inf)
+    except:
+        return None
+##########################################################################
+
+##########################################################################
+def update(arc_file, fields):
+    """Adds the fields to the sidecar of the architecture, creating it if needed.
+    The sidecar is replaced atomically.
+
+    Parameters
+    ----------
+    arc_file : str
+        Architecture file name (see >>get_filename<<).
+    fields : Dict[str, various]
+        Fields to add or overwrite.
+
+    Returns
+    -------
+    None
+    """
+
+    meta = load(arc_file) or {}
+    meta.update(fields)
+
+    filename = get_filename(arc_file)
+    with open(filename + ".tmp", "w") as outf:
+        json.dump(meta, outf, indent = 1, sort_keys = True)
+    os.rename(filename + ".tmp", filename)
+##########################################################################
+
+##########################################################################
+def get_area(meta):
+    """Returns the tile area, determined by the larger of the active and metal dimensions.
+
+    Parameters
+    ----------
+    meta : Dict[str, various]
+        Metadata.
+
+    Returns
+    -------
+    float
+        Area in um^2.
+    """
+
+    tile = meta["tile"]
+
+    return max(tile["active_w"], tile["metal_w"]) * max(tile["active_h"], tile["metal_h"]) / 1000000.0
+##########################################################################
+
+##########################################################################
+def hash_file(filename, chunk = 1 << 20):
+    """Returns the SHA-1 digest of the file content.
+
+    Parameters
+    ----------
+    filename : str
+        File name.
+    chunk : Optional[int], default = 1 MB
+        Read size.
+
+    Returns
+    -------
+    str
+        Hexadecimal digest or None if the file does not exist.
+    """
+
+    if not os.path.exists(filename):
+        return None
+
+    sha = hashlib.sha1()
+    with open(filename, "rb") as inf:
+        while True:
+            data = inf.read(chunk)
+            if not data:
+                break
+            sha.update(data)
+
+    return sha.hexdigest()
+##########################################################################
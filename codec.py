@@ -0,0 +1,287 @@
+"""Compression codecs of the RR-graph archives.
+
+lz4 (the default) compresses and decompresses fastest. zstd compresses further, using
+all cores (-T0), optionally with a dictionary trained on a sample of the RR-graphs
+of a campaign (see >>train<<), which captures the structure they share (e.g., the
+tile template). The codec of an archive is determined by its suffix. As zstd frames
+record only the identifier of their dictionary, the dictionary must be stored next
+to the archives, as >>dict_filename<<, where the decompression picks it up.
+"""
+
+import os
+import subprocess
+
+codecs = ["lz4", "zstd"]
+suffixes = {"lz4" : ".lz4", "zstd" : ".zst"}
+
+dict_filename = "rr.zdict"
+
+##########################################################################
+def get_codec(archive):
+    """Returns the codec of the archive.
+
+    Parameters
+    ----------
+    archive : str
+        Archive file name.
+
+    Returns
+    -------
+    str
+        Codec or None if the suffix is not known.
+    """
+
+    for codec in codecs:
+        if archive.endswith(suffixes[codec]):
+            return codec
+
+    return None
+##########################################################################
+
+##########################################################################
+def strip_suffix(archive):
+    """Returns the name of the decompressed file.
+
+    Parameters
+    ----------
+    archive : str
+        Archive file name.
+
+    Returns
+    -------
+    str
+        File name without the codec suffix.
+    """
+
+    codec = get_codec(archive)
+    if codec is None:
+        return archive
+
+    return archive[:-len(suffixes[codec])]
+##########################################################################
+
+##########################################################################
+def get_archive(filename):
+    """Returns the archive of the file, with any codec.
+
+    Parameters
+    ----------
+    filename : str
+        Decompressed file name (e.g., magic_T4_N8_W15_W13_H13_rr.xml).
+
+    Returns
+    -------
+    str
+        Name of the existing archive, or of the lz4 one if there is none.
+    """
+
+    for codec in codecs:
+        if os.path.exists(filename + suffixes[codec]):
+            return filename + suffixes[codec]
+
+    return filename + suffixes["lz4"]
+##########################################################################
+
+##########################################################################
+def get_dictionary(archive):
+    """Returns the dictionary stored next to the archive.
+
+    Parameters
+    ----------
+    archive : str
+        Archive file name.
+
+    Returns
+    -------
+    str
+        Dictionary file name or None if there is none.
+    """
+
+    dictionary = os.path.join(os.path.dirname(os.path.abspath(archive)), dict_filename)
+    if get_codec(archive) == "zstd" and os.path.exists(dictionary):
+        return dictionary
+
+    return None
+##########################################################################
+
+##########################################################################
+def get_compress_cmd(src, dst, codec = "lz4", level = None, dictionary = None, threads = 0):
+    """Returns the command compressing a file.
+
+    Parameters
+    ----------
+    src : str
+        Input file name (- for the standard input).
+    dst : str
+        Archive file name.
+    codec : Optional[str], default = "lz4"
+        Codec.
+    level : Optional[int], default = None
+        Compression level. The default of the codec if not specified.
+    dictionary : Optional[str], default = None
+        Dictionary file name (zstd only).
+    threads : Optional[int], default = 0
+        Number of compression threads (zstd only). 0 uses all cores.
+
+    Returns
+    -------
+    List[str]
+        Command.
+    """
+
+    level = ["-%d" % level] if level is not None else []
+    if codec == "zstd":
+        return ["zstd", "-q", "-f", "-T%d" % threads] + level\
+             + (["-D", dictionary] if dictionary is not None else []) + [src, "-o", dst]
+
+    return ["lz4", "-q", "-f"] + level + [src, dst]
+##########################################################################
+
+##########################################################################
+def get_decompress_cmd(src, dst = '-'):
+    """Returns the command decompressing an archive.
+
+    Parameters
+    ----------
+    src : str
+        Archive file name.
+    dst : Optional[str], default = '-'
+        Output file name (- for the standard output).
+
+    Returns
+    -------
+    List[str]
+        Command.
+    """
+
+    if get_codec(src) == "zstd":
+        dictionary = get_dictionary(src)
+        return ["zstd", "-d", "-q", "-f"] + (["-D", dictionary] if dictionary is not None else [])\
+             + (["-c", src] if dst == '-' else [src, "-o", dst])
+
+    return ["lz4", "-d", "-q", "-f"] + (["-c", src] if dst == '-' else [src, dst])
+##########################################################################
+
+##########################################################################
+def compress(src, dst, codec = None, level = None, dictionary = None, remove = False):
+    """Compresses a file.
+
+    Parameters
+    ----------
+    src : str
+        Input file name.
+    dst : str
+        Archive file name.
+    codec : Optional[str], default = None
+        Codec. Determined from the suffix of >>dst<< if not specified.
+    level : Optional[int], default = None
+        Compression level.
+    dictionary : Optional[str], default = None
+        Dictionary file name (zstd only).
+    remove : Optional[bool], default = False
+        Removes the input once compressed.
+
+    Returns
+    -------
+    bool
+        True if successful.
+    """
+
+    if codec is None:
+        codec = get_codec(dst) or "lz4"
+    if subprocess.call(get_compress_cmd(src, dst, codec, level, dictionary)):
+        return False
+    if remove:
+        os.remove(src)
+
+    return True
+##########################################################################
+
+##########################################################################
+def decompress(src, dst):
+    """Decompresses an archive.
+
+    Parameters
+    ----------
+    src : str
+        Archive file name.
+    dst : str
+        Output file name.
+
+    Returns
+    -------
+    bool
+        True if successful.
+    """
+
+    return not subprocess.call(get_decompress_cmd(src, dst))
+##########################################################################
+
+##########################################################################
+def open_decompressed(src):
+    """Starts decompressing an archive as a stream.
+
+    Parameters
+    ----------
+    src : str
+        Archive file name.
+
+    Returns
+    -------
+    subprocess.Popen
+        Decompressor, whose standard output is the content.
+    """
+
+    return subprocess.Popen(get_decompress_cmd(src), stdout = subprocess.PIPE)
+##########################################################################
+
+##########################################################################
+def open_compressed(dst, codec = None, dictionary = None):
+    """Starts compressing a stream into an archive.
+
+    Parameters
+    ----------
+    dst : str
+        Archive file name.
+    codec : Optional[str], default = None
+        Codec. Determined from the suffix of >>dst<< if not specified.
+    dictionary : Optional[str], default = None
+        Dictionary file name (zstd only).
+
+    Returns
+    -------
+    subprocess.Popen
+        Compressor, whose standard input is to be written.
+    """
+
+    if codec is None:
+        codec = get_codec(dst) or "lz4"
+
+    return subprocess.Popen(get_compress_cmd('-', dst, codec, dictionary = dictionary), stdin = subprocess.PIPE)
+##########################################################################
+
+##########################################################################
+def train(samples, dictionary, size = 112640, block_size = 131072):
+    """Trains a zstd dictionary.
+
+    Parameters
+    ----------
+    samples : List[str]
+        Decompressed sample files (e.g., RR-graphs of the campaign).
+    dictionary : str
+        Dictionary file name.
+    size : Optional[int], default = 112640
+        Maximum dictionary size in bytes (the zstd default).
+    block_size : Optional[int], default = 131072
+        The samples are cut into blocks of this size, as zstd needs
+        many small samples rather than a few large files.
+
+    Returns
+    -------
+    bool
+        True if successful.
+    """
+
+    return not subprocess.call(["zstd", "-q", "-f", "--train", "-B%d" % block_size] + list(samples)\
+                               + ["-o", dictionary, "--maxdict=%d" % size])
+##########################################################################
@@ -0,0 +1,533 @@
+"""Live status of a running campaign, served over HTTP on localhost by the runner
+(see >>runner_scripts/run_magic.py --status_port<<).
+
+The pools of parallel jobs run in the child processes of the runner
+(>>generate_files_for_magic_formula.py<< and >>run_benchmarks.py<<). Each pool writes its
+state to a file in the status directory, whose path the runner passes to its children
+through the CAMPAIGN_STATUS_DIR environment variable (see >>parallelize.Parallel.write_status<<).
+On each request, the status is assembled from these files, the checkpoint of the runner,
+the results databases of the log directories (see >>results_db.py<<), and the entries
+appended to the runtime history and to the event log of the result cache since the runner started.
+
+Two endpoints are served:
+/ : a page refreshing itself every >>refresh_interval<< seconds.
+/status.json : the same status as JSON.
+
+Stages are "spice" (architectures measured with SPICE, on the HSPICE pool), "generate"
+(the other grid sizes, inheriting the measured delays), and "vpr". The SPICE hit rate
+is the fraction of the architectures that did not need to be measured, either because
+they already existed, or because they inherited the delays. The ETA covers the stages
+currently running, extrapolating their throughput so far.
+"""
+
+import os
+import time
+import json
+import itertools
+import threading
+
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import setenv
+import checkpoint
+import results_db
+import runtime_history
+import result_cache
+
+status_dir_var = "CAMPAIGN_STATUS_DIR"
+
+default_dir = "campaign_status/"
+
+stages = ["spice", "generate", "vpr"]
+
+pools = {"spice" : "hspice", "generate" : "vpr", "vpr" : "vpr"}
+#Stage -> pool of slots on which its jobs run.
+
+min_interval = 2
+#Seconds during which a collected status is served again, instead of being collected anew.
+
+refresh_interval = 10
+
+max_failures = 20
+#Number of architectures with the most failures that are listed.
+
+pool_ids = itertools.count()
+#Distinguishes the pools run one after the other by the same process.
+
+##########################################################################
+def init_dir(status_dir = default_dir):
+    """Empties the status directory and passes it to the child processes.
+
+    Parameters
+    ----------
+    status_dir : Optional[str], default = default_dir
+        Status directory.
+
+    Returns
+    -------
+    str
+        Absolute path of the status directory.
+    """
+
+    status_dir = os.path.abspath(status_dir)
+    os.system("rm -rf %s" % status_dir)
+    os.makedirs(status_dir)
+    os.environ[status_dir_var] = status_dir
+
+    return status_dir
+##########################################################################
+
+##########################################################################
+def get_pool_filename(stage):
+    """Returns the status file of a new pool of this process.
+
+    Parameters
+    ----------
+    stage : str
+        Stage run by the pool (see >>stages<<).
+
+    Returns
+    -------
+    str
+        Status file name. None if no status page is served.
+    """
+
+    status_dir = os.environ.get(status_dir_var, None)
+    if not status_dir or not os.path.isdir(status_dir):
+        return None
+
+    return os.path.join(status_dir, "%s_%d_%d.json" % (stage, os.getpid(), next(pool_ids)))
+##########################################################################
+
+##########################################################################
+def read_new_lines(filename, offset):
+    """Reads the complete lines appended to the file after the offset.
+
+    Parameters
+    ----------
+    filename : str
+        File name.
+    offset : int
+        Offset from which to read.
+
+    Returns
+    -------
+    List[str]
+        Lines.
+    int
+        Offset after the last complete line.
+    """
+
+    try:
+        with open(filename, "r") as inf:
+            inf.seek(offset)
+            txt = inf.read()
+    except IOError:
+        return [], offset
+    txt = txt[:txt.rfind("\n") + 1]
+    #A partially written line is read on the next call.
+
+    return txt.splitlines(), offset + len(txt)
+##########################################################################
+
+##########################################################################
+class Collector(object):
+    """Assembles the status of a campaign.
+
+    Parameters
+    ----------
+    name : str
+        Campaign name.
+    state_file : str
+        Checkpoint of the runner (see >>checkpoint.py<<).
+    log_dirs : List[str]
+        Log directories of the VPR runs.
+    status_dir : str
+        Status directory (see >>init_dir<<).
+    result_cache_dir : Optional[str], default = None
+        Result-cache directory (see >>result_cache.py<<), if used.
+    """
+
+    #------------------------------------------------------------------------#
+    def __init__(self, name, state_file, log_dirs, status_dir, result_cache_dir = None):
+        """Constructor of the Collector class.
+        """
+
+        self.name = name
+        self.state_file = state_file
+        self.log_dirs = log_dirs
+        self.status_dir = status_dir
+        self.started = time.time()
+
+        self.offsets = {}
+        #File -> offset up to which it has been read.
+        self.files = {"history" : runtime_history.history_filename}
+        if result_cache_dir is not None:
+            self.files["result"] = os.path.join(result_cache_dir, result_cache.events_filename)
+        for filename in self.files.values():
+            for f in runtime_history.get_filenames(filename):
+                self.offsets[f] = os.path.getsize(f) if os.path.exists(f) else 0
+        #Journals of hosts created later are read from their start.
+        self.caches = {"pack" : [0, 0], "rr" : [0, 0], "result" : [0, 0]}
+        #Cache -> hits, lookups
+
+        self.rowids = {}
+        #Log directory -> largest rowid read.
+        self.finished_times = []
+        #Completion times of the VPR runs within the last hour.
+        self.vpr_finished = 0
+        self.outcomes = {}
+        self.failures = {}
+        #Architecture -> failed runs
+
+        self.status = None
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def update_caches(self):
+        """Counts the cache lookups appended since the last update.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        for kind, filename in self.files.items():
+            lines = []
+            for f in runtime_history.get_filenames(filename):
+                new_lines, self.offsets[f] = read_new_lines(f, self.offsets.get(f, 0))
+                lines += new_lines
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if kind == "result":
+                    events = [("result", entry.get("event", None))]
+                else:
+                    events = [("pack", entry.get("pack_cache", None)), ("rr", entry.get("rr_cache", None))]
+                for cache, event in events:
+                    if event is None:
+                        continue
+                    self.caches[cache][0] += event == "hit"
+                    self.caches[cache][1] += 1
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def update_results(self):
+        """Reads the VPR results written since the last update.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        for log_dir in self.log_dirs:
+            if not results_db.exists(log_dir):
+                #Created by the first run.
+                continue
+            for row in results_db.query(log_dir, since = self.rowids.get(log_dir, None)):
+                self.rowids[log_dir] = row["rowid"]
+                if row["finished"] is None or row["finished"] < self.started:
+                    continue
+                self.finished_times.append(row["finished"])
+                self.vpr_finished += 1
+                self.outcomes[row["outcome"]] = self.outcomes.get(row["outcome"], 0) + 1
+                if row["outcome"] != "success":
+                    self.failures[row["arc"]] = self.failures.get(row["arc"], 0) + 1
+
+        hour_ago = time.time() - 3600
+        self.finished_times = [t for t in self.finished_times if t >= hour_ago]
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def read_pools(self):
+        """Reads the status files of the pools.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        List[Dict[str, various]]
+            Pool states (see >>parallelize.Parallel.write_status<<). Pools whose process
+            died are reported with nothing queued or running.
+        """
+
+        pool_states = []
+        for f in sorted(os.listdir(self.status_dir)):
+            if not f.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.status_dir, f), "r") as inf:
+                    state = json.load(inf)
+            except (IOError, ValueError):
+                continue
+            if not state["done"] and not checkpoint.is_alive(state["pid"]):
+                state.update({"queued" : 0, "running" : 0})
+            pool_states.append(state)
+
+        return pool_states
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_steps(self):
+        """Returns the progress recorded in the checkpoint of the runner.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Dict[str, various]
+            Number of completed steps and the step in flight.
+        """
+
+        try:
+            with open(self.state_file, "r") as inf:
+                state = json.load(inf)
+        except (IOError, ValueError):
+            return {"done" : 0, "in_flight" : None}
+        in_flight = state.get("in_flight", None)
+
+        return {"done" : len(state.get("outcomes", {})), "in_flight" : in_flight["step"] if in_flight else None}
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def collect(self):
+        """Returns the current status.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        Dict[str, various]
+            Status.
+        """
+
+        now = time.time()
+        if self.status is not None and now - self.status["updated"] < min_interval:
+            return self.status
+
+        self.update_caches()
+        self.update_results()
+        pool_states = self.read_pools()
+
+        stage_stats = {}
+        eta = None
+        for stage in stages:
+            states = [s for s in pool_states if s.get("stage", None) == stage]
+            stats = {"queued" : 0, "running" : 0, "finished" : 0, "cached" : 0}
+            for s in states:
+                for k in stats:
+                    stats[k] += s.get(k, 0)
+            active_h = sum([s["updated"] - s["started"] for s in states if s["started"]]) / 3600.0
+            stats["jobs_per_hour"] = stats["finished"] / active_h if active_h > 0 else None
+            remaining = stats["queued"] + stats["running"]
+            if remaining and stats["jobs_per_hour"]:
+                eta = (eta or 0) + 3600.0 * remaining / stats["jobs_per_hour"]
+            stage_stats[stage] = stats
+
+        max_cpu = int(os.environ["VPR_CPU"])
+        slots = {"hspice" : min(int(os.environ["HSPICE_CPU"]), max_cpu), "vpr" : max_cpu}
+        pool_stats = {}
+        for pool in slots:
+            states = [s for s in pool_states if pools.get(s.get("stage", None), None) == pool]
+            running = sum([s["running"] for s in states])
+            busy_s = sum([s["busy_s"] for s in states])
+            pool_stats[pool] = {"slots" : slots[pool], "running" : running,\
+                                "utilization" : running / float(slots[pool]),\
+                                "average_utilization" : busy_s / (slots[pool] * max(1.0, now - self.started))}
+
+        spice = stage_stats["spice"]
+        generate = stage_stats["generate"]
+        measured = spice["queued"] + spice["running"] + spice["finished"]
+        inherited = spice["cached"] + generate["queued"] + generate["running"] + generate["finished"] + generate["cached"]
+        caches = {"spice" : [inherited, measured + inherited]}
+        caches.update(self.caches)
+        caches = dict([(c, {"hits" : caches[c][0], "lookups" : caches[c][1],\
+                            "rate" : caches[c][0] / float(caches[c][1]) if caches[c][1] else None}) for c in caches])
+
+        failures = sorted(self.failures.items(), key = lambda f : (-f[1], f[0]))[:max_failures]
+
+        self.status = {"campaign" : self.name, "started" : self.started, "updated" : now,\
+                       "steps" : self.get_steps(), "stages" : stage_stats, "pools" : pool_stats,\
+                       "vpr" : {"finished" : self.vpr_finished, "last_hour" : len(self.finished_times),\
+                                "outcomes" : self.outcomes},\
+                       "caches" : caches, "failures" : failures, "eta" : eta}
+
+        return self.status
+    #------------------------------------------------------------------------#
+##########################################################################
+
+##########################################################################
+def render_html(status):
+    """Renders the status page.
+
+    Parameters
+    ----------
+    status : Dict[str, various]
+        Status (see >>Collector.collect<<).
+
+    Returns
+    -------
+    str
+        HTML page.
+    """
+
+    fmt = lambda v, f = "%.1f" : "-" if v is None else f % v
+    escape = lambda s : str(s).replace('&', "&amp;").replace('<', "&lt;").replace('>', "&gt;")
+    table = lambda header, rows : "<table><tr>%s</tr>%s</table>"\
+                                  % (''.join(["<th>%s</th>" % h for h in header]),\
+                                     ''.join(["<tr>%s</tr>" % ''.join(["<td>%s</td>" % c for c in row]) for row in rows]))
+
+    eta = status["eta"]
+    html = ["<html><head><meta http-equiv=\"refresh\" content=\"%d\"><title>%s</title>"\
+            % (refresh_interval, escape(status["campaign"])),\
+            "<style>body {font-family: monospace} td, th {padding: 2px 12px; text-align: right}</style></head><body>",\
+            "<h2>%s</h2>" % escape(status["campaign"]),\
+            "<p>Running for %s h, %d steps completed, in flight: %s, ETA of the running stages: %s h</p>"\
+            % (fmt((status["updated"] - status["started"]) / 3600.0), status["steps"]["done"],\
+               escape(status["steps"]["in_flight"]), fmt(eta / 3600.0 if eta is not None else None))]
+
+    html.append("<h3>Stages</h3>")
+    html.append(table(["stage", "queued", "running", "finished", "cached", "jobs/h"],\
+                      [[s, status["stages"][s]["queued"], status["stages"][s]["running"], status["stages"][s]["finished"],\
+                        status["stages"][s]["cached"], fmt(status["stages"][s]["jobs_per_hour"])] for s in stages]))
+
+    html.append("<h3>Pools</h3>")
+    html.append(table(["pool", "slots", "running", "utilization", "average utilization"],\
+                      [[p, status["pools"][p]["slots"], status["pools"][p]["running"],\
+                        fmt(100 * status["pools"][p]["utilization"], "%.0f%%"),\
+                        fmt(100 * status["pools"][p]["average_utilization"], "%.0f%%")] for p in sorted(status["pools"])]))
+
+    vpr = status["vpr"]
+    html.append("<h3>VPR runs</h3>")
+    html.append("<p>%d finished, %d in the last hour. %s</p>" % (vpr["finished"], vpr["last_hour"],\
+                ", ".join(["%s: %d" % (o, vpr["outcomes"][o]) for o in sorted(vpr["outcomes"])])))
+
+    html.append("<h3>Caches</h3>")
+    html.append(table(["cache", "hits", "lookups", "hit rate"],\
+                      [[c, status["caches"][c]["hits"], status["caches"][c]["lookups"],\
+                        fmt(100 * status["caches"][c]["rate"] if status["caches"][c]["rate"] is not None else None, "%.0f%%")]\
+                       for c in sorted(status["caches"])]))
+
+    html.append("<h3>Failures per architecture</h3>")
+    html.append(table(["architecture", "failed runs"], [[escape(arc), cnt] for arc, cnt in status["failures"]]))
+    html.append("<p><a href=\"/status.json\">status.json</a></p></body></html>")
+
+    return "\n".join(html)
+##########################################################################
+
+##########################################################################
+class StatusHandler(BaseHTTPRequestHandler):
+    """Serves the status page and the JSON status of the collector of the server.
+    """
+
+    #------------------------------------------------------------------------#
+    def do_GET(self):
+        """Answers a GET request.
+        """
+
+        path = self.path.split('?', 1)[0]
+        if path == "/status.json":
+            body = json.dumps(self.server.collector.collect(), indent = 1, sort_keys = True)
+            content_type = "application/json"
+        elif path in ('/', "/index.html"):
+            body = render_html(self.server.collector.collect())
+            content_type = "text/html"
+        else:
+            self.send_error(404)
+            return
+
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type + "; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def log_message(self, format, *args):
+        """Keeps the requests out of the output of the runner.
+        """
+
+        pass
+    #------------------------------------------------------------------------#
+##########################################################################
+
+##########################################################################
+class StatusServer(object):
+    """Serves the status of a campaign from a background thread.
+
+    Parameters
+    ----------
+    port : int
+        Port.
+    collector : Collector
+        Status collector.
+    host : Optional[str], default = "127.0.0.1"
+        Address to bind. Only the local host can connect by default.
+    """
+
+    #------------------------------------------------------------------------#
+    def __init__(self, port, collector, host = "127.0.0.1"):
+        """Constructor of the StatusServer class.
+        """
+
+        self.httpd = HTTPServer((host, port), StatusHandler)
+        self.httpd.collector = collector
+        self.thread = threading.Thread(target = self.httpd.serve_forever)
+        self.thread.daemon = True
+        #Does not keep the runner alive.
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def start(self):
+        """Starts serving.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        self.thread.start()
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def stop(self):
+        """Stops serving.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        self.httpd.shutdown()
+        self.httpd.server_close()
+    #------------------------------------------------------------------------#
+##########################################################################
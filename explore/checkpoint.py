@@ -0,0 +1,362 @@
+"""Durable state of long campaigns (see >>run_magic.py<<, >>cruncher.py<<, and
+>>loop_cruncher.py<<), so that an interrupted campaign resumes exactly where it stopped.
+
+The state is a JSON file, replaced atomically after every step, holding the completed
+steps with their outcomes, the step in flight, and any campaign-specific fields
+(e.g., the queue of channel compositions and the number of successes). The step in
+flight is leased to the process executing it, identified by its host, pid, and
+command. The lease also has a token, exported to all the processes spawned for the
+step through the environment variable >>lease_var<<. On resume, a step whose process
+is still alive is adopted (waited for), while the processes left behind by a dead one
+are found by their token and killed (see >>Checkpoint.kill_in_flight<<), and its
+partial artifacts are cleaned up by the caller before the step is rerun. Rerunning
+a step skips the VPR runs that have logs (see >>run_benchmarks.py<<) and the
+architectures whose artifacts are complete, whether registered in the manifest or
+left in the working directory of the generator (see >>manifest.is_complete<<).
+Only the runs and generations that were interrupted are redone.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+
+host = socket.gethostname()
+
+lease_var = "CHECKPOINT_LEASE"
+
+kill_grace = 10
+#Number of seconds given to the killed processes to exit before they receive SIGKILL.
+
+##########################################################################
+def is_alive(pid, pattern = None):
+    """Checks if the process is alive and, optionally, if it still runs the same command
+    (the pid may have been reused since).
+
+    Parameters
+    ----------
+    pid : int
+        pid.
+    pattern : Optional[str], default = None
+        Substring of the command line of the process.
+
+    Returns
+    -------
+    bool
+        True if alive.
+    """
+
+    try:
+        os.kill(pid, 0)
+    except (OSError, TypeError):
+        return False
+    if pattern is None:
+        return True
+    try:
+        with open("/proc/%d/cmdline" % pid, "r") as inf:
+            return pattern in inf.read().replace('\0', ' ')
+    except IOError:
+        #No procfs; the pid is trusted.
+        return True
+##########################################################################
+
+##########################################################################
+def find_processes(token):
+    """Returns the processes spawned for a step, which inherited its token.
+
+    Parameters
+    ----------
+    token : str
+        Token of the lease.
+
+    Returns
+    -------
+    List[int]
+        pids.
+    """
+
+    marker = ("\0%s=%s\0" % (lease_var, token)).encode("utf-8")
+    pids = []
+    if not os.path.isdir("/proc"):
+        return pids
+    for d in os.listdir("/proc"):
+        if not d.isdigit() or int(d) == os.getpid():
+            continue
+        try:
+            with open("/proc/%s/environ" % d, "rb") as inf:
+                if marker in b"\0" + inf.read() + b"\0":
+                    pids.append(int(d))
+        except (IOError, OSError):
+            #Exited or owned by another user.
+            continue
+
+    return pids
+##########################################################################
+
+##########################################################################
+def is_in_use(path):
+    """Checks if any other process works in the directory (i.e., has its
+    working directory in it).
+
+    Parameters
+    ----------
+    path : str
+        Directory.
+
+    Returns
+    -------
+    bool
+        True if in use. Always True without procfs.
+    """
+
+    if not os.path.isdir("/proc"):
+        return True
+    path = os.path.realpath(path)
+    for d in os.listdir("/proc"):
+        if not d.isdigit() or int(d) == os.getpid():
+            continue
+        try:
+            cwd = os.readlink("/proc/%s/cwd" % d)
+        except OSError:
+            continue
+        if cwd == path or cwd.startswith(path + '/'):
+            return True
+
+    return False
+##########################################################################
+
+##########################################################################
+class Checkpoint(object):
+    """State of a campaign.
+
+    Parameters
+    ----------
+    filename : str
+        State file name.
+    defaults : Optional[Dict[str, various]], default = None
+        Campaign-specific fields of a new state.
+    read_only : Optional[bool], default = False
+        Specifies that the state is never stored, e.g., for dry runs.
+        A new state is created if the file name is None.
+    """
+
+    #------------------------------------------------------------------------#
+    def __init__(self, filename, defaults = None, read_only = False):
+        """Constructor of the Checkpoint class.
+        """
+
+        self.filename = filename
+        self.read_only = read_only
+        self.resumed = False
+        try:
+            with open(filename, "r") as inf:
+                self.state = json.load(inf)
+            self.resumed = True
+        except (IOError, ValueError, TypeError):
+            self.state = {"outcomes" : {}, "in_flight" : None, "started" : time.time()}
+            self.state.update(defaults or {})
+            self.save()
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def save(self):
+        """Stores the state. The file is replaced atomically.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        if self.read_only:
+            return
+        self.state["updated"] = time.time()
+        tmp = "%s.%d.tmp" % (self.filename, os.getpid())
+        with open(tmp, "w") as outf:
+            json.dump(self.state, outf, indent = 1, sort_keys = True)
+        os.rename(tmp, self.filename)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def claim(self):
+        """Makes this process the owner of the campaign, unless another live process owns it.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        bool
+            True if claimed.
+        """
+
+        owner = self.state.get("owner", None)
+        if owner is not None and owner["host"] == host and owner["pid"] != os.getpid()\
+           and is_alive(owner["pid"], owner["pattern"]):
+            return False
+        self.state["owner"] = {"host" : host, "pid" : os.getpid(), "pattern" : os.path.basename(sys.argv[0])}
+        self.save()
+
+        return True
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def is_done(self, step):
+        """Checks if the step was completed.
+
+        Parameters
+        ----------
+        step : str
+            Step name.
+
+        Returns
+        -------
+        bool
+            True if completed.
+        """
+
+        return step in self.state["outcomes"]
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_outcome(self, step):
+        """Returns the outcome of a completed step.
+
+        Parameters
+        ----------
+        step : str
+            Step name.
+
+        Returns
+        -------
+        various
+            Outcome or None if the step was not completed.
+        """
+
+        return self.state["outcomes"].get(step, None)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def begin(self, step, pid = None, pattern = None):
+        """Records the step as in flight and exports its token to the processes spawned from now on.
+        The token of a step already in flight (e.g., adopted) is kept.
+
+        Parameters
+        ----------
+        step : str
+            Step name.
+        pid : Optional[int], default = None
+            pid of the process executing the step. This process if not specified.
+        pattern : Optional[str], default = None
+            Substring of the command line of the process, checked on resume.
+            The name of this script if the process is not specified.
+
+        Returns
+        -------
+        None
+        """
+
+        if pid is None:
+            pid = os.getpid()
+            pattern = os.path.basename(sys.argv[0])
+        lease = self.state["in_flight"]
+        if lease is not None and lease["step"] == step and lease.get("token", None) is not None:
+            token = lease["token"]
+        else:
+            token = "%s-%d-%d" % (host, os.getpid(), int(time.time() * 1000))
+        os.environ[lease_var] = token
+        self.state["in_flight"] = {"step" : step, "host" : host, "pid" : pid, "pattern" : pattern,\
+                                   "token" : token, "started" : time.time()}
+        self.save()
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def end(self, step, outcome = True, **fields):
+        """Records the step as completed.
+
+        Parameters
+        ----------
+        step : str
+            Step name.
+        outcome : Optional[various], default = True
+            Outcome (JSON-serializable).
+        fields : Dict[str, various]
+            Campaign-specific fields updated together with the outcome.
+
+        Returns
+        -------
+        None
+        """
+
+        self.state["outcomes"][step] = outcome
+        self.state.update(fields)
+        if self.state["in_flight"] is not None and self.state["in_flight"]["step"] == step:
+            self.state["in_flight"] = None
+            os.environ.pop(lease_var, None)
+        self.save()
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_in_flight(self):
+        """Returns the step that was in flight when the campaign was interrupted.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        str
+            Step name or None.
+        int
+            pid of the process still executing it, or None if it died
+            (or runs on another host).
+        """
+
+        lease = self.state["in_flight"]
+        if lease is None:
+            return None, None
+        if lease["host"] == host and lease["pid"] != os.getpid() and is_alive(lease["pid"], lease["pattern"]):
+            return lease["step"], lease["pid"]
+
+        return lease["step"], None
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def kill_in_flight(self):
+        """Kills the processes left behind by the step in flight, if it ran on this host.
+        Processes of other steps or campaigns are never affected.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            Number of processes killed.
+        """
+
+        lease = self.state["in_flight"]
+        if lease is None or lease["host"] != host or lease.get("token", None) is None:
+            return 0
+        pids = find_processes(lease["token"])
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            for pid in pids:
+                try:
+                    os.kill(pid, sig)
+                except OSError:
+                    pass
+            deadline = time.time() + kill_grace
+            while time.time() < deadline and any([is_alive(pid) for pid in pids]):
+                time.sleep(0.5)
+
+        return len(pids)
+    #------------------------------------------------------------------------#
+##########################################################################
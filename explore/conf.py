@@ -5,6 +5,9 @@ Ns = [2, 4, 8, 16]
 tech_nodes = [16, 7, 5, 4, 3.1, 3.0]
 seeds = [50936, 25124, 43033]
 #Generated by random.randint(1, 65536) on 16.08.19 at 19:10
+reserve_seeds = [21568, 4708, 57751]
+#Alternate seeds for backups of straggling runs (see >>runner_scripts/run_benchmarks.py<<, --speculate seed).
+#Generated the same way.
 
 #NOTE: Minimum grid sizes. Found by >>grid_sizer/size.py<<. 
 grid_sizes =\
@@ -0,0 +1,181 @@
+"""Lock files shared by concurrent runner processes, on the same host or on
+hosts mounting the same file system.
+
+A lock is a file holding <host>:<pid> of its owner. It is written under a temporary
+name and hard-linked to the lock name, which fails if the lock exists, so that a lock
+is never seen empty. A lock whose owner died on this host is taken over at once.
+That of another host, whose processes cannot be checked, or a lock that cannot be
+parsed (e.g., written by an older version) is taken over only once its modification
+time is older than >>stale_timeout<<. A stale lock is taken over by renaming it
+aside, and put back if it turns out to be a new lock created in the meantime,
+so that a waiter never removes the lock of another.
+"""
+
+import os
+import time
+import socket
+
+stale_timeout = 6 * 3600
+#Longer than any packing or decompression done under a lock.
+
+host = socket.gethostname().split('.')[0]
+
+##########################################################################
+def get_owner():
+    """Returns the content of the locks of this process.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    str
+        <host>:<pid>
+    """
+
+    return "%s:%d" % (host, os.getpid())
+##########################################################################
+
+##########################################################################
+def is_stale(owner, age):
+    """Checks if a lock was left behind by its owner.
+
+    Parameters
+    ----------
+    owner : str
+        Content of the lock.
+    age : float
+        Number of seconds since the lock was written.
+
+    Returns
+    -------
+    bool
+        True if stale.
+    """
+
+    try:
+        owner_host, pid = owner.rsplit(':', 1)
+        pid = int(pid)
+    except ValueError:
+        return age > stale_timeout
+    if owner_host != host:
+        return age > stale_timeout
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return True
+
+    return False
+##########################################################################
+
+##########################################################################
+def take_over(lock_file, st):
+    """Moves a stale lock aside, unless it was replaced since it was checked.
+
+    Parameters
+    ----------
+    lock_file : str
+        Lock file name.
+    st : os.stat_result
+        Status of the stale lock.
+
+    Returns
+    -------
+    None
+    """
+
+    aside = "%s.stale.%s-%d" % (lock_file, host, os.getpid())
+    try:
+        os.rename(lock_file, aside)
+    except OSError:
+        #Taken over by another waiter or released.
+        return
+    moved = os.stat(aside)
+    if (moved.st_ino, moved.st_mtime) != (st.st_ino, st.st_mtime):
+        #A new lock, created after another waiter moved the stale one aside.
+        try:
+            os.link(aside, lock_file)
+        except OSError:
+            pass
+    os.remove(aside)
+##########################################################################
+
+##########################################################################
+def acquire(lock_file, done = None, poll_interval = 2, block = True):
+    """Acquires the lock.
+
+    Parameters
+    ----------
+    lock_file : str
+        Lock file name.
+    done : Optional[Callable[[], bool]], default = None
+        Condition under which waiting for the lock is no longer needed
+        (e.g., the result produced by the owner of the lock is available).
+    poll_interval : Optional[int], default = 2
+        Number of seconds between two checks of the lock.
+    block : Optional[bool], default = True
+        Wait until the lock is released. Otherwise, return immediately.
+
+    Returns
+    -------
+    bool
+        True if the lock was acquired.
+    """
+
+    tmp = "%s.%s-%d.tmp" % (lock_file, host, os.getpid())
+    while done is None or not done():
+        with open(tmp, "w") as outf:
+            outf.write(get_owner())
+        now = os.path.getmtime(tmp)
+        #The clock of the file server, against which the age of the lock is measured.
+        try:
+            os.link(tmp, lock_file)
+        except OSError:
+            pass
+        linked = os.stat(tmp).st_nlink == 2
+        #Over NFS, a link may be reported as failed although it succeeded.
+        os.remove(tmp)
+        if linked:
+            return True
+
+        try:
+            st = os.stat(lock_file)
+            with open(lock_file, "r") as inf:
+                owner = inf.read().strip()
+        except (IOError, OSError):
+            #The lock was released in the meantime.
+            continue
+        if is_stale(owner, now - st.st_mtime):
+            take_over(lock_file, st)
+            continue
+        if not block:
+            return False
+        time.sleep(poll_interval)
+
+    return False
+##########################################################################
+
+##########################################################################
+def release(lock_file):
+    """Releases the lock, if held by this process.
+
+    Parameters
+    ----------
+    lock_file : str
+        Lock file name.
+
+    Returns
+    -------
+    None
+    """
+
+    try:
+        with open(lock_file, "r") as inf:
+            if inf.read().strip() != get_owner():
+                #Taken over after it was considered stale.
+                return
+        os.remove(lock_file)
+    except (IOError, OSError):
+        pass
+##########################################################################
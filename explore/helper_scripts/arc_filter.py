@@ -19,6 +19,10 @@ str
 
 import os
 import argparse
+import sys
+sys.path.insert(0,'../..')
+
+import arc_meta
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--arc_dir")
@@ -41,21 +45,33 @@ for f in os.listdir(args.arc_dir):
     if name is None or name in area_dict:
         continue
     
-    with open("%s/%s" % (args.arc_dir, f), "r") as inf:
-        lines = inf.readlines()
-    for line in lines:
-        if line.startswith("Active dimensions:"):
-            wa = int(line.split()[-4])
-            ha = int(line.split()[-2])
-        elif line.startswith("Metal dimensions:"):
-            wm = int(line.split()[-4])
-            hm = int(line.split()[-2])
-            break
-    a = max(wa, wm) * max(ha, hm) / 1000000.0
+    meta = arc_meta.load("%s/%s" % (args.arc_dir, f))
+    if meta is not None:
+        a = arc_meta.get_area(meta)
+    else:
+        with open("%s/%s" % (args.arc_dir, f), "r") as inf:
+            lines = inf.readlines()
+        for line in lines:
+            if line.startswith("Active dimensions:"):
+                wa = int(line.split()[-4])
+                ha = int(line.split()[-2])
+            elif line.startswith("Metal dimensions:"):
+                wm = int(line.split()[-4])
+                hm = int(line.split()[-2])
+                break
+        a = max(wa, wm) * max(ha, hm) / 1000000.0
     area_dict.update({name : a})
 
     if DELAY_THR is None:
         continue
+
+    #NOTE: This only gets the wire access and feedback delays. Connection block is largely independent of
+    #channel composition and wire delays themselves cannot be taken directly, as the logical length of each
+    #wire would need to be taken into account.
+    if meta is not None and "block_delays" in meta:
+        td = sum([meta["block_delays"][d] for d in meta["block_delays"]])
+        delay_dict.update({name : td})
+        continue
     
     with open("%s/%s" % (args.arc_dir, f.replace("_padding.log", ".xml")), "r") as inf:
         txt = inf.read()
@@ -63,9 +79,6 @@ for f in os.listdir(args.arc_dir):
     td = 0
     for w in txt.split():
         if "e-" in w and ("max=" in w):
-            #NOTE: This only gets the wire access and feedback delays. Connection block is largely independent of
-            #channel composition and wire delays themselves cannot be taken directly, as the logical length of each
-            #wire would need to be taken into account.
             td += float(w.split('"')[1])
     delay_dict.update({name : td})
 
@@ -0,0 +1,177 @@
+"""Benchmarks the RR-graph archive codecs (see >>codec.py<<) on the RR-graphs of a campaign.
+
+A zstd dictionary is trained on a random sample of the RR-graphs and every codec
+configuration is then measured on another, disjoint sample: the compression ratio,
+and the compression and decompression throughput, relative to the decompressed size.
+The trained dictionary can be kept for the campaign (see >>generate_files_for_magic_formula.py<<).
+
+Parameters
+----------
+arc_dir : str
+    Directory holding the RR-graph archives (of any codec).
+sample : Optional[int], default = 8
+    Number of RR-graphs on which the codecs are measured.
+train : Optional[int], default = 16
+    Number of RR-graphs on which the dictionary is trained.
+levels : Optional[str], default = "3 9 19"
+    Space-separated list of zstd compression levels.
+dict_out : Optional[str], default = None
+    File in which to store the trained dictionary.
+seed : Optional[int], default = 0
+    Seed of the random sampling.
+
+Returns
+-------
+None
+"""
+
+import os
+import time
+import random
+import shutil
+import tempfile
+import argparse
+import sys
+sys.path.insert(0,'..')
+sys.path.insert(0,'../..')
+
+import codec
+import rr_store
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--arc_dir")
+parser.add_argument("--sample")
+parser.add_argument("--train")
+parser.add_argument("--levels")
+parser.add_argument("--dict_out")
+parser.add_argument("--seed")
+args = parser.parse_args()
+
+SAMPLE = 8
+try:
+    SAMPLE = int(args.sample)
+except:
+    pass
+
+TRAIN = 16
+try:
+    TRAIN = int(args.train)
+except:
+    pass
+
+LEVELS = [3, 9, 19]
+try:
+    LEVELS = [int(level) for level in args.levels.split()]
+except:
+    pass
+
+SEED = 0
+try:
+    SEED = int(args.seed)
+except:
+    pass
+
+archives = sorted([f for f in os.listdir(args.arc_dir) if f.endswith(rr_store.archive_suffixes)])
+random.seed(SEED)
+random.shuffle(archives)
+test_archives = archives[:SAMPLE]
+train_archives = archives[SAMPLE:SAMPLE + TRAIN]
+if not train_archives:
+    #Too few graphs for disjoint samples.
+    train_archives = test_archives
+print("%d RR-graphs found, %d used for training, %d for measurement." % (len(archives), len(train_archives), len(test_archives)))
+
+tmp_dir = tempfile.mkdtemp(prefix = "bench_codecs_")
+
+##########################################################################
+def extract(archive):
+    """Decompresses an archive into the temporary directory.
+
+    Parameters
+    ----------
+    archive : str
+        Archive file name.
+
+    Returns
+    -------
+    str
+        Decompressed file name.
+    """
+
+    dst = os.path.join(tmp_dir, codec.strip_suffix(archive))
+    if not os.path.exists(dst):
+        codec.decompress(os.path.join(args.arc_dir, archive), dst)
+
+    return dst
+##########################################################################
+
+##########################################################################
+def measure(files, codec_name, level = None, dictionary = None):
+    """Compresses and decompresses the files and measures the ratio and the throughputs.
+
+    Parameters
+    ----------
+    files : List[str]
+        Decompressed files.
+    codec_name : str
+        Codec.
+    level : Optional[int], default = None
+        Compression level.
+    dictionary : Optional[str], default = None
+        Dictionary file name.
+
+    Returns
+    -------
+    float
+        Compression ratio.
+    float
+        Compression throughput [MB/s].
+    float
+        Decompression throughput [MB/s].
+    """
+
+    raw = packed = 0
+    comp_time = dec_time = 0.0
+    archive = os.path.join(tmp_dir, "bench" + codec.suffixes[codec_name])
+    out = os.path.join(tmp_dir, "bench.out")
+    if dictionary is not None:
+        #Picked up by the decompression from the directory of the archive.
+        shutil.copy(dictionary, os.path.join(tmp_dir, codec.dict_filename))
+    for f in files:
+        raw += os.path.getsize(f)
+        start = time.time()
+        codec.compress(f, archive, codec_name, level, dictionary)
+        comp_time += time.time() - start
+        packed += os.path.getsize(archive)
+        start = time.time()
+        codec.decompress(archive, out)
+        dec_time += time.time() - start
+    os.system("rm -f %s %s %s" % (archive, out, os.path.join(tmp_dir, codec.dict_filename)))
+
+    return float(raw) / packed, raw / 1e6 / comp_time, raw / 1e6 / dec_time
+##########################################################################
+
+try:
+    test_files = [extract(archive) for archive in test_archives]
+    train_files = [extract(archive) for archive in train_archives]
+
+    dictionary = os.path.join(tmp_dir, "trained.zdict")
+    if not codec.train(train_files, dictionary):
+        print("Dictionary training failed.")
+        dictionary = None
+    elif args.dict_out is not None:
+        shutil.copy(dictionary, args.dict_out)
+
+    configs = [("lz4", None, None)]
+    for level in LEVELS:
+        configs.append(("zstd", level, None))
+        if dictionary is not None:
+            configs.append(("zstd", level, dictionary))
+
+    print("#codec level dict ratio comp[MB/s] decomp[MB/s]")
+    for codec_name, level, dict_file in configs:
+        ratio, comp_tp, dec_tp = measure(test_files, codec_name, level, dict_file)
+        print("%s %s %s %.2f %.1f %.1f" % (codec_name, level if level is not None else '-',\
+                                          "yes" if dict_file is not None else "no", ratio, comp_tp, dec_tp))
+finally:
+    shutil.rmtree(tmp_dir)
@@ -1,9 +1,25 @@
 """Changes the delays in an architecture file and the rr-graph.
 
+The modified files are written next to the originals, prefixed by DelayChanged.
+Only the <switches> section at the top of the rr-graph is rewritten: the archive
+is decompressed as a stream, and everything after the section is passed through
+to the compressor in fixed-size chunks, without being split into lines or held
+in memory. If the rr-graph is split (see >>rr_store.py<<), only a new header is
+written, sharing the body of the original.
+
 Parameters
 ----------
-arc : str
+arc : Optional[str], default = None
     Architecture to be modified.
+arcs : Optional[str], default = None
+    Space-separated list of architectures to be modified in parallel,
+    all with the same replacement delays. Used if >>arc<< is not specified.
+arc_dir : Optional[str], default = None
+    Directory whose architectures are all modified in parallel.
+    Used if neither >>arc<< nor >>arcs<< is specified.
+delays : Optional[str], default = None
+    JSON file holding the replacement delays, indexed by their name.
+    The dictionary defined below is used if not specified.
 
 Returns
 -------
@@ -11,13 +27,34 @@ None
 """
 
 import os
+import re
+import json
+import shutil
+import subprocess
 import argparse
+import sys
+sys.path.insert(0,'..')
+sys.path.insert(0,'../..')
+
+import setenv
+import rr_store
+import codec
+from parallelize import Parallel
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--arc")
+parser.add_argument("--arcs")
+parser.add_argument("--arc_dir")
+parser.add_argument("--delays")
 
 args = parser.parse_args()
 
+chunk_size = 1 << 20
+#Bytes passed from the decompressor to the compressor at once.
+
+switch_timing = re.compile(br'(<switch\b[^>]*\bname="([^"]*)"[^>]*>\s*<timing\b[^>]*\bTdel=")([^"]*)(")')
+#Opening tag of a switch, followed by its timing, with the delay in the third group.
+
 get_val = lambda line, key : line.split("%s=\"" % key, 1)[1].split('"', 1)[0]
 ##########################################################################
 def parse_delays(filename):
@@ -75,7 +112,9 @@ replacement_delays = {"H1" : 1.74125e-11, "H2" : 1.99875e-11, "H4" : 2.875e-11,\
 replacement_delays = {"V8_tap_0" : 45.85e-12, "V4_tap_0" : 23.85834e-12}
 #replacement_delays = {"feedback" : 49e-12}
 
-delay_dict = parse_delays(args.arc)
+if args.delays is not None:
+    with open(args.delays, "r") as inf:
+        replacement_delays = json.load(inf)
 
 #NOTE: Comment if unused.
 equivalent_feedback_delay = lambda delay_dict : delay_dict["cb"]["td"]\
@@ -148,19 +187,15 @@ def replace_delays(delay_dict, replacement_delays):
     #    if replacement_delays.get(base_name, float('inf')) < total:
     #        delay_dict[w]["td"] = frac * replacement_delays[base_name]
 ##########################################################################
-   
-replace_delays(delay_dict, replacement_delays) 
-try:
-    print equivalent_feedback_delay(delay_dict)
-except:
-    pass
 
 ##########################################################################
-def write_arc(delay_dict):
+def write_arc(arc, delay_dict):
     """Writes out the architecture with replaced delays.
 
     Parameters
     ----------
+    arc : str
+        Architecture file name.
     delay_dict : Dict[str, various]
         The delay dictionary.
        
@@ -169,7 +204,7 @@ def write_arc(delay_dict):
     None
     """
     
-    with open(args.arc, "r") as inf:
+    with open(arc, "r") as inf:
         lines = inf.readlines()
 
     txt = ""
@@ -183,51 +218,149 @@ def write_arc(delay_dict):
         if not replaced:
             txt += line
 
-    with open("%s/DelayChanged%s" % ('/'.join(args.arc.split('/')[:-1]), args.arc.split('/')[-1]), "w") as outf:
+    with open(os.path.join(os.path.dirname(arc), "DelayChanged" + os.path.basename(arc)), "w") as outf:
         outf.write(txt)
 ##########################################################################
 
 ##########################################################################
-def write_rr(delay_dict):
-    """Writes out the rr-graph with replaced delays.
+def rewrite_switches(txt, delay_dict):
+    """Replaces the delays of the switches in a part of the rr-graph.
+
+    Parameters
+    ----------
+    txt : bytes
+        Part of the rr-graph, holding the <switches> section.
+    delay_dict : Dict[str, various]
+        The delay dictionary.
+
+    Returns
+    -------
+    bytes
+        Modified part of the rr-graph.
+    """
+
+    #------------------------------------------------------------------------#
+    def replace(match):
+        """Replaces the delay of one switch, if it is in the dictionary.
+
+        Parameters
+        ----------
+        match : re.MatchObject
+            Switch matched by >>switch_timing<<.
+
+        Returns
+        -------
+        bytes
+            Replacement.
+        """
+
+        switch_id = match.group(2).decode("utf-8")
+        if not switch_id in delay_dict:
+            return match.group(0)
+
+        return match.group(1) + str(delay_dict[switch_id]["td"]).encode("utf-8") + match.group(4)
+    #------------------------------------------------------------------------#
+
+    return switch_timing.sub(replace, txt)
+##########################################################################
+
+##########################################################################
+def write_rr(arc, delay_dict):
+    """Writes out the rr-graph with replaced delays. The archive is decompressed
+    as a stream, only the <switches> section is modified, and the rest of the
+    rr-graph is passed through to the compressor in chunks. A split rr-graph
+    gets a new header only.
 
     Parameters
     ----------
+    arc : str
+        Architecture file name.
     delay_dict : Dict[str, various]
         The delay dictionary.
        
     Returns
     -------
-    None
+    bool
+        True if the rr-graph was written.
     """
     
-    rr_filename = args.arc.replace(".xml", "_rr.xml")
-    os.system("lz4 -d %s.lz4 %s" % (rr_filename, rr_filename))
+    rr_archive = codec.get_archive(arc.rsplit(".xml", 1)[0] + "_rr.xml")
+    out_rr_archive = os.path.join(os.path.dirname(rr_archive), "DelayChanged" + os.path.basename(rr_archive))
+
+    if rr_store.get_source(rr_archive) != rr_archive:
+        body_file, header = rr_store.read_header(rr_store.get_source(rr_archive))
+        return rr_store.write_header(rr_store.get_header_filename(out_rr_archive), body_file,\
+                                     rewrite_switches(header, delay_dict))
+    tmp_archive = "%s.%d.tmp" % (out_rr_archive, os.getpid())
+
+    dec = codec.open_decompressed(rr_archive)
+    comp = codec.open_compressed(tmp_archive, codec.get_codec(rr_archive), codec.get_dictionary(rr_archive))
+
+    header = b''
+    end = -1
+    while end < 0:
+        data = dec.stdout.read(chunk_size)
+        if not data:
+            break
+        header += data
+        end = header.find(b"</switches>")
+        #The section is at the top of the rr-graph, so this normally takes a single chunk.
+
+    if end >= 0:
+        comp.stdin.write(rewrite_switches(header[:end], delay_dict))
+        comp.stdin.write(header[end:])
+        del header
+        shutil.copyfileobj(dec.stdout, comp.stdin, chunk_size)
+    comp.stdin.close()
+    dec.stdout.close()
+
+    if dec.wait() or comp.wait() or end < 0:
+        print("Failed to rewrite %s." % rr_archive)
+        os.system("rm -f %s" % tmp_archive)
+        return False
+
+    os.rename(tmp_archive, out_rr_archive)
+
+    return True
+##########################################################################
 
-    with open(rr_filename, "r") as inf:
-        lines = inf.readlines()
+##########################################################################
+def change_delays(arc):
+    """Writes out the architecture and the rr-graph with replaced delays.
 
-    txt = ""
-    switch_id = None
-    for line in lines:
-        if "<switch " in line:
-            switch_id = get_val(line, "name")
-            txt += line
-            continue
-        if "Tdel" in line and switch_id in delay_dict:
-            txt += line.replace(get_val(line, "Tdel"), str(delay_dict[switch_id]["td"]))
-            switch_id = None
-        else:
-            txt += line
+    Parameters
+    ----------
+    arc : str
+        Architecture file name.
 
-    out_rr_filename = "%s/DelayChanged%s" % ('/'.join(rr_filename.split('/')[:-1]), rr_filename.split('/')[-1])
+    Returns
+    -------
+    None
+    """
 
-    with open(out_rr_filename, "w") as outf:
-        outf.write(txt)
+    delay_dict = parse_delays(arc)
+    replace_delays(delay_dict, replacement_delays) 
+    try:
+        print equivalent_feedback_delay(delay_dict)
+    except:
+        pass
 
-    os.system("lz4 %s %s.lz4" % (out_rr_filename, out_rr_filename))
-    os.system("rm -f %s %s" % (rr_filename, out_rr_filename))
+    write_arc(arc, delay_dict)
+    write_rr(arc, delay_dict)
 ##########################################################################
 
-write_arc(delay_dict)
-write_rr(delay_dict)
+if args.arc is not None:
+    change_delays(args.arc)
+else:
+    if args.arcs is not None:
+        arcs = args.arcs.split()
+    else:
+        arcs = [os.path.join(args.arc_dir, f) for f in sorted(os.listdir(args.arc_dir))\
+                if f.endswith(".xml") and not f.startswith("DelayChanged")\
+                and os.path.exists(rr_store.get_source(codec.get_archive(os.path.join(args.arc_dir, f.rsplit(".xml", 1)[0] + "_rr.xml"))))]
+
+    call = "python -u %s --arc %%s" % os.path.abspath(__file__)\
+         + ((" --delays %s" % os.path.abspath(args.delays)) if args.delays is not None else '')
+    runner = Parallel(int(os.environ["VPR_CPU"]), 1)
+    runner.init_cmd_pool([call % os.path.abspath(arc) for arc in arcs])
+    runner.run()
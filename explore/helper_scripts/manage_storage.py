@@ -0,0 +1,142 @@
+"""Reports the disk usage of a campaign and evicts regenerable artifacts to fit a quota
+(see >>storage.py<<). Evicted RR-graphs are regenerated on demand by
+>>run_benchmarks.py --rebuild 1<< or by rerunning >>generate_files_for_magic_formula.py<<.
+
+Parameters
+----------
+arc_dirs : Optional[str], default = all_circs_magic_N*_T*/ and all_grids_N*_T*/ of >>run_dir<<
+    Space-separated list of architecture directories.
+run_dir : Optional[str], default = ../runner_scripts/
+    Directory in which the VPR runs were executed (holding the kept run directories).
+rr_cache : Optional[str], default = rr_cache.default_dir
+    Directory of the decompressed RR-graph cache.
+rr_store : Optional[str], default = rr_store.default_dir
+    Store directory of the RR-graph bodies.
+quota : Optional[float], default = None
+    Quota in GB. If not specified, the usage is only reported.
+sort_files : Optional[str], default = final sorting logs of >>run_dir<<
+    Space-separated list of sorting logs whose architectures are pinned.
+top_k : Optional[int], default = None
+    Number of architectures pinned from the top of each sorting log. All by default.
+min_age : Optional[float], default = 1
+    Number of hours since the last use below which an artifact is not evicted.
+policy : Optional[str], default = lru
+    Order of eviction: {lru, size}.
+dry_run : Optional[bool], default = False
+    Lists the artifacts that would be evicted, without removing them.
+
+Returns
+-------
+None
+"""
+
+import os
+import argparse
+import sys
+sys.path.insert(0,'..')
+sys.path.insert(0,'../..')
+
+import storage
+import rr_cache
+import rr_store
+import manifest
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--arc_dirs")
+parser.add_argument("--run_dir")
+parser.add_argument("--rr_cache")
+parser.add_argument("--rr_store")
+parser.add_argument("--quota")
+parser.add_argument("--sort_files")
+parser.add_argument("--top_k")
+parser.add_argument("--min_age")
+parser.add_argument("--policy")
+parser.add_argument("--dry_run")
+args = parser.parse_args()
+
+RUN_DIR = "../runner_scripts/"
+if args.run_dir is not None:
+    RUN_DIR = args.run_dir
+
+ARC_DIRS = [os.path.join(RUN_DIR, d) for d in sorted(os.listdir(RUN_DIR))\
+            if d.startswith(("all_circs_magic_N", "all_grids_N")) and os.path.isdir(os.path.join(RUN_DIR, d))]
+if args.arc_dirs is not None:
+    ARC_DIRS = args.arc_dirs.split()
+
+RR_CACHE = rr_cache.default_dir
+if args.rr_cache is not None:
+    RR_CACHE = args.rr_cache
+
+RR_STORE = rr_store.default_dir
+if args.rr_store is not None:
+    RR_STORE = args.rr_store
+
+QUOTA = None
+try:
+    QUOTA = float(args.quota) * 1e9
+except:
+    pass
+
+SORT_FILES = [os.path.join(RUN_DIR, f) for f in sorted(os.listdir(RUN_DIR)) if f.endswith(".sort") and not "_rung" in f]
+if args.sort_files is not None:
+    SORT_FILES = args.sort_files.split()
+
+TOP_K = None
+try:
+    TOP_K = int(args.top_k)
+except:
+    pass
+
+MIN_AGE = 3600
+try:
+    MIN_AGE = float(args.min_age) * 3600
+except:
+    pass
+
+POLICY = "lru"
+if args.policy in ("lru", "size"):
+    POLICY = args.policy
+
+DRY_RUN = False
+try:
+    DRY_RUN = int(args.dry_run)
+except:
+    pass
+
+artifacts = []
+for arc_dir in ARC_DIRS:
+    artifacts += storage.scan_arc_dir(arc_dir)
+artifacts += storage.scan_rr_store(RR_STORE)
+#Bodies are evicted only if no header names them, including those outside of ARC_DIRS.
+artifacts += storage.scan_rr_cache(RR_CACHE)
+artifacts += storage.scan_run_dirs(RUN_DIR)
+
+pins = storage.get_pins(SORT_FILES, TOP_K)
+is_pinned = lambda a : storage.ranking.get_arc(a["name"]) in pins
+
+print("#kind count size[GB] pinned[GB]")
+for kind in ["kept"] + storage.evictable:
+    selected = [a for a in artifacts if a["kind"] == kind]
+    print("%s %d %.2f %.2f" % (kind, len(selected), sum([a["size"] for a in selected]) / 1e9,\
+                               sum([a["size"] for a in selected if is_pinned(a)]) / 1e9))
+total = sum([a["size"] for a in artifacts])
+print("Total: %.2f GB, %d architectures pinned from %d sorting logs." % (total / 1e9, len(pins), len(SORT_FILES)))
+
+if QUOTA is None:
+    exit(0)
+
+evicted = 0
+for a in storage.select(artifacts, QUOTA, pins, MIN_AGE, POLICY):
+    if DRY_RUN:
+        print("Would evict %s (%.1f MB)." % (a["path"], a["size"] / 1e6))
+        evicted += a["size"]
+    elif storage.evict(a):
+        evicted += a["size"]
+
+if not DRY_RUN:
+    for arc_dir in ARC_DIRS:
+        manifest.Manifest(arc_dir).save()
+        #Drops the evicted RR-graphs from the manifests, so that they are regenerated.
+
+print("%s %.2f GB; %.2f GB remain (quota: %.2f GB)." % ("Would evict" if DRY_RUN else "Evicted", evicted / 1e9,\
+                                                       (total - evicted) / 1e9, QUOTA / 1e9))
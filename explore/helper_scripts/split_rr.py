@@ -0,0 +1,73 @@
+"""Splits the RR-graph archives of a directory into per-architecture headers
+and shared bodies (see >>rr_store.py<<), or joins them back, and reports
+the disk space taken before and after.
+
+Parameters
+----------
+arc_dir : str
+    Architecture directory.
+store : Optional[str], default = rr_store.default_dir
+    Store directory of the bodies.
+join : Optional[bool], default = False
+    Reassembles the archives from the headers and removes the headers.
+    The bodies are kept in the store.
+
+Returns
+-------
+None
+"""
+
+import os
+import argparse
+import sys
+sys.path.insert(0,'..')
+sys.path.insert(0,'../..')
+
+import rr_store
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--arc_dir")
+parser.add_argument("--store")
+parser.add_argument("--join")
+args = parser.parse_args()
+
+STORE = rr_store.default_dir
+if args.store is not None:
+    STORE = os.path.abspath(args.store)
+
+JOIN = False
+try:
+    JOIN = int(args.join)
+except:
+    pass
+
+before = 0
+after = 0
+shared_cnt = 0
+files = sorted(os.listdir(args.arc_dir))
+for f in files:
+    filename = os.path.join(args.arc_dir, f)
+    if JOIN and f.endswith(rr_store.header_suffix):
+        rr_archive = filename.rsplit(rr_store.header_suffix, 1)[0] + rr_store.archive_suffix
+        before += os.path.getsize(filename)
+        if rr_store.materialize(filename, rr_archive, compressed = True):
+            os.remove(filename)
+            after += os.path.getsize(rr_archive)
+    elif not JOIN and f.endswith(rr_store.archive_suffixes):
+        before += os.path.getsize(filename)
+        header_file, shared = rr_store.split(filename, STORE)
+        if header_file is None:
+            print("Failed to split %s." % f)
+            after += os.path.getsize(filename)
+            continue
+        after += os.path.getsize(header_file)
+        if shared:
+            shared_cnt += 1
+        else:
+            after += os.path.getsize(rr_store.read_header(header_file)[0])
+
+if JOIN:
+    print("Joined: %.1f MB of headers into %.1f MB of archives." % (before / 1e6, after / 1e6))
+else:
+    print("Split: %.1f MB of archives into %.1f MB of headers and new bodies (%d bodies shared)."\
+          % (before / 1e6, after / 1e6, shared_cnt))
@@ -0,0 +1,274 @@
+"""Event-driven watching of a log directory for newly written run logs.
+
+On Linux, the directory is watched through inotify (called through ctypes), so that
+a log is reported within milliseconds after >>run_vpr.py<< closes it, without ever
+listing the directory again. Elsewhere, or if inotify is not available (e.g., the
+watch limit is exhausted), the directory is polled, comparing the modification
+times and sizes of the files. In both cases, only the logs that changed are read.
+
+The logs already present when the watch starts are reported by the first call,
+so that no failure is missed. A directory that does not exist yet is watched
+as soon as it is created.
+"""
+
+import os
+import time
+import errno
+import struct
+import select
+
+import results_db
+
+try:
+    import ctypes
+    import ctypes.util
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno = True)
+    libc.inotify_init1
+    libc.inotify_add_watch
+except (ImportError, OSError, AttributeError):
+    libc = None
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+event_header = struct.Struct("iIII")
+#wd, mask, cookie, len, followed by len bytes of the zero-padded name.
+
+##########################################################################
+class LogWatcher(object):
+    """Reports the files written to a directory.
+
+    Parameters
+    ----------
+    log_dir : str
+        Directory to watch.
+    poll_interval : Optional[float], default = 5
+        Number of seconds between two scans of the directory, when polling.
+    force_poll : Optional[bool], default = False
+        Poll even if inotify is available.
+    """
+
+    #------------------------------------------------------------------------#
+    def __init__(self, log_dir, poll_interval = 5, force_poll = False):
+        """Constructor of the LogWatcher class.
+        """
+
+        self.log_dir = log_dir
+        self.poll_interval = poll_interval
+        self.fd = None
+        self.watching = False
+        self.stamps = {}
+        self.pending = set()
+
+        if libc is not None and not force_poll:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self.fd = fd
+        self.start()
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def start(self):
+        """Starts watching the directory, if it exists, and marks
+        all files already in it as changed.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        bool
+            True if the directory is being watched.
+        """
+
+        if not os.path.isdir(self.log_dir):
+            return False
+
+        if self.fd is not None:
+            path = self.log_dir if isinstance(self.log_dir, bytes) else self.log_dir.encode("utf-8")
+            if libc.inotify_add_watch(self.fd, path, IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+                #Falls back to polling.
+                os.close(self.fd)
+                self.fd = None
+        #The watch is added before listing the directory, so that no file is missed.
+        self.pending |= set(self.scan())
+        self.watching = True
+
+        return True
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def scan(self):
+        """Lists the files whose modification time or size changed since the last scan.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        List[str]
+            File names.
+        """
+
+        changed = []
+        try:
+            files = os.listdir(self.log_dir)
+        except OSError:
+            return changed
+
+        for f in files:
+            try:
+                st = os.stat(os.path.join(self.log_dir, f))
+            except OSError:
+                continue
+            stamp = (st.st_mtime, st.st_size)
+            if self.stamps.get(f, None) != stamp:
+                self.stamps[f] = stamp
+                changed.append(f)
+
+        return changed
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def read_events(self):
+        """Reads the queued inotify events.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        List[str]
+            Names of the written files.
+        """
+
+        changed = []
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return changed
+                raise
+            if not buf:
+                return changed
+            offset = 0
+            while offset + event_header.size <= len(buf):
+                wd, mask, cookie, length = event_header.unpack_from(buf, offset)
+                offset += event_header.size
+                name = buf[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    #Events were lost, so the directory must be listed again.
+                    self.stamps = {}
+                    changed += self.scan()
+                elif mask & IN_IGNORED:
+                    #The directory was removed or moved away.
+                    self.watching = False
+                elif name:
+                    changed.append(name.decode("utf-8") if not isinstance(name, str) else name)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def wait(self, timeout = None):
+        """Waits until some files are written.
+
+        Parameters
+        ----------
+        timeout : Optional[float], default = None
+            Maximum number of seconds to wait. Forever if not specified.
+
+        Returns
+        -------
+        List[str]
+            Names of the written files (empty after a timeout).
+        """
+
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            if not self.watching:
+                self.start()
+            if self.pending:
+                changed = sorted(self.pending)
+                self.pending = set()
+                return changed
+
+            remaining = None if deadline is None else max(0, deadline - time.time())
+            if self.watching and self.fd is not None:
+                if select.select([self.fd], [], [], remaining)[0]:
+                    self.pending |= set(self.read_events())
+                elif deadline is not None:
+                    return []
+                continue
+
+            if deadline is not None and remaining == 0:
+                return []
+            time.sleep(self.poll_interval if remaining is None else min(self.poll_interval, remaining))
+            if self.watching:
+                self.pending |= set(self.scan())
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_failures(self, timeout = None, outcomes = results_db.fail_outcomes):
+        """Waits until some logs are written and returns the architectures
+        whose runs ended with one of the outcomes.
+
+        Parameters
+        ----------
+        timeout : Optional[float], default = None
+            Maximum number of seconds to wait. Forever if not specified.
+        outcomes : Optional[List[str]], default = results_db.fail_outcomes
+            Outcomes considered as failures.
+
+        Returns
+        -------
+        Set[str]
+            Names of the failed architectures (e.g., magic_T4_N8_W15_W13_H13).
+            None after a timeout without any written log.
+        """
+
+        changed = self.wait(timeout)
+        if not changed:
+            return None
+
+        failed = set()
+        for f in changed:
+            parsed = results_db.parse_log_filename(f)
+            if parsed is None:
+                continue
+            try:
+                outcome, td = results_db.read_log_file(os.path.join(self.log_dir, f))
+            except IOError:
+                continue
+            if outcome in outcomes:
+                failed.add(parsed[0])
+
+        return failed
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def close(self):
+        """Stops watching.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        self.watching = False
+    #------------------------------------------------------------------------#
+##########################################################################
@@ -0,0 +1,535 @@
+"""Persistent index of the generated architecture artifacts of a result directory.
+
+For each architecture (technology, cluster size, wire identifier, and grid size),
+the manifest records which of its artifacts exist (the architecture, the compressed
+RR-graph, the padding log, and the metadata sidecar), with their sizes, modification
+times, and, once known, content hashes. The manifest of >>res_dir<< is stored next
+to it, as >>res_dir<<.manifest.json, and refreshed with a single listing of the
+directory, only when the modification time of the directory changed (i.e., files
+were added, removed, or renamed). Membership checks of the generation and runner
+scripts are then dictionary lookups, instead of one listing of the directory per
+channel composition.
+
+The manifest also tells apart architectures whose artifacts are all present from
+partial ones (e.g., a generation interrupted while moving the files) and stale
+ones (e.g., a truncated file, or a file whose content no longer matches the hash
+recorded in its sidecar).
+"""
+
+import os
+import re
+import json
+import time
+
+import runtime_history
+import file_lock
+import arc_meta
+import rr_store
+
+kinds = {"arc" : ".xml", "rr" : "_rr.xml.lz4", "rr_zst" : "_rr.xml.zst", "rr_header" : "_rr_header.xml.lz4",\
+         "padding" : "_padding.log", "meta" : "_meta.json"}
+
+alternatives = {"rr" : ["rr_zst", "rr_header"]}
+#A zstd archive (see >>codec.py<<) or a split RR-graph (see >>rr_store.py<<) replaces the lz4 archive.
+
+sidecar_hashes = {"arc" : "arc", "rr" : "rr_graph", "rr_zst" : "rr_graph"}
+#Hashes of the artifacts recorded by >>arc_gen.py<< in the sidecar.
+
+arc_name = "magic_T%s_N%d_W%d_W%d_H%d"
+
+##########################################################################
+def get_filename(res_dir):
+    """Returns the name of the manifest of the result directory.
+
+    Parameters
+    ----------
+    res_dir : str
+        Result directory.
+
+    Returns
+    -------
+    str
+        Manifest file name.
+    """
+
+    return os.path.normpath(res_dir) + ".manifest.json"
+##########################################################################
+
+##########################################################################
+def parse_filename(f):
+    """Splits an artifact file name into the architecture name and the artifact kind.
+
+    Parameters
+    ----------
+    f : str
+        File name (e.g., magic_T4_N8_W15_W13_H13_rr.xml.lz4).
+
+    Returns
+    -------
+    str
+        Architecture name (e.g., magic_T4_N8_W15_W13_H13).
+    str
+        Artifact kind (see >>kinds<<).
+        None if the file is not an artifact.
+    """
+
+    f = os.path.basename(f)
+    if f.endswith("_rr.xml"):
+        #Decompressed RR-graphs are temporary.
+        return None
+    for kind in sorted(kinds, key = lambda k : -len(kinds[k])):
+        if f.endswith(kinds[kind]) and len(f) > len(kinds[kind]):
+            return f[:-len(kinds[kind])], kind
+
+    return None
+##########################################################################
+
+##########################################################################
+def get_key(name):
+    """Returns the technology, cluster size, wire identifier, and grid size of the architecture.
+
+    Parameters
+    ----------
+    name : str
+        Architecture name.
+
+    Returns
+    -------
+    Tuple[str, int, int, int]
+        Technology, cluster size, wire identifier, and grid size.
+        Attributes that can not be parsed are None.
+    """
+
+    key = runtime_history.get_job_key(name + ".xml", '')
+
+    return key["tech"], key["N"], key["wire"], key["grid"]
+##########################################################################
+
+##########################################################################
+def is_complete(directory, name, needed = ("arc", "rr", "padding")):
+    """Checks if a generation left the complete artifacts of the architecture
+    in a directory, before they were moved into the result directory and registered
+    (e.g., in the working directory of an interrupted generator). The sidecar is
+    completed last (see >>arc_gen.py<<), with the hashes of the architecture and
+    of the RR-graph, against which the files are verified.
+
+    Parameters
+    ----------
+    directory : str
+        Directory.
+    name : str
+        Architecture name.
+    needed : Optional[List[str]], default = ("arc", "rr", "padding")
+        Artifact kinds.
+
+    Returns
+    -------
+    bool
+        True if all are present and match their hashes.
+    """
+
+    base = os.path.join(directory, name)
+    meta = arc_meta.load(base + kinds["arc"])
+    if meta is None:
+        return False
+    hashes = meta.get("hashes", {})
+    for kind in needed:
+        if kind == "padding":
+            if not "padding" in meta or not os.path.exists(base + kinds["padding"]):
+                return False
+            continue
+        candidates = [k for k in [kind] + alternatives.get(kind, []) if k in sidecar_hashes]
+        present = [k for k in candidates if os.path.exists(base + kinds[k])]
+        if not present or hashes.get(sidecar_hashes[present[0]], None) is None:
+            return False
+        if arc_meta.hash_file(base + kinds[present[0]]) != hashes[sidecar_hashes[present[0]]]:
+            return False
+
+    return True
+##########################################################################
+
+##########################################################################
+class Manifest(object):
+    """Artifacts of a result directory.
+
+    Parameters
+    ----------
+    res_dir : str
+        Result (architecture) directory.
+    """
+
+    #------------------------------------------------------------------------#
+    def __init__(self, res_dir):
+        """Constructor of the Manifest class.
+        """
+
+        self.res_dir = res_dir
+        self.filename = get_filename(res_dir)
+        self.dir_mtime = None
+        self.artifacts = {}
+        #name -> kind -> {"size", "mtime", "sha1"}
+        self.dirty = set()
+        self.listed = False
+
+        self.load()
+        self.sync()
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def load(self):
+        """Loads the stored manifest, if any.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        try:
+            with open(self.filename, "r") as inf:
+                stored = json.load(inf)
+            self.dir_mtime = stored["dir_mtime"]
+            self.artifacts = {str(name) : {str(kind) : stored["artifacts"][name][kind]\
+                              for kind in stored["artifacts"][name]} for name in stored["artifacts"]}
+        except:
+            self.dir_mtime = None
+            self.artifacts = {}
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def sync(self):
+        """Lists the directory again, if its modification time changed since the last listing.
+        Records of files that are unchanged are kept; new or changed files are recorded
+        without a hash, and files that disappeared are dropped.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        bool
+            True if the directory was listed.
+        """
+
+        try:
+            dir_mtime = os.stat(self.res_dir).st_mtime
+        except OSError:
+            return False
+        if dir_mtime == self.dir_mtime:
+            return False
+
+        found = {}
+        for f in os.listdir(self.res_dir):
+            parsed = parse_filename(f)
+            if parsed is None:
+                continue
+            name, kind = parsed
+            try:
+                st = os.stat(os.path.join(self.res_dir, f))
+            except OSError:
+                continue
+            entry = self.artifacts.get(name, {}).get(kind, None)
+            if entry is None or entry["size"] != st.st_size or entry["mtime"] != st.st_mtime:
+                entry = {"size" : st.st_size, "mtime" : st.st_mtime, "sha1" : None}
+                self.dirty.add(name)
+            found.setdefault(name, {})[kind] = entry
+
+        for name in self.artifacts:
+            if found.get(name, {}) != self.artifacts[name]:
+                self.dirty.add(name)
+        self.artifacts = found
+
+        self.listed = True
+        self.dir_mtime = dir_mtime if time.time() - dir_mtime > 1 else None
+        #A directory modified within the resolution of its time stamp may change
+        #again without its time stamp changing, so it is listed again next time.
+
+        return True
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def register(self, filename, sha1 = None):
+        """Records an artifact added to the directory (e.g., just moved into it).
+
+        Parameters
+        ----------
+        filename : str
+            Artifact file name.
+        sha1 : Optional[str], default = None
+            Content hash. Taken from the sidecar of the architecture,
+            if recorded there, or computed otherwise.
+
+        Returns
+        -------
+        bool
+            True if the file is an existing artifact.
+        """
+
+        parsed = parse_filename(filename)
+        filename = os.path.join(self.res_dir, os.path.basename(filename))
+        if parsed is None:
+            return False
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return False
+        name, kind = parsed
+
+        if sha1 is None and kind in sidecar_hashes:
+            meta = arc_meta.load(filename)
+            if meta is not None:
+                sha1 = meta.get("hashes", {}).get(sidecar_hashes[kind], None)
+        if sha1 is None:
+            sha1 = arc_meta.hash_file(filename)
+
+        self.artifacts.setdefault(name, {})[kind] = {"size" : st.st_size, "mtime" : st.st_mtime, "sha1" : sha1}
+        self.dirty.add(name)
+
+        return True
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get(self, name, kind):
+        """Returns the record of an artifact.
+
+        Parameters
+        ----------
+        name : str
+            Architecture name.
+        kind : str
+            Artifact kind.
+
+        Returns
+        -------
+        Dict[str, various]
+            Size, modification time, and hash, or None if the artifact is not present.
+        """
+
+        return self.artifacts.get(name, {}).get(kind, None)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def has(self, tech, N, wire, grid, needed = ("arc",)):
+        """Checks if the artifacts of the architecture are recorded.
+
+        Parameters
+        ----------
+        tech : str
+            Technology node.
+        N : int
+            Cluster size.
+        wire : int
+            Wire identifier.
+        grid : int
+            Grid size.
+        needed : Optional[List[str]], default = ("arc",)
+            Artifact kinds.
+
+        Returns
+        -------
+        bool
+            True if all are recorded.
+        """
+
+        entry = self.artifacts.get(arc_name % (tech, N, wire, grid, grid), {})
+
+        return all([kind in entry or any([alt in entry for alt in alternatives.get(kind, [])]) for kind in needed])
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def check(self, name, needed = ("arc", "rr", "padding"), verify = False):
+        """Checks the state of the artifacts of the architecture.
+
+        Parameters
+        ----------
+        name : str
+            Architecture name.
+        needed : Optional[List[str]], default = ("arc", "rr", "padding")
+            Artifact kinds.
+        verify : Optional[bool], default = False
+            Compares the content of the artifacts with the hashes
+            recorded in the sidecar. Otherwise, only the sizes are checked.
+
+        Returns
+        -------
+        str
+            "ok" if all artifacts are present and valid, "missing" if none is present,
+            "partial" if some are missing, including the stored body named by
+            a header (see >>rr_store.py<<), and "stale" if some are empty, were
+            removed since the last listing, or do not match their hash.
+        """
+
+        entry = self.artifacts.get(name, {})
+        resolved = []
+        for kind in needed:
+            present = [alt for alt in alternatives.get(kind, []) if alt in entry]
+            resolved.append(present[0] if not kind in entry and present else kind)
+        needed = resolved
+        present = [kind for kind in needed if kind in entry]
+        if not present:
+            return "missing"
+        if len(present) < len(needed):
+            return "partial"
+
+        meta = arc_meta.load(os.path.join(self.res_dir, name + kinds["arc"])) if verify else None
+        for kind in needed:
+            filename = os.path.join(self.res_dir, name + kinds[kind])
+            try:
+                st = os.stat(filename)
+            except OSError:
+                return "stale"
+            if not st.st_size:
+                return "stale"
+            if st.st_size != entry[kind]["size"] or st.st_mtime != entry[kind]["mtime"]:
+                #Rewritten in place (e.g., by >>change_delays.py<<).
+                entry[kind] = {"size" : st.st_size, "mtime" : st.st_mtime, "sha1" : None}
+                self.dirty.add(name)
+            if kind == "rr_header":
+                if entry[kind].get("body", None) is None:
+                    try:
+                        entry[kind]["body"] = rr_store.read_header(filename)[0]
+                    except (IOError, IndexError):
+                        return "stale"
+                    self.dirty.add(name)
+                    #Read only once per version of the header.
+                if not os.path.exists(entry[kind]["body"]):
+                    #Can not be restored from the header alone.
+                    return "partial"
+            if verify and meta is not None and kind in sidecar_hashes:
+                expected = meta.get("hashes", {}).get(sidecar_hashes[kind], None)
+                if expected is None:
+                    continue
+                if entry[kind]["sha1"] is None:
+                    entry[kind]["sha1"] = arc_meta.hash_file(filename)
+                    self.dirty.add(name)
+                if entry[kind]["sha1"] != expected:
+                    return "stale"
+
+        return "ok"
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def find(self, tech = None, N = None, grid = None, wires = None, needed = ("arc",)):
+        """Returns the architectures matching the attributes.
+
+        Parameters
+        ----------
+        tech : Optional[str], default = None
+            Technology node.
+        N : Optional[int], default = None
+            Cluster size.
+        grid : Optional[int], default = None
+            Grid size.
+        wires : Optional[Set[int]], default = None
+            Wire identifiers.
+        needed : Optional[List[str]], default = ("arc",)
+            Artifact kinds that must be present.
+
+        Returns
+        -------
+        List[str]
+            Sorted architecture names. Unspecified attributes match any value.
+        """
+
+        names = []
+        for name in self.artifacts:
+            if not all([kind in self.artifacts[name] for kind in needed]):
+                continue
+            key = get_key(name)
+            if tech is not None and key[0] != tech:
+                continue
+            if N is not None and key[1] != N:
+                continue
+            if wires is not None and not key[2] in wires:
+                continue
+            if grid is not None and key[3] != grid:
+                continue
+            names.append(name)
+
+        return sorted(names)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_unregistered(self, directory, prefix):
+        """Returns the files of another directory (e.g., the working directory of the
+        generator) belonging to architectures that are not complete in the manifest,
+        including temporary files named after the architecture. Architectures whose
+        generation completed in the directory (see >>is_complete<<), or at least
+        their padding, are kept, as the generator adopts them on the next invocation.
+
+        Parameters
+        ----------
+        directory : str
+            Directory.
+        prefix : str
+            Prefix of the architecture names (e.g., magic_T4_N8_W).
+
+        Returns
+        -------
+        List[str]
+            Sorted file names.
+        """
+
+        unregistered = []
+        complete = {}
+        for f in os.listdir(directory):
+            match = re.match(r"^(magic_T[^_]+_N\d+_W\d+_W\d+_H\d+)", f)
+            if not f.startswith(prefix) or match is None:
+                continue
+            name = match.group(1)
+            if self.check(name) == "ok":
+                continue
+            if not name in complete:
+                complete[name] = is_complete(directory, name) or is_complete(directory, name, ("padding",))
+            if not complete[name]:
+                unregistered.append(f)
+
+        return sorted(unregistered)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def save(self):
+        """Stores the manifest, merging it with the records of the architectures
+        updated concurrently by other processes. The file is replaced atomically.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        if not (self.dirty or self.listed) or not os.path.isdir(self.res_dir):
+            return
+
+        lock_file = self.filename + ".lock"
+        file_lock.acquire(lock_file, poll_interval = 0.1)
+        try:
+            ours = self.artifacts
+            dir_mtime = self.dir_mtime
+            self.load()
+            self.dir_mtime = dir_mtime
+            for name in self.dirty:
+                if name in ours:
+                    self.artifacts[name] = ours[name]
+                else:
+                    self.artifacts.pop(name, None)
+            ours = self.artifacts
+
+            with open(self.filename + ".tmp", "w") as outf:
+                json.dump({"dir_mtime" : self.dir_mtime, "artifacts" : ours}, outf, sort_keys = True)
+            os.rename(self.filename + ".tmp", self.filename)
+            #Files added after the last listing, here or concurrently, changed the modification
+            #time of the directory, so the next instance lists it again.
+            self.dirty = set()
+            self.listed = False
+        finally:
+            file_lock.release(lock_file)
+    #------------------------------------------------------------------------#
+##########################################################################
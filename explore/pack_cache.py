@@ -0,0 +1,153 @@
+"""Cache of packed netlists, shared by all VPR runs (see >>run_vpr.py<<).
+
+Clustering depends only on the circuit and the description of the logic
+blocks, which is the same for all channel compositions of a given cluster
+size and technology. Hence, VPR packs each circuit only once per such
+description and all subsequent runs only place and route the cached netlist.
+
+The description is fingerprinted by hashing the <models> and <complexblocklist>
+sections of the architecture file. By default, the delay values are removed
+before hashing, as the intra-cluster delays measured by SPICE differ slightly
+between channel compositions, which has practically no effect on clustering.
+"""
+
+import os
+import re
+import hashlib
+
+import file_lock
+
+delay_attribute = re.compile(r"\b(max|min|value)=\"[^\"]*\"")
+#Delay values of <delay_constant>, <T_setup>, and <T_clock_to_Q>.
+
+delay_matrix = re.compile(r"(<delay_matrix[^>]*>)[^<]*(</delay_matrix>)")
+
+##########################################################################
+def get_section(txt, tag):
+    """Returns the section of the architecture enclosed by the tag.
+
+    Parameters
+    ----------
+    txt : str
+        Architecture description.
+    tag : str
+        Tag name.
+
+    Returns
+    -------
+    str
+        Section, including the enclosing tags (empty if not found).
+    """
+
+    start = txt.find("<%s>" % tag)
+    end = txt.find("</%s>" % tag)
+    if start < 0 or end < 0:
+        return ''
+
+    return txt[start:end + len(tag) + 3]
+##########################################################################
+
+##########################################################################
+def get_fingerprint(arc_file, strict = False):
+    """Computes the fingerprint of the logic-block description.
+
+    Parameters
+    ----------
+    arc_file : str
+        Architecture file name.
+    strict : Optional[bool], default = False
+        Include the delay values in the fingerprint.
+
+    Returns
+    -------
+    str
+        Fingerprint.
+    """
+
+    with open(arc_file, "r") as inf:
+        txt = inf.read()
+
+    blocks = get_section(txt, "models") + get_section(txt, "complexblocklist")
+    if not strict:
+        blocks = delay_attribute.sub(r'\1=""', blocks)
+        blocks = delay_matrix.sub(r"\1\2", blocks)
+    blocks = ' '.join(blocks.split())
+
+    return hashlib.sha1(blocks.encode("utf-8")).hexdigest()[:16]
+##########################################################################
+
+##########################################################################
+def get_net_filename(cache_dir, arc_file, circ_file, strict = False):
+    """Returns the name of the cached netlist.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Cache directory.
+    arc_file : str
+        Architecture file name.
+    circ_file : str
+        Circuit file name.
+    strict : Optional[bool], default = False
+        Include the delay values in the fingerprint.
+
+    Returns
+    -------
+    str
+        Netlist file name.
+    """
+
+    circ = os.path.basename(circ_file).rsplit(".blif", 1)[0]
+
+    return "%s/%s_%s.net" % (cache_dir, circ, get_fingerprint(arc_file, strict))
+##########################################################################
+
+##########################################################################
+def get_packed_netlist(cache_dir, arc_file, circ_file, pack_call, strict = False, poll_interval = 2):
+    """Returns the cached netlist, packing the circuit first if needed.
+    A lock file holding the pid of the packing process ensures that only
+    one process packs each netlist, while the others wait for it.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Cache directory.
+    arc_file : str
+        Architecture file name.
+    circ_file : str
+        Circuit file name.
+    pack_call : str
+        VPR call that packs the circuit into >>circ<<.net in the current directory.
+    strict : Optional[bool], default = False
+        Include the delay values in the fingerprint.
+    poll_interval : Optional[int], default = 2
+        Number of seconds between two checks of the lock.
+
+    Returns
+    -------
+    str
+        Netlist file name, or None if packing failed.
+    bool
+        True if the netlist was found in the cache.
+    """
+
+    net_file = get_net_filename(cache_dir, arc_file, circ_file, strict)
+    lock_file = net_file + ".lock"
+    os.system("mkdir -p %s" % cache_dir)
+
+    if not file_lock.acquire(lock_file, lambda : os.path.exists(net_file), poll_interval):
+        return net_file, True
+    try:
+        if os.path.exists(net_file):
+            return net_file, True
+        os.system(pack_call)
+        local_net = os.path.basename(circ_file).rsplit(".blif", 1)[0] + ".net"
+        if not os.path.exists(local_net):
+            return None, False
+        os.system("cp %s %s.%d.tmp" % (local_net, net_file, os.getpid()))
+        os.rename("%s.%d.tmp" % (net_file, os.getpid()), net_file)
+    finally:
+        file_lock.release(lock_file)
+
+    return net_file, False
+##########################################################################
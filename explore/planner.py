@@ -0,0 +1,420 @@
+"""Cost estimates of campaigns, printed by >>runner_scripts/run_magic.py<<, >>runner_scripts/cruncher.py<<,
+and >>runner_scripts/run_benchmarks.py<< when called with --plan 1, instead of running them.
+
+A campaign is a sequence of stages, each a set of independent jobs run in parallel:
+generation of the architectures with SPICE (one job per channel composition, at the
+smallest grid size), generation of the other grid sizes (which inherit the measured
+delays), and VPR runs. Every job is priced individually:
+
+VPR : predicted runtime from the history (see >>runtime_history.RuntimePredictor<<),
+      or >>default_vpr_s_per_tile<< times the grid area if there is no history at all.
+SPICE : number of HSPICE runs per wire type of the channel composition, at the robustness
+        level of >>arc_gen.py<<, times the duration of a run. Both are fitted on the sidecars
+        of the architectures generated so far (see >>arc_meta.py<<), or taken from
+        >>default_spice_runs<< and >>default_spice_s<<.
+Generation : the rest of the generation time, per grid tile, fitted the same way.
+Disk : size of the artifacts of an architecture per grid tile, fitted on the manifests
+       (see >>manifest.py<<).
+
+The makespan of a stage is obtained by list scheduling of its jobs, longest first
+(see >>runtime_history.simulate_makespan<<), on as many slots as the scripts use
+(HSPICE_CPU for SPICE and VPR_CPU otherwise). The stages run one after the other.
+"""
+
+import os
+
+import setenv
+import runtime_history
+import manifest
+import arc_meta
+
+robustness_level = 2
+#Default of >>arc_gen.py<<, which >>generate_files_for_magic_formula.py<< does not change.
+
+fixed_spice_runs = 3
+#Connection-block (horizontal and vertical) and LUT-access delays, measured once per architecture.
+
+default_spice_runs = {0 : 1, 1 : 1, 2 : 4, 3 : 16}
+#HSPICE runs per wire type, for each robustness level, used until fitted.
+
+default_spice_s = 30.0
+#Seconds per HSPICE run.
+
+default_gen_s_per_tile = 0.05
+#Seconds of generation (without SPICE) per grid tile.
+
+default_vpr_s_per_tile = 0.1
+#Seconds of a VPR run per grid tile.
+
+default_disk_per_tile = 20e3
+#Bytes of the artifacts of an architecture per grid tile.
+
+default_wire_types = 6
+#Wire types of a channel composition whose wire file is not available.
+
+max_sidecars = 200
+#Number of architectures sampled from each directory for the fit.
+
+##########################################################################
+def count_wire_types(wire_file):
+    """Returns the number of wire types of a channel composition.
+
+    Parameters
+    ----------
+    wire_file : str
+        Wire file name (see >>enum_channel_compositions.py<<).
+
+    Returns
+    -------
+    int
+        Number of wire types.
+    """
+
+    try:
+        with open(wire_file, "r") as inf:
+            return len([line for line in inf if line[0] in ('H', 'V')])
+    except IOError:
+        return default_wire_types
+##########################################################################
+
+##########################################################################
+def list_compositions(chan_dir, tech):
+    """Lists the channel compositions of a technology.
+
+    Parameters
+    ----------
+    chan_dir : str
+        Channel directory (see >>enum_channel_compositions.py<<).
+    tech : str
+        Technology node.
+
+    Returns
+    -------
+    List[Tuple[int, int]]
+        Wire identifiers and numbers of wire types.
+    """
+
+    compositions = []
+    if not os.path.isdir(chan_dir):
+        return compositions
+    for c in sorted(os.listdir(chan_dir)):
+        if c.rsplit('T', 1)[1].split('_', 1)[0] != tech:
+            continue
+        compositions.append((int(c.split('_')[1].rsplit('.', 1)[0]), count_wire_types(os.path.join(chan_dir, c))))
+
+    return compositions
+##########################################################################
+
+##########################################################################
+def get_pending_generation(arc_dir, tech, N, compositions, grids):
+    """Returns the architectures that >>generate_files_for_magic_formula.py<< would (re)generate.
+
+    Parameters
+    ----------
+    arc_dir : str
+        Architecture directory.
+    tech : str
+        Technology node.
+    N : int
+        Cluster size.
+    compositions : List[Tuple[int, int]]
+        Wire identifiers and numbers of wire types.
+    grids : List[int]
+        Grid sizes, the smallest first.
+
+    Returns
+    -------
+    List[Tuple[int, List[int], int]]
+        Compositions in the format of >>Planner.add_generation<<.
+    """
+
+    arc_manifest = manifest.Manifest(arc_dir) if os.path.isdir(arc_dir) else None
+    pending = []
+    for wire, wire_types in compositions:
+        missing = [grid for grid in grids if arc_manifest is None\
+                   or arc_manifest.check(manifest.arc_name % (tech, N, wire, grid, grid)) != "ok"]
+        if missing:
+            pending.append((wire_types, missing, grids[0]))
+
+    return pending
+##########################################################################
+
+##########################################################################
+class Planner(object):
+    """Prices the jobs of a campaign and reports the totals.
+
+    Parameters
+    ----------
+    arc_dirs : Optional[List[str]], default = None
+        Architecture directories on whose sidecars and manifests the models are fitted.
+        The missing ones are ignored.
+    """
+
+    #------------------------------------------------------------------------#
+    def __init__(self, arc_dirs = None):
+        """Constructor of the Planner class.
+        """
+
+        self.runtime_predictor = runtime_history.RuntimePredictor()
+        self.spice_s = []
+        self.spice_runs = {}
+        #robustness level -> runs per wire type
+        self.gen_s_per_tile = []
+        self.disk_per_tile = []
+        self.sidecars = 0
+        for arc_dir in (arc_dirs or []):
+            if os.path.isdir(arc_dir):
+                self.fit(arc_dir)
+
+        self.stages = []
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def fit(self, arc_dir):
+        """Collects the measurements of the architectures of the directory.
+
+        Parameters
+        ----------
+        arc_dir : str
+            Architecture directory.
+
+        Returns
+        -------
+        None
+        """
+
+        arc_manifest = manifest.Manifest(arc_dir)
+        for name in sorted(arc_manifest.artifacts)[:max_sidecars]:
+            grid = manifest.get_key(name)[3]
+            if not grid:
+                continue
+            artifacts = arc_manifest.artifacts[name]
+            self.disk_per_tile.append(sum([artifacts[kind]["size"] for kind in artifacts]) / float(grid ** 2))
+            if not "meta" in artifacts:
+                continue
+            meta = arc_meta.load(os.path.join(arc_dir, name + ".xml"))
+            try:
+                spice = meta["spice"]
+                self.gen_s_per_tile.append((meta["runtime"] - spice["runtime"]) / float(grid ** 2))
+            except (TypeError, KeyError):
+                #Generated before the runtimes were recorded.
+                continue
+            self.sidecars += 1
+            if not spice["runs"]:
+                #Inherited the delays.
+                continue
+            self.spice_s.append(spice["runtime"] / spice["runs"])
+            try:
+                wire_types = len(meta["composition"]["H"]) + len(meta["composition"]["V"])
+                level = meta["generator"]["robustness_level"]
+            except KeyError:
+                continue
+            self.spice_runs.setdefault(level, []).append(max(0, spice["runs"] - fixed_spice_runs) / float(max(1, wire_types)))
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def price_generation(self, wire_types, grid, spice = True, level = robustness_level):
+        """Prices the generation of an architecture.
+
+        Parameters
+        ----------
+        wire_types : int
+            Number of wire types of the channel composition.
+        grid : int
+            Grid size.
+        spice : Optional[bool], default = True
+            Specifies that the delays are measured, instead of inherited.
+        level : Optional[int], default = robustness_level
+            Robustness level of the measurements.
+
+        Returns
+        -------
+        float
+            Runtime in seconds.
+        float
+            HSPICE license time in seconds.
+        """
+
+        gen_s_per_tile = runtime_history.median(self.gen_s_per_tile) if self.gen_s_per_tile else default_gen_s_per_tile
+        runtime = gen_s_per_tile * grid ** 2
+        if not spice:
+            return runtime, 0.0
+
+        per_type = self.spice_runs.get(level, [])
+        runs = fixed_spice_runs + wire_types * (runtime_history.median(per_type) if per_type else default_spice_runs[level])
+        license_time = runs * (runtime_history.median(self.spice_s) if self.spice_s else default_spice_s)
+
+        return runtime + license_time, license_time
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def price_vpr(self, arc, circ):
+        """Prices a VPR run.
+
+        Parameters
+        ----------
+        arc : str
+            Architecture file name.
+        circ : str
+            Circuit file name.
+
+        Returns
+        -------
+        float
+            Runtime in seconds.
+        """
+
+        key = runtime_history.get_job_key(arc, circ)
+        if self.runtime_predictor.per_tile:
+            return self.runtime_predictor.predict(key)
+
+        return default_vpr_s_per_tile * (key["grid"] or 1) ** 2
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_disk(self, grid):
+        """Returns the disk usage of the artifacts of an architecture.
+
+        Parameters
+        ----------
+        grid : int
+            Grid size.
+
+        Returns
+        -------
+        float
+            Size in bytes.
+        """
+
+        return (runtime_history.median(self.disk_per_tile) if self.disk_per_tile else default_disk_per_tile) * grid ** 2
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def add_generation(self, name, compositions, level = robustness_level):
+        """Adds the two generation stages of a set of channel compositions, as run
+        by >>generate_files_for_magic_formula.py<<.
+
+        Parameters
+        ----------
+        name : str
+            Stage name prefix.
+        compositions : List[Tuple[int, List[int], int]]
+            Number of wire types of each composition, the grid sizes to be generated,
+            and the grid size measured with SPICE. The others inherit its delays.
+        level : Optional[int], default = robustness_level
+            Robustness level of the measurements.
+
+        Returns
+        -------
+        None
+        """
+
+        spice_jobs = []
+        other_jobs = []
+        disk = 0.0
+        for wire_types, grids, base_grid in compositions:
+            for grid in grids:
+                if grid == base_grid:
+                    spice_jobs.append(self.price_generation(wire_types, grid, True, level))
+                else:
+                    other_jobs.append(self.price_generation(wire_types, grid, False))
+                disk += self.get_disk(grid)
+        self.add_stage(name + " (SPICE)", "spice", spice_jobs, disk)
+        self.add_stage(name + " (other grids)", "cpu", other_jobs)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def add_vpr(self, name, jobs, log_dir = None):
+        """Adds a stage of VPR runs.
+
+        Parameters
+        ----------
+        name : str
+            Stage name.
+        jobs : List[Tuple[str, str, int]]
+            Architecture, circuit, and seed of each run.
+        log_dir : Optional[str], default = None
+            Log directory. The runs that already have a log are not priced.
+
+        Returns
+        -------
+        None
+        """
+
+        if log_dir is not None:
+            jobs = [job for job in jobs if not os.path.exists(os.path.join(log_dir, "%s_%s_%d.log"\
+                    % (os.path.basename(job[0]).rsplit(".xml", 1)[0], os.path.basename(job[1]).rsplit(".blif", 1)[0], job[2])))]
+        self.add_stage(name, "cpu", [(self.price_vpr(job[0], job[1]), 0.0) for job in jobs])
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def add_stage(self, name, kind, jobs, disk = 0.0):
+        """Adds a stage. A stage of the same name is extended instead,
+        as if the two ran one after the other.
+
+        Parameters
+        ----------
+        name : str
+            Stage name.
+        kind : str
+            "spice" for stages limited by the HSPICE licenses, "cpu" otherwise.
+        jobs : List[Tuple[float, float]]
+            Runtime and HSPICE license time of each job in seconds.
+        disk : Optional[float], default = 0.0
+            Disk usage of the produced files in bytes.
+
+        Returns
+        -------
+        None
+        """
+
+        if not jobs:
+            return
+        max_cpu = int(os.environ["VPR_CPU"])
+        slots = min(int(os.environ["HSPICE_CPU"]), max_cpu) if kind == "spice" else max_cpu
+        runtimes = sorted([job[0] for job in jobs], reverse = True)
+        stage = {"name" : name, "jobs" : len(jobs), "cpu_s" : sum(runtimes),\
+                 "license_s" : sum([job[1] for job in jobs]), "disk" : disk,\
+                 "makespan" : runtime_history.simulate_makespan(runtimes, slots)}
+        for prev in self.stages:
+            if prev["name"] == name:
+                for k in stage:
+                    if k != "name":
+                        prev[k] += stage[k]
+                return
+        self.stages.append(stage)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def report(self, title):
+        """Prints the stages and the totals.
+
+        Parameters
+        ----------
+        title : str
+            Campaign description.
+
+        Returns
+        -------
+        Dict[str, float]
+            Totals: "jobs", "cpu_s", "license_s", "disk", and "makespan".
+        """
+
+        totals = {"name" : "Total", "jobs" : 0, "cpu_s" : 0.0, "license_s" : 0.0, "disk" : 0.0, "makespan" : 0.0}
+        for stage in self.stages:
+            for k in totals:
+                if k != "name":
+                    totals[k] += stage[k]
+
+        row = "%-36s %8s %10s %10s %10s %9s"
+        print("Plan of %s (HSPICE_CPU = %s, VPR_CPU = %s)" % (title, os.environ["HSPICE_CPU"], os.environ["VPR_CPU"]))
+        print(row % ("stage", "jobs", "CPU-h", "license-h", "makespan-h", "disk-GB"))
+        for stage in self.stages + [totals]:
+            print(row % (stage["name"], stage["jobs"], "%.1f" % (stage["cpu_s"] / 3600.0), "%.1f" % (stage["license_s"] / 3600.0),\
+                         "%.1f" % (stage["makespan"] / 3600.0), "%.1f" % (stage["disk"] / 1e9)))
+        print("Priced from %d history entries, %d sidecars, and %d manifest entries (defaults where none)."\
+              % (len(self.runtime_predictor.per_tile), self.sidecars, len(self.disk_per_tile)))
+
+        return totals
+    #------------------------------------------------------------------------#
+##########################################################################
@@ -5,14 +5,19 @@ architecture are cancelled to an extent. Medians are picked per circuit instead
 as different formulas may differently skew the results for each particular circuit. Also, we avoid double processing of
 the already averaged-out quantities, which may be hard to do in a sound manner.
 
+The results of each directory are ranked in-process by >>ranking.py<<.
+
 Some filename templates may need to be changed, depending on how the rest of the flow was run.
 """
 
 import os
 import copy
-from ast import literal_eval
+import sys
+sys.path.insert(0,'..')
+sys.path.insert(0,'../..')
 
-sort_call = "python sort_magic.py --arc_dir %s --log_dir %s --out_file %s --N %d --tech %s --sort_key delay --get_median_dict 1 > dict.read"
+import ranking
+from conf import grid_sizes
 
 sort_log_template = "../runner_scripts/all_circs_N8_T%s.sort"
 out_file_template = "N%d_T%s_W%d.sort"
@@ -33,26 +38,17 @@ for d in os.listdir("../runner_scripts/"):
         N = get_N(d)
         if not tech in res_dict:
             res_dict.update({tech : {n : copy.deepcopy(prototype) for n in [2, 4, 8, 16]}})
-        with open(sort_log_template % tech, "r") as inf:
-            lines = inf.readlines()
-        for lcnt, line in enumerate(lines[1:], 1):
-            line_wire = int(line.split()[0].split("_W")[1])
-            if wire == line_wire:
-                wire_index = lcnt
-                break
-        out_file = out_file_template % (N, tech, wire)
-        os.system(sort_call % (arc_dir, log_dir, out_file, N, tech))
-        with open(out_file, "r") as inf:
-            lines = inf.readlines()
-        geom = float(lines[1].split()[1])
-        with open("dict.read", "r") as inf:
-            txt = inf.read().strip()
-        os.system("rm -rf dict.read")
-        local_dict = literal_eval(txt)
-        local_dict = local_dict[list(local_dict.keys())[0]]
-        if abs(geom - get_geomean(local_dict)) > 0.01:
-            print "Geomean mismatch!"
+        sorted_wires = [ranking.get_wire(arc) for arc in ranking.read_sort_file(sort_log_template % tech)]
+        wire_index = sorted_wires.index(wire) + 1
+        rank = ranking.Ranking(N, tech, list(grid_sizes[N]), arc_dir)
+        rank.update(log_dir)
+        rank.write(out_file_template % (N, tech, wire))
+        top = rank.top(1)
+        if not top:
+            print "Missing results!"
             exit(-1)
+        arc, geom = top[0][:2]
+        local_dict = rank.get_medians(arc)
 
         res_dict[tech][N]["wires"].update({wire : {"index" : wire_index, "td" : geom}})
         for circ in local_dict:
@@ -0,0 +1,139 @@
+"""Compares two rankings of magic formulas produced by >>sort_magic.py<<.
+Used to assess how well a cheaper search (e.g., successive halving)
+reproduces the ranking obtained by exhaustively evaluating all architectures.
+
+Parameters
+----------
+ref : str
+    Reference (exhaustive) sorting results.
+test : str
+    Sorting results to be compared against the reference.
+top_k : Optional[int], default = 3
+    Number of top-ranked architectures to compare.
+
+Returns
+-------
+None
+"""
+
+import argparse
+
+##########################################################################
+def read_sort_file(filename):
+    """Reads a sorting log.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the sorting log.
+
+    Returns
+    -------
+    List[Tuple[str, float]]
+        Architectures and their geomean delays, in the sorted order.
+    """
+
+    with open(filename, "r") as inf:
+        lines = inf.readlines()
+
+    ranking = []
+    for line in lines:
+        if line.startswith('#') or not line.strip():
+            continue
+        words = line.split()
+        ranking.append((words[0], float(words[1])))
+
+    return ranking
+##########################################################################
+
+##########################################################################
+def spearman(ref, test):
+    """Computes the Spearman rank correlation between the two rankings,
+    over the architectures appearing in both of them.
+
+    Parameters
+    ----------
+    ref : List[str]
+        Reference ranking.
+    test : List[str]
+        Ranking to compare.
+
+    Returns
+    -------
+    float
+        Rank correlation coefficient.
+    int
+        Number of common architectures.
+    """
+
+    common = set(ref) & set(test)
+    ref = [arc for arc in ref if arc in common]
+    test = [arc for arc in test if arc in common]
+    n = len(common)
+    if n < 2:
+        return float("nan"), n
+
+    test_rank = {arc : i for i, arc in enumerate(test)}
+    d2 = sum([(i - test_rank[arc]) ** 2 for i, arc in enumerate(ref)])
+
+    return 1 - 6.0 * d2 / (n * (n ** 2 - 1)), n
+##########################################################################
+
+##########################################################################
+def compare(ref_file, test_file, top_k):
+    """Compares the rankings and returns a printable report.
+
+    Parameters
+    ----------
+    ref_file : str
+        Reference sorting log.
+    test_file : str
+        Sorting log to compare.
+    top_k : int
+        Number of top-ranked architectures to compare.
+
+    Returns
+    -------
+    str
+        Comparison report.
+    """
+
+    ref = read_sort_file(ref_file)
+    test = read_sort_file(test_file)
+    ref_arcs = [r[0] for r in ref]
+    test_arcs = [t[0] for t in test]
+    ref_td = {r[0] : r[1] for r in ref}
+
+    txt = "Reference: %s (%d architectures)\n" % (ref_file, len(ref))
+    txt += "Test: %s (%d architectures)\n" % (test_file, len(test))
+
+    overlap = set(ref_arcs[:top_k]) & set(test_arcs[:top_k])
+    txt += "Top-%d overlap: %d/%d\n" % (top_k, len(overlap), top_k)
+    for i, arc in enumerate(test_arcs[:top_k]):
+        ref_rank = ref_arcs.index(arc) + 1 if arc in ref_td else -1
+        txt += "%d. %s reference rank: %d\n" % (i + 1, arc, ref_rank)
+
+    if test_arcs and ref_arcs and test_arcs[0] in ref_td:
+        regret = ref_td[test_arcs[0]] / ref_td[ref_arcs[0]] - 1
+        txt += "Best-architecture delay regret: %.2f%%\n" % (100 * regret)
+
+    rho, n = spearman(ref_arcs, test_arcs)
+    txt += "Spearman rank correlation over %d common architectures: %.3f" % (n, rho)
+
+    return txt
+##########################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ref")
+    parser.add_argument("--test")
+    parser.add_argument("--top_k")
+    args = parser.parse_args()
+
+    top_k = 3
+    try:
+        top_k = int(args.top_k)
+    except:
+        pass
+
+    print(compare(args.ref, args.test, top_k))
@@ -0,0 +1,124 @@
+"""Evaluates the early-abort model of >>route_monitor.py<< offline, by replaying
+the router traces of the runs that were allowed to complete. A false positive
+is a routed run that the model would have aborted.
+
+Parameters
+----------
+trace_file : Optional[str], default = route_monitor.trace_filename
+    File holding the router traces.
+min_iter : Optional[int], default = 10
+    Number of router iterations before the first prediction.
+window : Optional[int], default = 5
+    Number of most recent router iterations used for the prediction.
+slack : Optional[float], default = 1.5
+    Multiplier of the router iteration limit that the projected convergence may reach.
+min_overused : Optional[int], default = 10
+    Number of overused nodes below which no run is aborted.
+is_magic : Optional[bool], default = None
+    Only evaluates the runs with (1) or without (0) the magic flags. All by default.
+verbose : Optional[bool], default = False
+    Lists the false positives.
+
+Returns
+-------
+None
+"""
+
+import argparse
+import sys
+sys.path.insert(0,'..')
+
+import runtime_history
+import route_monitor
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--trace_file")
+parser.add_argument("--min_iter")
+parser.add_argument("--window")
+parser.add_argument("--slack")
+parser.add_argument("--min_overused")
+parser.add_argument("--is_magic")
+parser.add_argument("--verbose")
+args = parser.parse_args()
+
+trace_file = route_monitor.trace_filename
+if args.trace_file is not None:
+    trace_file = args.trace_file
+
+MIN_ITER = 10
+try:
+    MIN_ITER = int(args.min_iter)
+except:
+    pass
+
+WINDOW = 5
+try:
+    WINDOW = int(args.window)
+except:
+    pass
+
+SLACK = 1.5
+try:
+    SLACK = float(args.slack)
+except:
+    pass
+
+MIN_OVERUSED = 10
+try:
+    MIN_OVERUSED = int(args.min_overused)
+except:
+    pass
+
+IS_MAGIC = None
+try:
+    IS_MAGIC = int(args.is_magic)
+except:
+    pass
+
+VERBOSE = False
+try:
+    VERBOSE = int(args.verbose)
+except:
+    pass
+
+tp = fp = tn = fn = 0
+skipped = 0
+saved_iters = 0
+total_iters = 0
+false_positives = []
+for e in runtime_history.load(trace_file):
+    if IS_MAGIC is not None and e.get("is_magic", 0) != IS_MAGIC:
+        continue
+    if e["outcome"] == "predicted_fail":
+        skipped += 1
+        #The true outcome of the aborted runs is unknown.
+        continue
+
+    predictor = route_monitor.ConvergencePredictor(e["max_iter"], MIN_ITER, WINDOW, SLACK, MIN_OVERUSED)
+    abort_iter = predictor.replay(e["trace"])
+    routed = e["outcome"] == "success"
+    total_iters += len(e["trace"])
+    if abort_iter is None:
+        if routed:
+            tn += 1
+        else:
+            fn += 1
+    elif routed:
+        fp += 1
+        false_positives.append("%s N%s grid %s T%s W%s seed %s: aborted at %d of %d"\
+                               % (e["circ"], e["N"], e["grid"], e["tech"], e["wire"], e["seed"],\
+                                  abort_iter, e["trace"][-1][0]))
+    else:
+        tp += 1
+        saved_iters += e["trace"][-1][0] - abort_iter
+
+ratio = lambda a, b : float(a) / b if b else float("nan")
+
+print("Evaluated runs: %d routed, %d unrouted (%d aborted runs skipped)" % (fp + tn, tp + fn, skipped))
+print("False positive rate: %.4f (%d)" % (ratio(fp, fp + tn), fp))
+print("Detection rate: %.4f (%d)" % (ratio(tp, tp + fn), tp))
+print("Router iterations saved: %d of %d (%.2f%%)" % (saved_iters, total_iters, 100 * ratio(saved_iters, total_iters)))
+
+if VERBOSE:
+    for line in false_positives:
+        print(line)
@@ -0,0 +1,38 @@
+"""Imports the existing run logs into the results databases (see >>results_db.py<<).
+Results already in a database are kept.
+
+Parameters
+----------
+log_dirs : str
+    A space-separated list of log directories.
+
+Returns
+-------
+None
+"""
+
+import os
+import argparse
+import sys
+sys.path.insert(0,'..')
+
+import results_db
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--log_dirs")
+args = parser.parse_args()
+
+for log_dir in args.log_dirs.split():
+    if not os.path.isdir(log_dir):
+        print("%s is not a directory." % log_dir)
+        continue
+    conn = results_db.connect(log_dir)
+    try:
+        before = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        conn.execute("BEGIN IMMEDIATE")
+        logs = results_db.import_log_dir(conn, log_dir)
+        conn.execute("COMMIT")
+        after = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    finally:
+        conn.close()
+    print("%s: %d logs, %d new results, %d in total." % (log_dir, logs, after - before, after))
@@ -0,0 +1,60 @@
+"""Reports the effectiveness of the VPR result cache (see >>result_cache.py<<),
+per campaign (log directory): the number of runs looked up in the cache, the hit rate,
+and the CPU time avoided by the hits, i.e., the runtimes of the runs that produced
+the reused results.
+
+Parameters
+----------
+cache_dir : str
+    Result cache directory.
+log_dirs : Optional[str], default = None
+    Space-separated list of log directories to report. All by default.
+
+Returns
+-------
+None
+"""
+
+import os
+import argparse
+import sys
+sys.path.insert(0,'..')
+sys.path.insert(0,'../..')
+
+import runtime_history
+import result_cache
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--cache_dir")
+parser.add_argument("--log_dirs")
+args = parser.parse_args()
+
+LOG_DIRS = None
+try:
+    LOG_DIRS = set([os.path.abspath(log_dir) for log_dir in args.log_dirs.split()])
+except:
+    pass
+
+campaigns = {}
+for e in runtime_history.load(os.path.join(args.cache_dir, result_cache.events_filename)):
+    if LOG_DIRS is not None and not e["log_dir"] in LOG_DIRS:
+        continue
+    stats = campaigns.setdefault(e["log_dir"], {"hit" : 0, "miss" : 0, "saved" : 0.0, "spent" : 0.0})
+    stats[e["event"]] += 1
+    stats["saved" if e["event"] == "hit" else "spent"] += e["runtime"] or 0.0
+
+ratio = lambda a, b : float(a) / b if b else float("nan")
+
+total = {"hit" : 0, "miss" : 0, "saved" : 0.0, "spent" : 0.0}
+print("#log_dir runs hits hit_rate cpu_h_avoided cpu_h_spent")
+for log_dir in sorted(campaigns):
+    stats = campaigns[log_dir]
+    for s in total:
+        total[s] += stats[s]
+    print("%s %d %d %.3f %.2f %.2f" % (log_dir, stats["hit"] + stats["miss"], stats["hit"],\
+                                       ratio(stats["hit"], stats["hit"] + stats["miss"]),\
+                                       stats["saved"] / 3600, stats["spent"] / 3600))
+
+print("Total: %d runs, %d hits (%.2f%%), %.2f CPU-hours avoided, %.2f CPU-hours spent"\
+      % (total["hit"] + total["miss"], total["hit"], 100 * ratio(total["hit"], total["hit"] + total["miss"]),\
+         total["saved"] / 3600, total["spent"] / 3600))
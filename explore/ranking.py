@@ -0,0 +1,430 @@
+"""Incremental ranking of the channel compositions (magic formulas) by their VPR results.
+
+For each architecture (e.g., magic_T4_N8_W15, over all its grid sizes), a >>Ranking<<
+keeps the seed results of every circuit, together with running aggregates: the sum of
+the logarithms of the per-circuit seed medians, minima, and maxima, and the number
+of circuits having enough seeds. Adding a result updates only the affected circuit,
+so the geomeans, the area, and the area-delay product of every complete architecture
+are available at any time, without rereading the logs. Results are pulled from the
+results database of a log directory (see >>results_db.py<<), reading only the rows
+written since the previous update, or from the log files if there is no database.
+
+The ranking reproduces >>processing_scripts/sort_magic.py<<, which is now a thin
+wrapper around it, and can be used directly by the runner and processing scripts.
+The callers must have the repository root on the path (for >>arc_meta.py<<).
+"""
+
+import os
+import math
+import heapq
+
+import results_db
+import arc_meta
+
+import conf
+
+sort_keys = ["delay", "area", "apd"]
+
+get_arc = lambda f : '_'.join(f.split('_')[:4])
+get_wire = lambda arc : int(arc.split('_')[3][1:])
+
+##########################################################################
+def get_median(tds):
+    """Returns the median of the seed results.
+
+    Parameters
+    ----------
+    tds : List[float]
+        Critical path delays.
+
+    Returns
+    -------
+    float
+        Median.
+    """
+
+    tds = sorted(tds)
+    if len(tds) % 2:
+        return tds[len(tds) // 2]
+
+    return 0.5 * (tds[len(tds) // 2 - 1] + tds[len(tds) // 2])
+##########################################################################
+
+##########################################################################
+def read_area(arc_dir, arc, N, circs):
+    """Reads the tile area of the architecture from the sidecar of any of
+    its grid sizes, falling back to the padding log.
+
+    Parameters
+    ----------
+    arc_dir : str
+        Architecture directory.
+    arc : str
+        Architecture name (e.g., magic_T4_N8_W15).
+    N : int
+        Cluster size.
+    circs : List[str]
+        Circuits whose grid sizes are tried.
+
+    Returns
+    -------
+    float
+        Area in um^2 or None if not found.
+    """
+
+    for circ in circs:
+        dim = conf.grid_sizes[N][circ]
+        padding_log = "%s/%s_W%d_H%d_padding.log" % (arc_dir, arc, dim, dim)
+        meta = arc_meta.load(padding_log)
+        if meta is not None:
+            return arc_meta.get_area(meta)
+        try:
+            with open(padding_log, "r") as inf:
+                lines = inf.readlines()
+        except:
+            continue
+        for line in lines:
+            if line.startswith("Active dimensions:"):
+                wa = int(line.split()[-4])
+                ha = int(line.split()[-2])
+            elif line.startswith("Metal dimensions:"):
+                wm = int(line.split()[-4])
+                hm = int(line.split()[-2])
+                break
+        return max(wa, wm) * max(ha, hm) / 1000000.0
+
+    return None
+##########################################################################
+
+##########################################################################
+def read_sort_file(sort_file):
+    """Reads the architectures from a sorting log, in the ranked order.
+
+    Parameters
+    ----------
+    sort_file : str
+        Sorting log name.
+
+    Returns
+    -------
+    List[str]
+        Architecture names. Empty if the log does not exist.
+    """
+
+    try:
+        with open(sort_file, "r") as inf:
+            lines = inf.readlines()
+    except:
+        return []
+
+    return [line.split()[0] for line in lines if line.strip() and not line.startswith('#')]
+##########################################################################
+
+##########################################################################
+class Ranking(object):
+    """Running aggregates of the VPR results of all architectures
+    of one cluster size and technology.
+
+    Parameters
+    ----------
+    N : int
+        Cluster size.
+    tech : str
+        Technology node.
+    circs : List[str]
+        Circuits required for an architecture to be ranked.
+    arc_dir : str
+        Architecture directory, holding the sidecars or the padding logs.
+    seeds : Optional[List[int]], default = conf.seeds
+        Placement seeds taken into account.
+    min_seeds : Optional[int], default = len(seeds)
+        Minimum number of seeds required per circuit.
+    """
+
+    #------------------------------------------------------------------------#
+    def __init__(self, N, tech, circs, arc_dir, seeds = None, min_seeds = None):
+        """Constructor of the Ranking class.
+        """
+
+        if seeds is None:
+            seeds = conf.seeds
+        self.N = N
+        self.tech = tech
+        self.circs = set(circs)
+        self.arc_dir = arc_dir
+        self.seeds = set([int(s) for s in seeds])
+        self.min_seeds = len(self.seeds) if min_seeds is None else min_seeds
+
+        self.tds = {}
+        #arc -> circ -> seed -> td
+        self.aggr = {}
+        #arc -> [log median sum, log min sum, log max sum, complete circuits, seed count histogram]
+        self.areas = {}
+        self.complete = set()
+        self.timed_out = set()
+
+        self.last_rowid = 0
+        self.seen_logs = {}
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_contribution(self, arc, circ):
+        """Returns the contribution of the circuit to the aggregates of the architecture.
+
+        Parameters
+        ----------
+        arc : str
+            Architecture name.
+        circ : str
+            Circuit name.
+
+        Returns
+        -------
+        Tuple[float, float, float, int]
+            Logarithms of the median, minimum, and maximum delay, and 1,
+            or None if the circuit does not have enough seeds.
+        """
+
+        tds = list(self.tds[arc][circ].values())
+        if len(tds) < max(1, self.min_seeds):
+            return None
+
+        return math.log(get_median(tds)), math.log(min(tds)), math.log(max(tds)), 1
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def add(self, name, circ, seed, outcome, td):
+        """Adds the result of one run, replacing any previous result of the same run.
+
+        Parameters
+        ----------
+        name : str
+            Architecture name, possibly including the grid size
+            (e.g., magic_T4_N8_W15_W13_H13).
+        circ : str
+            Circuit name.
+        seed : int
+            Placement seed.
+        outcome : str
+            Outcome of the run (see >>results_db.py<<).
+        td : float
+            Critical path delay (ignored unless the run succeeded).
+
+        Returns
+        -------
+        None
+        """
+
+        if not circ in self.circs or not int(seed) in self.seeds:
+            return
+
+        arc = get_arc(name)
+        if outcome == "timeout":
+            self.timed_out.add(arc)
+
+        tds = self.tds.setdefault(arc, {}).setdefault(circ, {})
+        if outcome != "success" and not int(seed) in tds:
+            return
+        aggr = self.aggr.setdefault(arc, [0.0, 0.0, 0.0, 0, {}])
+
+        old = self.get_contribution(arc, circ)
+        hist = aggr[4]
+        if tds:
+            hist[len(tds)] -= 1
+            if not hist[len(tds)]:
+                del hist[len(tds)]
+
+        if outcome == "success":
+            tds[int(seed)] = td
+        else:
+            del tds[int(seed)]
+
+        if tds:
+            hist[len(tds)] = hist.get(len(tds), 0) + 1
+        new = self.get_contribution(arc, circ)
+        for i in range(4):
+            aggr[i] += (new[i] if new is not None else 0) - (old[i] if old is not None else 0)
+
+        if aggr[3] == len(self.circs):
+            self.complete.add(arc)
+        else:
+            self.complete.discard(arc)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def update(self, log_dir):
+        """Adds the results written to the log directory since the last update.
+
+        Parameters
+        ----------
+        log_dir : str
+            Log directory.
+
+        Returns
+        -------
+        int
+            Number of new results.
+        """
+
+        cnt = 0
+        if results_db.exists(log_dir):
+            for row in results_db.query(log_dir, since = self.last_rowid, N = self.N, tech = self.tech):
+                self.add(row["arc"], row["circ"], row["seed"], row["outcome"], row["td"])
+                self.last_rowid = max(self.last_rowid, row["rowid"])
+                cnt += 1
+            return cnt
+
+        if not os.path.isdir(log_dir):
+            return cnt
+        for f in os.listdir(log_dir):
+            parsed = results_db.parse_log_filename(f)
+            if parsed is None:
+                continue
+            words = parsed[0].split('_')
+            if len(words) < 4 or words[1] != 'T' + self.tech or words[2] != 'N%d' % self.N:
+                continue
+            filename = os.path.join(log_dir, f)
+            try:
+                stamp = os.path.getmtime(filename)
+                if self.seen_logs.get(f, None) == stamp:
+                    continue
+                outcome, td = results_db.read_log_file(filename)
+            except (IOError, OSError):
+                continue
+            self.seen_logs[f] = stamp
+            self.add(parsed[0], parsed[1], parsed[2], outcome, td)
+            cnt += 1
+
+        return cnt
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_entry(self, arc):
+        """Returns the ranking entry of a complete architecture.
+
+        Parameters
+        ----------
+        arc : str
+            Architecture name.
+
+        Returns
+        -------
+        Tuple[str, float, float, float, float, float, int]
+            Architecture, geomean delay, area, area-delay product, geomeans of the
+            per-circuit minimum and maximum delays, and the minimum number of seeds
+            per circuit. None if the area is not available.
+        """
+
+        area = self.areas.get(arc, None)
+        if area is None:
+            area = read_area(self.arc_dir, arc, self.N, sorted(self.tds[arc]))
+            if area is None:
+                return None
+            self.areas[arc] = area
+
+        aggr = self.aggr[arc]
+        circ_no = len(self.circs)
+        td = math.exp(aggr[0] / circ_no)
+
+        return arc, td, area, td * area, math.exp(aggr[1] / circ_no), math.exp(aggr[2] / circ_no),\
+               min(min(aggr[4]), len(self.seeds))
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def top(self, k = None, key = "delay"):
+        """Returns the best complete architectures.
+
+        Parameters
+        ----------
+        k : Optional[int], default = None
+            Number of architectures. All if not specified.
+        key : Optional[str], default = "delay"
+            Sorting key: {delay, area, apd}.
+
+        Returns
+        -------
+        List[Tuple]
+            Entries (see >>get_entry<<), from the best to the worst.
+        """
+
+        i = 1 + sort_keys.index(key)
+        entries = [e for e in [self.get_entry(arc) for arc in self.complete] if e is not None]
+        sort_key = lambda e : [e[i], e]
+        if k is None:
+            return sorted(entries, key = sort_key)
+
+        return heapq.nsmallest(k, entries, key = sort_key)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_medians(self, arc):
+        """Returns the per-circuit seed medians of the architecture.
+
+        Parameters
+        ----------
+        arc : str
+            Architecture name.
+
+        Returns
+        -------
+        Dict[str, float]
+            Median delay of each circuit with results.
+        """
+
+        return {circ : get_median(list(tds.values())) for circ, tds in self.tds.get(arc, {}).items() if tds}
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_timed_out(self):
+        """Returns the architectures that are not ranked and had some runs time out.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        List[str]
+            Architecture names.
+        """
+
+        ranked = set([e[0] for e in self.top()])
+
+        return sorted([arc for arc in self.timed_out if not arc in ranked])
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def write(self, out_file, key = "delay", confidence = False):
+        """Writes the sorting log, and the list of timed-out architectures
+        to >>out_file<<.timeouts, if there are any.
+
+        Parameters
+        ----------
+        out_file : str
+            Sorting log name.
+        key : Optional[str], default = "delay"
+            Sorting key: {delay, area, apd}.
+        confidence : Optional[bool], default = False
+            Appends the geomeans of the per-circuit minimum and maximum delays
+            and the minimum number of seeds per circuit to each entry.
+
+        Returns
+        -------
+        None
+        """
+
+        txt = "#arc delay[ns] area[um2] apd[nsum2]" + (" delay_lo[ns] delay_hi[ns] min_seeds" if confidence else '') + "\n"
+        for entry in self.top(key = key):
+            for e in entry[:7 if confidence else 4]:
+                txt += str(e) + ' '
+            txt += "\n"
+
+        with open(out_file, "w") as outf:
+            outf.write(txt[:-1])
+
+        timed_out = self.get_timed_out()
+        if timed_out:
+            with open(out_file + ".timeouts", "w") as outf:
+                outf.write("\n".join(timed_out))
+    #------------------------------------------------------------------------#
+##########################################################################
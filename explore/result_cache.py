@@ -0,0 +1,205 @@
+"""Content-addressed store of VPR results, shared by all runs (see >>run_vpr.py<<).
+
+A run is identified by the hashes of its inputs: the architecture, the RR-graph archive,
+and the circuit, together with the seed, the VPR flags, and the VPR version. If an
+architecture is regenerated without its content changing, or the same channel
+composition is evaluated under another wire identifier, the key does not change
+and the stored critical path delay is returned without running VPR.
+
+Only routed runs are stored, as failures may also be caused by the environment
+(e.g., a full disk), and timeouts depend on the timeout of the run. Each lookup
+is appended to the event log of the cache, from which the CPU time avoided
+in each campaign is reported (see >>processing_scripts/result_cache_report.py<<).
+"""
+
+import os
+import json
+import time
+import hashlib
+import subprocess
+
+import runtime_history
+import arc_meta
+
+events_filename = "events.log"
+
+vpr_versions = {}
+#VPR executable -> version, so that it is queried only once per process.
+
+##########################################################################
+def get_vpr_version(vpr):
+    """Returns the version of the VPR executable.
+
+    Parameters
+    ----------
+    vpr : str
+        VPR executable.
+
+    Returns
+    -------
+    str
+        Version and revision reported by VPR, falling back to the path,
+        size, and modification time of the executable.
+    """
+
+    if vpr in vpr_versions:
+        return vpr_versions[vpr]
+
+    version = ''
+    try:
+        proc = subprocess.Popen([vpr, "--version"], stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+        out = proc.communicate()[0].decode("utf-8", "replace")
+        version = ' '.join([line.strip() for line in out.splitlines()\
+                            if line.strip().startswith(("Version", "Revision", "Compiled"))])
+    except OSError:
+        pass
+    if not version:
+        try:
+            path = os.path.realpath(vpr)
+            st = os.stat(path)
+            version = "%s %d %d" % (path, st.st_size, st.st_mtime)
+        except OSError:
+            version = vpr
+    vpr_versions[vpr] = version
+
+    return version
+##########################################################################
+
+##########################################################################
+def get_key(arc_file, rr_archive, circ_file, seed, vpr_flags, vpr_version):
+    """Computes the key of a run.
+
+    Parameters
+    ----------
+    arc_file : str
+        Architecture file name.
+    rr_archive : str
+        Compressed RR-graph file name.
+    circ_file : str
+        Circuit file name.
+    seed : int
+        Placement seed.
+    vpr_flags : List[str]
+        VPR flags, without the ones naming the input files.
+    vpr_version : str
+        VPR version (see >>get_vpr_version<<).
+
+    Returns
+    -------
+    str
+        Hexadecimal digest. None if some input does not exist.
+    """
+
+    hashes = [arc_meta.hash_file(f) for f in (arc_file, rr_archive, circ_file)]
+    if None in hashes:
+        return None
+
+    return hashlib.sha1(json.dumps(hashes + [int(seed), list(vpr_flags), vpr_version]).encode("utf-8")).hexdigest()
+##########################################################################
+
+##########################################################################
+def get_filename(cache_dir, key):
+    """Returns the name of the stored result.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Cache directory.
+    key : str
+        Run key.
+
+    Returns
+    -------
+    str
+        Result file name.
+    """
+
+    return "%s/%s/%s.json" % (cache_dir, key[:2], key)
+##########################################################################
+
+##########################################################################
+def lookup(cache_dir, key):
+    """Returns the stored result of the run.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Cache directory.
+    key : str
+        Run key.
+
+    Returns
+    -------
+    Dict[str, various]
+        Critical path delay, runtime [s], and the name of the run that produced it,
+        or None if the result is not stored.
+    """
+
+    if key is None:
+        return None
+    try:
+        with open(get_filename(cache_dir, key), "r") as inf:
+            return json.load(inf)
+    except:
+        return None
+##########################################################################
+
+##########################################################################
+def store(cache_dir, key, entry):
+    """Stores the result of a run. The file is replaced atomically.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Cache directory.
+    key : str
+        Run key.
+    entry : Dict[str, various]
+        Result (see >>lookup<<).
+
+    Returns
+    -------
+    None
+    """
+
+    if key is None:
+        return
+
+    filename = get_filename(cache_dir, key)
+    try:
+        os.makedirs(os.path.dirname(filename))
+    except OSError:
+        #Created by another run.
+        pass
+
+    entry = dict(entry)
+    entry.update({"stored" : time.time()})
+    tmp_filename = "%s.%d.tmp" % (filename, os.getpid())
+    with open(tmp_filename, "w") as outf:
+        json.dump(entry, outf, sort_keys = True)
+    os.rename(tmp_filename, filename)
+##########################################################################
+
+##########################################################################
+def record_event(cache_dir, entry):
+    """Appends a lookup to the event log of the cache.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Cache directory.
+    entry : Dict[str, various]
+        Job key (see >>runtime_history.get_job_key<<), extended by the seed, the log
+        directory, the event ("hit" or "miss"), and the runtime [s] avoided or spent.
+
+    Returns
+    -------
+    None
+    """
+
+    try:
+        os.makedirs(cache_dir)
+    except OSError:
+        pass
+    runtime_history.record(entry, os.path.join(cache_dir, events_filename))
+##########################################################################
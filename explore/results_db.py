@@ -0,0 +1,495 @@
+"""SQLite store of the VPR run results, one database per log directory.
+
+Each run of >>run_vpr.py<< inserts one row, holding the architecture, its technology,
+cluster size, wire identifier, and grid size, the circuit, the seed, the outcome
+("success", "failed", "timeout", or "predicted_fail"), the critical path delay,
+the runtime, and the peak memory. Indexed columns let the processing scripts
+select the results of one technology, cluster size, or outcome, instead of opening
+every log file in the directory.
+
+The database of >>log_dir<< is stored next to it, as >>log_dir<<.db, so that the
+scripts listing the log directory never see it. It is opened in write-ahead-log
+mode with a generous busy timeout, so that all runs of a campaign can write to
+it concurrently. The per-run log files are still written, as they mark the
+completed jobs. When the database is first created, the logs already present
+in the directory are imported into it, so it never misses older runs.
+
+The write-ahead log relies on memory shared by the processes of a single host,
+which network file systems do not provide, so the database is only ever opened on
+the host running the campaign. Jobs run by the workers of a work queue
+(see >>work_queue.py<<), on any host, append their rows as JSON lines to a journal
+of their host instead, in >>log_dir<<.journal/results.<host>.jsonl. The journals are
+merged into the database whenever it is opened (see >>merge_journals<<).
+"""
+
+import os
+import json
+import time
+import sqlite3
+
+import runtime_history
+
+busy_timeout = 120
+#Seconds a writer waits for a concurrent one to finish.
+
+columns = ["arc", "tech", "N", "wire", "grid", "circ", "seed", "outcome", "td", "runtime", "peak_rss", "finished"]
+
+schema = """CREATE TABLE results (
+    arc TEXT NOT NULL,
+    tech TEXT,
+    N INTEGER,
+    wire INTEGER,
+    grid INTEGER,
+    circ TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    outcome TEXT NOT NULL,
+    td REAL,
+    runtime REAL,
+    peak_rss INTEGER,
+    finished REAL,
+    PRIMARY KEY (arc, circ, seed)
+)"""
+#td in ns, runtime in s, peak_rss in kB.
+
+indices = ["CREATE INDEX results_arc_params ON results (tech, N, wire, grid)",\
+           "CREATE INDEX results_circ ON results (circ, seed)",\
+           "CREATE INDEX results_outcome ON results (outcome)"]
+
+insert_row = "INSERT OR REPLACE INTO results (rowid, %s) VALUES" % ", ".join(columns)\
+           + " ((SELECT IFNULL(MAX(rowid), 0) + 1 FROM results), %s)" % ", ".join(['?'] * len(columns))
+#The rowid is always larger than all previous ones, even when a row is replaced,
+#so that incremental readers (see >>query<<) see every update.
+
+journal_var = runtime_history.journal_var
+#Set for the jobs run by a queue worker (see >>work_queue.worker_var<<).
+
+fail_outcomes = ("failed", "predicted_fail")
+#Outcomes proving that the architecture is not routable in the allowed effort.
+
+##########################################################################
+def get_filename(log_dir):
+    """Returns the name of the database of the log directory.
+
+    Parameters
+    ----------
+    log_dir : str
+        Log directory.
+
+    Returns
+    -------
+    str
+        Database file name.
+    """
+
+    return os.path.normpath(log_dir) + ".db"
+##########################################################################
+
+##########################################################################
+def get_journal_dir(log_dir):
+    """Returns the directory of the journals of the log directory.
+
+    Parameters
+    ----------
+    log_dir : str
+        Log directory.
+
+    Returns
+    -------
+    str
+        Journal directory.
+    """
+
+    return os.path.normpath(log_dir) + ".journal"
+##########################################################################
+
+##########################################################################
+def exists(log_dir):
+    """Checks if results were stored for the log directory, in the database or in a journal.
+
+    Parameters
+    ----------
+    log_dir : str
+        Log directory.
+
+    Returns
+    -------
+    bool
+        True if the database or the journals exist.
+    """
+
+    return os.path.exists(get_filename(log_dir)) or os.path.isdir(get_journal_dir(log_dir))
+##########################################################################
+
+##########################################################################
+def parse_log_filename(f):
+    """Splits the name of a run log into the architecture, circuit, and seed.
+
+    Parameters
+    ----------
+    f : str
+        Log file name (e.g., magic_T4_N8_W15_W13_H13_alu4_1.log).
+
+    Returns
+    -------
+    Tuple[str, str, int]
+        Architecture, circuit, and seed, or None if the name is not that of a run log.
+    """
+
+    f = os.path.basename(f)
+    if not f.endswith(".log"):
+        return None
+    words = f.rsplit(".log", 1)[0].rsplit('_', 2)
+    if len(words) != 3:
+        return None
+    try:
+        return words[0], words[1], int(words[2])
+    except ValueError:
+        return None
+##########################################################################
+
+##########################################################################
+def read_log_file(filename):
+    """Reads the outcome of a run from its log.
+
+    Parameters
+    ----------
+    filename : str
+        Log file name.
+
+    Returns
+    -------
+    str
+        Outcome.
+    float
+        Critical path delay or None if the run did not succeed.
+    """
+
+    with open(filename, "r") as inf:
+        txt = inf.read().strip()
+    try:
+        return "success", float(txt)
+    except ValueError:
+        return txt, None
+##########################################################################
+
+##########################################################################
+def get_row(arc, circ, seed, outcome, td = None, runtime = None, peak_rss = None, finished = None):
+    """Assembles a database row.
+
+    Parameters
+    ----------
+    arc : str
+        Architecture file name.
+    circ : str
+        Circuit file name.
+    seed : int
+        Placement seed.
+    outcome : str
+        Outcome of the run.
+    td : Optional[float], default = None
+        Critical path delay.
+    runtime : Optional[float], default = None
+        Runtime.
+    peak_rss : Optional[int], default = None
+        Peak resident set size.
+    finished : Optional[float], default = None
+        Completion time stamp. Current time if not specified.
+
+    Returns
+    -------
+    Tuple
+        Values ordered as >>columns<<.
+    """
+
+    key = runtime_history.get_job_key(arc, circ)
+    arc = os.path.basename(arc).rsplit(".xml", 1)[0]
+
+    return (arc, key["tech"], key["N"], key["wire"], key["grid"], key["circ"], int(seed), outcome,\
+            td, runtime, peak_rss, time.time() if finished is None else finished)
+##########################################################################
+
+##########################################################################
+def import_log_dir(conn, log_dir):
+    """Imports the run logs of the directory, keeping the rows already present.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Database connection.
+    log_dir : str
+        Log directory.
+
+    Returns
+    -------
+    int
+        Number of imported logs.
+    """
+
+    if not os.path.isdir(log_dir):
+        return 0
+
+    rows = []
+    for f in os.listdir(log_dir):
+        parsed = parse_log_filename(f)
+        if parsed is None:
+            continue
+        arc, circ, seed = parsed
+        filename = os.path.join(log_dir, f)
+        try:
+            outcome, td = read_log_file(filename)
+        except IOError:
+            continue
+        if not outcome:
+            continue
+        rows.append(get_row(arc, circ, seed, outcome, td, finished = os.path.getmtime(filename)))
+
+    conn.executemany("INSERT OR IGNORE INTO results VALUES (%s)" % ", ".join(['?'] * len(columns)), rows)
+
+    return len(rows)
+##########################################################################
+
+##########################################################################
+def merge_journals(conn, log_dir):
+    """Inserts the rows appended to the journals since the last merge.
+    The merged offset of each journal is stored in the database.
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Database connection.
+    log_dir : str
+        Log directory.
+
+    Returns
+    -------
+    int
+        Number of merged rows.
+    """
+
+    journal_dir = get_journal_dir(log_dir)
+    if not os.path.isdir(journal_dir):
+        return 0
+
+    conn.execute("CREATE TABLE IF NOT EXISTS journals (filename TEXT PRIMARY KEY, offset INTEGER NOT NULL)")
+    merged = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for f in sorted(os.listdir(journal_dir)):
+            if not f.endswith(".jsonl"):
+                continue
+            filename = os.path.join(journal_dir, f)
+            stored = conn.execute("SELECT offset FROM journals WHERE filename = ?", (f,)).fetchone()
+            offset = stored[0] if stored is not None else 0
+            try:
+                if os.path.getsize(filename) < offset:
+                    #Removed and written anew.
+                    offset = 0
+                with open(filename, "rb") as inf:
+                    inf.seek(offset)
+                    data = inf.read()
+            except (IOError, OSError):
+                continue
+            data = data[:data.rfind(b"\n") + 1]
+            #A partially written line is merged the next time.
+            if not data:
+                continue
+            for line in data.decode("utf-8").splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                conn.execute(insert_row, tuple([entry.get(col, None) for col in columns]))
+                merged += 1
+            conn.execute("INSERT OR REPLACE INTO journals VALUES (?, ?)", (f, offset + len(data)))
+        conn.execute("COMMIT")
+    except:
+        conn.execute("ROLLBACK")
+        raise
+
+    return merged
+##########################################################################
+
+##########################################################################
+def connect(log_dir):
+    """Opens the database of the log directory, creating it if needed,
+    and merges the journals into it.
+
+    Parameters
+    ----------
+    log_dir : str
+        Log directory.
+
+    Returns
+    -------
+    sqlite3.Connection
+        Connection in autocommit mode.
+    """
+
+    conn = sqlite3.connect(get_filename(log_dir), timeout = busy_timeout, isolation_level = None)
+    conn.text_factory = str
+    #Plain strings under Python 2, as in the rest of the flow.
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.OperationalError:
+        #Some network file systems do not support the shared memory of the log.
+        pass
+
+    if conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'results'").fetchone() is None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            #Checked again under the write lock, as another process may have created it.
+            if conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'results'").fetchone() is None:
+                conn.execute(schema)
+                for index in indices:
+                    conn.execute(index)
+                import_log_dir(conn, log_dir)
+            conn.execute("COMMIT")
+        except:
+            conn.execute("ROLLBACK")
+            raise
+    merge_journals(conn, log_dir)
+
+    return conn
+##########################################################################
+
+##########################################################################
+def record(log_dir, arc, circ, seed, outcome, td = None, runtime = None, peak_rss = None):
+    """Stores the result of a run, replacing any previous result of the same job.
+    Under a queue worker, the result is appended to the journal of the host instead.
+
+    Parameters
+    ----------
+    log_dir : str
+        Log directory.
+    arc : str
+        Architecture file name.
+    circ : str
+        Circuit file name.
+    seed : int
+        Placement seed.
+    outcome : str
+        Outcome of the run.
+    td : Optional[float], default = None
+        Critical path delay.
+    runtime : Optional[float], default = None
+        Runtime.
+    peak_rss : Optional[int], default = None
+        Peak resident set size.
+
+    Returns
+    -------
+    None
+    """
+
+    row = get_row(arc, circ, seed, outcome, td, runtime, peak_rss)
+    if os.environ.get(journal_var, None):
+        journal_dir = get_journal_dir(log_dir)
+        try:
+            os.makedirs(journal_dir)
+        except OSError:
+            pass
+        runtime_history.record(dict(zip(columns, row)), os.path.join(journal_dir, "results"))
+        #Appended to results.<host>.jsonl (see >>runtime_history.record<<). Appends from
+        #the processes of one host are serialized by its file-system client.
+        return
+
+    conn = connect(log_dir)
+    try:
+        conn.execute(insert_row, row)
+    finally:
+        conn.close()
+##########################################################################
+
+##########################################################################
+def query(log_dir, outcomes = None, since = None, **conditions):
+    """Returns the results matching the conditions.
+
+    Parameters
+    ----------
+    log_dir : str
+        Log directory.
+    outcomes : Optional[List[str]], default = None
+        Outcomes to select. All if not specified.
+    since : Optional[int], default = None
+        Returns only the rows written after the one with this rowid
+        (e.g., the largest rowid returned by a previous query).
+    **conditions
+        Required values of the columns (e.g., tech = "4", N = 8).
+
+    Returns
+    -------
+    List[Dict[str, various]]
+        Rows, with their rowid, in the order in which they were written.
+    """
+
+    where = []
+    values = []
+    for col in sorted(conditions):
+        if not col in columns:
+            raise ValueError("Unknown column %s." % col)
+        where.append("%s = ?" % col)
+        values.append(conditions[col])
+    if outcomes is not None:
+        where.append("outcome IN (%s)" % ", ".join(['?'] * len(outcomes)))
+        values += list(outcomes)
+    if since is not None:
+        where.append("rowid > ?")
+        values.append(since)
+
+    conn = connect(log_dir)
+    try:
+        cursor = conn.execute("SELECT rowid, %s FROM results" % ", ".join(columns)\
+                              + ((" WHERE " + " AND ".join(where)) if where else '') + " ORDER BY rowid", values)
+        return [dict(zip(["rowid"] + columns, row)) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+##########################################################################
+
+##########################################################################
+def get_arcs(log_dir, outcomes = fail_outcomes):
+    """Returns the architectures having at least one run with one of the outcomes.
+
+    Parameters
+    ----------
+    log_dir : str
+        Log directory.
+    outcomes : Optional[List[str]], default = fail_outcomes
+        Outcomes to look for.
+
+    Returns
+    -------
+    Set[str]
+        Architecture names.
+    """
+
+    conn = connect(log_dir)
+    try:
+        cursor = conn.execute("SELECT DISTINCT arc FROM results WHERE outcome IN (%s)"\
+                              % ", ".join(['?'] * len(outcomes)), list(outcomes))
+        return set([row[0] for row in cursor.fetchall()])
+    finally:
+        conn.close()
+##########################################################################
+
+##########################################################################
+def remove(log_dir, prefix):
+    """Removes the results of all architectures whose names start with the prefix.
+
+    Parameters
+    ----------
+    log_dir : str
+        Log directory.
+    prefix : str
+        Architecture name prefix.
+
+    Returns
+    -------
+    None
+    """
+
+    conn = connect(log_dir)
+    try:
+        conn.execute("DELETE FROM results WHERE substr(arc, 1, ?) = ?", (len(prefix), prefix))
+    finally:
+        conn.close()
+##########################################################################
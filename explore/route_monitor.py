@@ -0,0 +1,252 @@
+"""Monitoring of the VPR router progress, used for aborting the runs that are
+not going to converge (see >>run_vpr.py<<).
+
+The router prints one line per iteration to >>vpr_stdout.log<<. The number of
+overused routing resource nodes and the critical path delay are parsed from
+these lines, while VPR is still running. A simple trend model then extrapolates
+the decay of the overuse to decide if the routing will converge within the
+allowed number of iterations.
+
+The per-iteration traces of all runs are appended to a history file,
+so that the model can be evaluated offline against the runs that were
+allowed to complete (see >>processing_scripts/eval_early_abort.py<<).
+"""
+
+import os
+import re
+import math
+
+trace_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vpr_route.trace")
+#Default location of the routing traces, shared by all campaigns.
+
+route_line = re.compile(r"^\s*(\d+)\s+\S+\s+\S+\s+\d+\s+\S+\s+\d+\s+\d+\s+(\d+)\s*\(\s*[\d.]+%\)"\
+                        + r"\s+\d+\s*\(\s*[\d.]+%\)\s+(\S+)")
+#Iter, Time, pres fac, BBs Updt, Heap push, Re-Rtd Nets, Re-Rtd Conns, Overused RR Nodes, Wirelength, CPD
+
+##########################################################################
+def parse_route_line(line):
+    """Parses one line of the router iteration table.
+
+    Parameters
+    ----------
+    line : str
+        Log line.
+
+    Returns
+    -------
+    Tuple[int, int, float]
+        Iteration, number of overused nodes, and critical path delay [ns]
+        (None if not reported). None if the line is not an iteration line.
+    """
+
+    match = route_line.match(line)
+    if match is None:
+        return None
+
+    try:
+        cpd = float(match.group(3))
+    except:
+        cpd = None
+
+    return int(match.group(1)), int(match.group(2)), cpd
+##########################################################################
+
+##########################################################################
+class RouteLogTail(object):
+    """Incrementally reads the router iterations from a growing VPR log.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the VPR log (it need not exist yet).
+    """
+
+    #------------------------------------------------------------------------#
+    def __init__(self, filename):
+        """Constructor of the RouteLogTail class.
+        """
+
+        self.filename = filename
+        self.offset = 0
+        self.partial = ''
+        self.in_table = False
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def read(self):
+        """Reads the iterations appended to the log since the last call.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        List[Tuple[int, int, float]]
+            New iterations (see >>parse_route_line<<).
+        """
+
+        try:
+            with open(self.filename, "r") as inf:
+                inf.seek(self.offset)
+                txt = inf.read()
+                self.offset = inf.tell()
+        except:
+            return []
+
+        lines = (self.partial + txt).split("\n")
+        self.partial = lines.pop()
+        #The last line may still be incomplete.
+
+        iterations = []
+        for line in lines:
+            if line.split()[:1] == ["Iter"]:
+                self.in_table = True
+                #The placer prints a numeric table too, so only lines after
+                #the header of the router table are considered.
+                continue
+            if self.in_table:
+                it = parse_route_line(line)
+                if it is not None:
+                    iterations.append(it)
+
+        return iterations
+    #------------------------------------------------------------------------#
+##########################################################################
+
+##########################################################################
+class ConvergencePredictor(object):
+    """Predicts non-convergence of the router from the overuse trend.
+
+    After >>min_iter<< iterations, the logarithm of the overused node count over
+    the last >>window<< iterations is fitted by a line. The number of iterations
+    needed to remove all overuse is extrapolated from it, and the run is
+    predicted to fail if that would exceed >>slack<< times the iteration limit.
+    Runs with little overuse left are never aborted, as the router often
+    oscillates for a few iterations before resolving the last conflicts.
+
+    Parameters
+    ----------
+    max_iter : int
+        Iteration limit of the router.
+    min_iter : Optional[int], default = 10
+        Number of iterations before any prediction is made.
+    window : Optional[int], default = 5
+        Number of most recent iterations used for the fit.
+    slack : Optional[float], default = 1.5
+        Multiplier of the iteration limit that the extrapolation may reach.
+    min_overused : Optional[int], default = 10
+        Number of overused nodes below which no abort is predicted.
+    """
+
+    #------------------------------------------------------------------------#
+    def __init__(self, max_iter, min_iter = 10, window = 5, slack = 1.5, min_overused = 10):
+        """Constructor of the ConvergencePredictor class.
+        """
+
+        self.max_iter = max_iter
+        self.min_iter = min_iter
+        self.window = max(2, window)
+        self.slack = slack
+        self.min_overused = min_overused
+        self.trace = []
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def add(self, iteration, overused, cpd):
+        """Adds one router iteration.
+
+        Parameters
+        ----------
+        iteration : int
+            Iteration number.
+        overused : int
+            Number of overused nodes.
+        cpd : float
+            Critical path delay.
+
+        Returns
+        -------
+        None
+        """
+
+        self.trace.append((iteration, overused, cpd))
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def extrapolate(self):
+        """Extrapolates the iteration at which the overuse disappears.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        float
+            Projected iteration (inf if the overuse does not decay).
+        """
+
+        last = self.trace[-self.window:]
+        if last[-1][1] == 0:
+            return float(last[-1][0])
+
+        xs = [float(t[0]) for t in last]
+        ys = [math.log(t[1] + 1) for t in last]
+        x_avg = sum(xs) / len(xs)
+        y_avg = sum(ys) / len(ys)
+        var = sum([(x - x_avg) ** 2 for x in xs])
+        if var == 0:
+            return float("inf")
+        slope = sum([(x - x_avg) * (y - y_avg) for x, y in zip(xs, ys)]) / var
+        if slope >= 0:
+            return float("inf")
+
+        return xs[-1] + ys[-1] / -slope
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def predict_fail(self):
+        """Checks if the router is predicted not to converge.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        bool
+            True if the run should be aborted.
+        """
+
+        if len(self.trace) < max(self.min_iter, self.window) or self.trace[-1][1] <= self.min_overused:
+            return False
+
+        return self.extrapolate() > self.slack * self.max_iter
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def replay(self, trace):
+        """Replays a recorded trace and returns the iteration at which
+        the run would have been aborted.
+
+        Parameters
+        ----------
+        trace : List[Tuple[int, int, float]]
+            Router iterations.
+
+        Returns
+        -------
+        int
+            Abort iteration or None if the run would not have been aborted.
+        """
+
+        self.trace = []
+        for it in trace:
+            self.add(*it)
+            if self.predict_fail():
+                return it[0]
+
+        return None
+    #------------------------------------------------------------------------#
+##########################################################################
@@ -0,0 +1,283 @@
+"""Host-level cache of decompressed RR-graphs, shared by all VPR runs (see >>run_vpr.py<<).
+
+Each archive is decompressed only once per host, instead of once per circuit and seed.
+Runs link the cached file into their directories and read the channel width from a
+small metadata sidecar, instead of scanning the entire RR-graph.
+
+Every run using an entry holds a reference to it (a file named by its pid in the
+>>.refs<< directory of the entry). When the cache grows over its quota, the least
+recently used entries without live references are evicted. Entries are keyed by
+the path, size, and modification time of the archive, so that regenerated
+archives are never served from a stale entry. The callers must have the repository
+root on the path (for >>codec.py<<).
+"""
+
+import os
+import json
+import hashlib
+
+import file_lock
+import rr_store
+import codec
+
+default_dir = "/dev/shm/rr_cache" if os.path.isdir("/dev/shm") else "/tmp/rr_cache"
+#tmpfs if available.
+
+##########################################################################
+def read_chan_width(rr_file):
+    """Reads the maximum channel width from the RR-graph header,
+    without reading the rest of the file.
+
+    Parameters
+    ----------
+    rr_file : str
+        RR-graph file name.
+
+    Returns
+    -------
+    int
+        Maximum channel width or None if not found.
+    """
+
+    with open(rr_file, "r") as inf:
+        for line in inf:
+            if "chan_width_max" in line:
+                for w in line.split():
+                    if "chan_width_max" in w:
+                        return int(w.split('"')[1])
+
+    return None
+##########################################################################
+
+##########################################################################
+def stage(src, dst):
+    """Makes the file available under a new name without copying it.
+    A hard link is used if possible and a symbolic link otherwise
+    (e.g., across file systems).
+
+    Parameters
+    ----------
+    src : str
+        Existing file.
+    dst : str
+        New file name.
+
+    Returns
+    -------
+    None
+    """
+
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        os.symlink(os.path.abspath(src), dst)
+##########################################################################
+
+##########################################################################
+def get_entry(cache_dir, rr_archive):
+    """Returns the name of the cache entry of the archive.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Cache directory.
+    rr_archive : str
+        Compressed RR-graph.
+
+    Returns
+    -------
+    str
+        Entry file name.
+    """
+
+    rr_archive = os.path.abspath(rr_archive)
+    st = os.stat(rr_store.get_source(rr_archive))
+    #The header, if the RR-graph is split (see >>rr_store.py<<).
+    key = hashlib.sha1(("%s %d %d" % (rr_archive, st.st_size, int(st.st_mtime))).encode("utf-8")).hexdigest()[:12]
+
+    return "%s/%s_%s" % (cache_dir, key, codec.strip_suffix(os.path.basename(rr_archive)))
+##########################################################################
+
+##########################################################################
+def get_live_refs(entry):
+    """Returns the pids of the live processes referencing the entry,
+    removing the references of the dead ones.
+
+    Parameters
+    ----------
+    entry : str
+        Entry file name.
+
+    Returns
+    -------
+    List[int]
+        pids.
+    """
+
+    refs = []
+    try:
+        pids = os.listdir(entry + ".refs")
+    except OSError:
+        return refs
+
+    for pid in pids:
+        try:
+            os.kill(int(pid), 0)
+            refs.append(int(pid))
+        except (OSError, ValueError):
+            try:
+                os.remove("%s.refs/%s" % (entry, pid))
+            except OSError:
+                pass
+
+    return refs
+##########################################################################
+
+##########################################################################
+def evict(cache_dir, quota):
+    """Evicts the least recently used unreferenced entries until
+    the cache fits the quota.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Cache directory.
+    quota : float
+        Quota in bytes.
+
+    Returns
+    -------
+    None
+    """
+
+    entries = []
+    for f in os.listdir(cache_dir):
+        if f.endswith(".meta"):
+            meta = "%s/%s" % (cache_dir, f)
+            try:
+                with open(meta, "r") as inf:
+                    size = json.load(inf)["size"]
+                entries.append((os.path.getmtime(meta), size, meta.rsplit(".meta", 1)[0]))
+            except:
+                continue
+
+    total = sum([e[1] for e in entries])
+    for last_use, size, entry in sorted(entries):
+        if total <= quota:
+            break
+        if remove(entry):
+            total -= size
+##########################################################################
+
+##########################################################################
+def remove(entry):
+    """Removes the entry, unless it is locked or referenced.
+
+    Parameters
+    ----------
+    entry : str
+        Entry file name.
+
+    Returns
+    -------
+    bool
+        True if the entry was removed.
+    """
+
+    if not file_lock.acquire(entry + ".lock", block = False):
+        return False
+    try:
+        if get_live_refs(entry):
+            return False
+        os.system("rm -rf %s %s.meta %s.refs" % (entry, entry, entry))
+    finally:
+        file_lock.release(entry + ".lock")
+
+    return True
+##########################################################################
+
+##########################################################################
+def acquire(cache_dir, rr_archive, dst, quota = 16e9):
+    """Links the decompressed RR-graph into the destination, decompressing
+    it into the cache first if needed, and references the entry.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Cache directory.
+    rr_archive : str
+        Compressed RR-graph.
+    dst : str
+        Destination file name.
+    quota : Optional[float], default = 16e9
+        Cache size in bytes above which unused entries are evicted.
+
+    Returns
+    -------
+    int
+        Maximum channel width.
+    bool
+        True if the RR-graph was found in the cache.
+    """
+
+    os.system("mkdir -p %s" % cache_dir)
+    entry = get_entry(cache_dir, rr_archive)
+
+    hit = True
+    file_lock.acquire(entry + ".lock")
+    try:
+        #Eviction takes the same lock, so it either happens before the lookup
+        #or sees the reference.
+        os.system("mkdir -p %s.refs" % entry)
+        open("%s.refs/%d" % (entry, os.getpid()), "w").close()
+        if not os.path.exists(entry + ".meta"):
+            hit = False
+            tmp = "%s.%d.tmp" % (entry, os.getpid())
+            source = rr_store.get_source(rr_archive)
+            if source != rr_archive:
+                rr_store.materialize(source, tmp)
+            else:
+                codec.decompress(rr_archive, tmp)
+            meta = {"archive" : os.path.abspath(rr_archive), "size" : os.path.getsize(tmp),\
+                    "chan_width_max" : read_chan_width(tmp)}
+            os.rename(tmp, entry)
+            with open(tmp, "w") as outf:
+                json.dump(meta, outf)
+            os.rename(tmp, entry + ".meta")
+        with open(entry + ".meta", "r") as inf:
+            meta = json.load(inf)
+        os.utime(entry + ".meta", None)
+        #The modification time of the sidecar marks the last use.
+        stage(entry, dst)
+    finally:
+        file_lock.release(entry + ".lock")
+
+    if not hit:
+        evict(cache_dir, quota)
+
+    return meta["chan_width_max"], hit
+##########################################################################
+
+##########################################################################
+def release(cache_dir, rr_archive):
+    """Removes the reference of this process to the entry of the archive.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Cache directory.
+    rr_archive : str
+        Compressed RR-graph.
+
+    Returns
+    -------
+    None
+    """
+
+    try:
+        os.remove("%s.refs/%d" % (get_entry(cache_dir, rr_archive), os.getpid()))
+    except OSError:
+        pass
+##########################################################################
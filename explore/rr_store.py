@@ -0,0 +1,401 @@
+"""Split storage of the RR-graphs: a shared structural body plus a small per-architecture header.
+
+The nodes and edges of an RR-graph (everything from <rr_nodes> on) depend only on the
+channel composition and the grid, as all RC parameters of the nodes are zero and the
+edges refer to the switches only by their identifiers. Architectures that differ only
+in their delays (e.g., >>change_delays.py<< variants) thus have identical bodies.
+The body is stored once, compressed and named by the SHA-1 of its content, in a store
+directory. Each architecture keeps only its header (<channels>, <switches>, <segments>,
+<block_types>, and <grid>), as <name>_rr_header.xml.lz4 instead of <name>_rr.xml.lz4,
+prefixed by a comment naming the body.
+
+The VPR-readable file is assembled on demand by >>materialize<<, which streams the
+body after the header (see >>rr_cache.acquire<< and >>run_vpr.py<<).
+
+Bodies are shared by all campaigns using the store, so each one keeps back-references
+to the headers naming it, one file per header in <digest>.refs/ next to the body
+(see >>add_ref<<). A body is unreferenced once none of these headers exists and names
+it anymore (see >>is_referenced<<); the storage manager only evicts such bodies
+(see >>storage.py<<). Bodies stored before the back-references were recorded have no
+such directory and are always considered referenced. The callers must have the
+repository root on the path (for >>codec.py<<).
+"""
+
+import os
+import time
+import hashlib
+import shutil
+import subprocess
+
+import codec
+
+default_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rr_store")
+
+archive_suffix = "_rr.xml.lz4"
+archive_suffixes = tuple(["_rr.xml" + codec.suffixes[c] for c in codec.codecs])
+#Archives of any codec (see >>codec.py<<) can be split. Headers and bodies are always lz4.
+header_suffix = "_rr_header.xml.lz4"
+
+refs_suffix = ".refs"
+
+body_tag = b"<rr_nodes"
+chunk_size = 1 << 20
+
+##########################################################################
+def get_header_filename(rr_archive):
+    """Returns the name of the header of the RR-graph.
+
+    Parameters
+    ----------
+    rr_archive : str
+        Compressed RR-graph file name.
+
+    Returns
+    -------
+    str
+        Header file name.
+    """
+
+    return codec.strip_suffix(rr_archive).rsplit("_rr.xml", 1)[0] + header_suffix
+##########################################################################
+
+##########################################################################
+def get_source(rr_archive):
+    """Returns the file holding the RR-graph: the archive, if present, or its header.
+
+    Parameters
+    ----------
+    rr_archive : str
+        Compressed RR-graph file name.
+
+    Returns
+    -------
+    str
+        File name (the archive if neither exists).
+    """
+
+    if not os.path.exists(rr_archive) and os.path.exists(get_header_filename(rr_archive)):
+        return get_header_filename(rr_archive)
+
+    return rr_archive
+##########################################################################
+
+##########################################################################
+def get_body_filename(store_dir, digest):
+    """Returns the name of a stored body.
+
+    Parameters
+    ----------
+    store_dir : str
+        Store directory.
+    digest : str
+        SHA-1 of the body.
+
+    Returns
+    -------
+    str
+        Body file name.
+    """
+
+    return "%s/%s/%s.xml.lz4" % (store_dir, digest[:2], digest)
+##########################################################################
+
+##########################################################################
+def get_refs_dir(body_file):
+    """Returns the directory of the back-references of a stored body.
+
+    Parameters
+    ----------
+    body_file : str
+        Body file name.
+
+    Returns
+    -------
+    str
+        Directory name.
+    """
+
+    return body_file.rsplit(".xml.lz4", 1)[0] + refs_suffix
+##########################################################################
+
+##########################################################################
+def add_ref(body_file, header_file):
+    """Records that the header names the body. The reference is written atomically.
+
+    Parameters
+    ----------
+    body_file : str
+        Body file name.
+    header_file : str
+        Header file name.
+
+    Returns
+    -------
+    None
+    """
+
+    refs_dir = get_refs_dir(body_file)
+    try:
+        os.makedirs(refs_dir)
+    except OSError:
+        pass
+    header_file = os.path.abspath(header_file)
+    ref = os.path.join(refs_dir, hashlib.sha1(header_file.encode("utf-8")).hexdigest())
+    tmp_ref = "%s.%d.tmp" % (ref, os.getpid())
+    with open(tmp_ref, "w") as outf:
+        outf.write(header_file)
+    os.rename(tmp_ref, ref)
+##########################################################################
+
+##########################################################################
+def is_referenced(body_file, grace = 3600):
+    """Checks if any header still names the body. The references of headers
+    that were removed or now name another body are dropped.
+
+    Parameters
+    ----------
+    body_file : str
+        Body file name.
+    grace : Optional[float], default = 3600
+        Number of seconds during which a reference to a header that does not
+        exist yet is kept, as the header is written after the reference.
+
+    Returns
+    -------
+    bool
+        True if referenced, or if the references are unknown.
+    """
+
+    refs_dir = get_refs_dir(body_file)
+    if not os.path.isdir(refs_dir):
+        #Stored before the back-references were recorded.
+        return True
+
+    body_file = os.path.realpath(body_file)
+    referenced = False
+    for f in os.listdir(refs_dir):
+        ref = os.path.join(refs_dir, f)
+        if f.endswith(".tmp"):
+            #Reference being written.
+            referenced = True
+            continue
+        try:
+            with open(ref, "r") as inf:
+                header_file = inf.read()
+            age = time.time() - os.path.getmtime(ref)
+        except (IOError, OSError):
+            continue
+        if os.path.exists(header_file):
+            try:
+                if os.path.realpath(read_header(header_file)[0]) == body_file:
+                    referenced = True
+                    continue
+            except (IOError, IndexError):
+                #Unreadable headers are given the benefit of the doubt.
+                referenced = True
+                continue
+        elif age < grace:
+            referenced = True
+            continue
+        try:
+            os.remove(ref)
+        except OSError:
+            pass
+
+    return referenced
+##########################################################################
+
+##########################################################################
+def compress(data, filename):
+    """Compresses the data into a file. The file is replaced atomically.
+
+    Parameters
+    ----------
+    data : bytes
+        Data.
+    filename : str
+        Archive file name.
+
+    Returns
+    -------
+    bool
+        True if successful.
+    """
+
+    tmp_filename = "%s.%d.tmp" % (filename, os.getpid())
+    proc = subprocess.Popen(["lz4", "-q", "-f", "-", tmp_filename], stdin = subprocess.PIPE)
+    proc.communicate(data)
+    if proc.returncode:
+        os.system("rm -f %s" % tmp_filename)
+        return False
+    os.rename(tmp_filename, filename)
+
+    return True
+##########################################################################
+
+##########################################################################
+def read_header(header_file):
+    """Reads the header of an RR-graph.
+
+    Parameters
+    ----------
+    header_file : str
+        Header file name.
+
+    Returns
+    -------
+    str
+        Body file name.
+    bytes
+        Header, without the comment naming the body.
+    """
+
+    proc = subprocess.Popen(["lz4", "-dc", header_file], stdout = subprocess.PIPE)
+    txt = proc.communicate()[0]
+    if proc.returncode:
+        raise IOError("Failed to decompress %s." % header_file)
+    comment, header = txt.split(b"\n", 1)
+
+    return comment.split()[2].decode("utf-8"), header
+##########################################################################
+
+##########################################################################
+def write_header(header_file, body_file, header):
+    """Writes the header of an RR-graph and records it as a reference of the body.
+
+    Parameters
+    ----------
+    header_file : str
+        Header file name.
+    body_file : str
+        Body file name.
+    header : bytes
+        Header.
+
+    Returns
+    -------
+    bool
+        True if successful.
+    """
+
+    add_ref(body_file, header_file)
+
+    return compress(("<!-- rr_body %s -->\n" % os.path.abspath(body_file)).encode("utf-8") + header, header_file)
+##########################################################################
+
+##########################################################################
+def split(rr_archive, store_dir = default_dir, remove = True):
+    """Splits an RR-graph archive into the header and the body, storing the body
+    unless an identical one is already stored. The archive is decompressed as
+    a stream, so that the body is never held in memory.
+
+    Parameters
+    ----------
+    rr_archive : str
+        Compressed RR-graph file name.
+    store_dir : Optional[str], default = default_dir
+        Store directory.
+    remove : Optional[bool], default = True
+        Removes the archive once split.
+
+    Returns
+    -------
+    str
+        Header file name or None if splitting failed.
+    bool
+        True if an identical body was already stored.
+    """
+
+    os.system("mkdir -p %s" % store_dir)
+    tmp_body = "%s/body.%d.tmp" % (store_dir, os.getpid())
+
+    dec = codec.open_decompressed(rr_archive)
+    buf = b''
+    start = -1
+    while start < 0:
+        data = dec.stdout.read(chunk_size)
+        if not data:
+            break
+        buf += data
+        start = buf.find(body_tag)
+    if start < 0:
+        dec.stdout.close()
+        dec.wait()
+        return None, False
+    start = buf.rfind(b"\n", 0, start) + 1
+    #The indentation of the tag belongs to the body.
+
+    header = buf[:start]
+    sha = hashlib.sha1()
+    comp = subprocess.Popen(["lz4", "-q", "-f", "-", tmp_body], stdin = subprocess.PIPE)
+    data = buf[start:]
+    del buf
+    while data:
+        sha.update(data)
+        comp.stdin.write(data)
+        data = dec.stdout.read(chunk_size)
+    comp.stdin.close()
+    dec.stdout.close()
+    if dec.wait() or comp.wait():
+        os.system("rm -f %s" % tmp_body)
+        return None, False
+
+    body_file = get_body_filename(store_dir, sha.hexdigest())
+    shared = os.path.exists(body_file)
+    if shared:
+        os.remove(tmp_body)
+    else:
+        os.system("mkdir -p %s" % os.path.dirname(body_file))
+        os.rename(tmp_body, body_file)
+
+    header_file = get_header_filename(rr_archive)
+    if not write_header(header_file, body_file, header):
+        return None, shared
+    if remove:
+        os.remove(rr_archive)
+
+    return header_file, shared
+##########################################################################
+
+##########################################################################
+def materialize(header_file, dst, compressed = False):
+    """Assembles the complete RR-graph from the header and the body.
+    The destination is replaced atomically.
+
+    Parameters
+    ----------
+    header_file : str
+        Header file name.
+    dst : str
+        Destination file name.
+    compressed : Optional[bool], default = False
+        Writes an lz4 archive (e.g., to undo the split) instead of the plain RR-graph.
+
+    Returns
+    -------
+    bool
+        True if successful.
+    """
+
+    body_file, header = read_header(header_file)
+    tmp_dst = "%s.%d.tmp" % (dst, os.getpid())
+
+    dec = subprocess.Popen(["lz4", "-dc", body_file], stdout = subprocess.PIPE)
+    if compressed:
+        comp = subprocess.Popen(["lz4", "-q", "-f", "-", tmp_dst], stdin = subprocess.PIPE)
+        outf = comp.stdin
+    else:
+        comp = None
+        outf = open(tmp_dst, "wb")
+    outf.write(header)
+    shutil.copyfileobj(dec.stdout, outf, chunk_size)
+    outf.close()
+    dec.stdout.close()
+
+    if dec.wait() or (comp is not None and comp.wait()):
+        os.system("rm -f %s" % tmp_dst)
+        return False
+    os.rename(tmp_dst, dst)
+
+    return True
+##########################################################################
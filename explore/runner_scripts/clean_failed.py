@@ -7,11 +7,22 @@ FIXME: A more elegant and automated solution is due.
 Parameters
 ----------
 log_dir : str
-    Log directory.
+    Log directory. If it has a results database (see >>results_db.py<<),
+    the failures are queried from it instead of reading all logs.
 rm_logs : Optional[bool], default = False
     Remove the failed logs as well.
 watch : Optional[bool], default = False
     Instructs the script to keep watching on the log directory.
+    New logs are reported by inotify (see >>log_watcher.py<<) and the failures
+    are removed as soon as they are written. The script exits once no failure
+    has been reported for >>idle_timeout<< seconds.
+idle_timeout : Optional[int], default = 1800
+    Number of seconds without new failures after which watching stops.
+rm_timeouts : Optional[bool], default = False
+    Treat the timed-out runs as failures too. By default, they are kept,
+    as a timeout does not prove that the architecture is unroutable.
+    Only runs with an adaptive timeout are logged as timed out (see >>run_vpr.py<<);
+    the fixed timeouts are logged as failures.
 
 Returns
 -------
@@ -21,12 +32,18 @@ None
 import os
 import time
 import argparse
-import copy
+import sys
+sys.path.insert(0,'..')
+
+import results_db
+import log_watcher
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--log_dir")
 parser.add_argument("--rm_logs")
 parser.add_argument("--watch")
+parser.add_argument("--rm_timeouts")
+parser.add_argument("--idle_timeout")
 args = parser.parse_args()
 
 log_dir = args.log_dir + '/'
@@ -44,32 +61,71 @@ try:
 except:
     pass
 
+RM_TIMEOUTS = False
+try:
+    RM_TIMEOUTS = int(args.rm_timeouts)
+except:
+    pass
+
+IDLE_TIMEOUT = 1800
+try:
+    IDLE_TIMEOUT = int(args.idle_timeout)
+except:
+    pass
+
 while not os.path.isdir(log_dir):
     time.sleep(5)
 
-false_alert = 0
-old_failed = None
-while True:
-    failed = set()
+outcomes = results_db.fail_outcomes + (("timeout",) if RM_TIMEOUTS else ())
+
+##########################################################################
+def remove_failed(failed):
+    """Kills the runs of the failed channel compositions and removes their files.
+
+    Parameters
+    ----------
+    failed : Set[str]
+        Architecture name prefixes (e.g., magic_T4_N8_W15_).
+
+    Returns
+    -------
+    None
+    """
+
+    for name in failed:
+        os.system("pkill -f -- '[%s]%s'" % (name[0], name[1:]))
+        #The bracket keeps the pattern from matching the shell running pkill.
+        os.system("rm -rf %s*" % name)
+        os.system("rm -rf %s/%s*" % (arc_dir, name))
+        if RM_LOGS:
+            os.system("rm -rf %s/%s*" % (log_dir, name))
+            if results_db.exists(log_dir):
+                results_db.remove(log_dir, name)
+##########################################################################
+
+if WATCH:
+    #Only the logs written since the previous event are read.
+    watcher = log_watcher.LogWatcher(log_dir)
+    deadline = time.time() + IDLE_TIMEOUT
+    while time.time() < deadline:
+        failed = watcher.get_failures(deadline - time.time(), outcomes)
+        if failed:
+            remove_failed(set(['_'.join(arc.split('_')[:-2]) + '_' for arc in failed]))
+            deadline = time.time() + IDLE_TIMEOUT
+    watcher.close()
+    exit(0)
+
+failed = set()
+if results_db.exists(log_dir):
+    for arc in results_db.get_arcs(log_dir, outcomes):
+        base_name = '_'.join(arc.split('_')[:-2]) + '_'
+        failed.add(base_name)
+else:
     for f in os.listdir(log_dir):
         with open(log_dir + f, "r") as inf:
             txt = inf.read().strip()
     
-        if "fail" in txt:
+        if "fail" in txt or (RM_TIMEOUTS and "timeout" in txt):
             base_name = '_'.join(f.split('_')[:-4]) + '_'
             failed.add(base_name)
-    
-    for name in failed:
-        os.system("pkill %s" % name)
-        os.system("rm -rf %s*" % name)
-        os.system("rm -rf %s/%s*" % (arc_dir, name))
-        if RM_LOGS:
-            os.system("rm -rf %s/%s*" % (log_dir, name))
-    if old_failed != failed:
-        false_alert = 0
-        old_failed = copy.deepcopy(failed)
-    else:
-        false_alert += 1
-    if not WATCH or false_alert > 60:
-        break
-    time.sleep(30)
+remove_failed(failed)
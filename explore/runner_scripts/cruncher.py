@@ -13,6 +13,13 @@ num : int
     Number of successful magic formulas sought.
 skip : Optional[int], default = 0
     Number of magic formulas from the top of the sorted list to skip.
+    Only used when starting a new campaign.
+restart : Optional[bool], default = False
+    Discards the checkpoint of a previous campaign and starts a new one.
+plan : Optional[bool], default = False
+    Prints the estimated cost of the remaining campaign (see >>planner.py<<) and exits
+    without running it. Every remaining magic formula is assumed to be routable;
+    each failure adds the cost of the next one.
 
 Returns
 -------
@@ -22,19 +29,36 @@ Notes
 -----
 Some filename templates may need to be changed, depending on how the previous code
 was run.
+
+The queue of magic formulas, the outcome of every (formula, cluster size) pair,
+the number of successes, and the runner in flight are checkpointed in
+cruncher_T<tech>.checkpoint.json (see >>checkpoint.py<<). If the script is interrupted,
+calling it again resumes the campaign: a runner that is still alive is watched again,
+while the stale processes and the partial files of a dead one are removed before
+the pair is rerun, reusing the generated architectures and the finished VPR runs.
 """
 
 import os
 import time
+import glob
 import argparse
 import sys
 sys.path.insert(0,'..')
+sys.path.insert(0,'../..')
+import results_db
+import ranking
+import log_watcher
+import checkpoint
+import manifest
+import planner
 from conf import *
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--tech")
 parser.add_argument("--num")
 parser.add_argument("--skip")
+parser.add_argument("--restart")
+parser.add_argument("--plan")
 args = parser.parse_args()
 
 
@@ -43,7 +67,10 @@ log_dir_template = arc_dir_template[:-1] + "_logs/"
 
 spice_template = "python -u generate_files_for_magic_formula.py --tech % s --N %d --circs \"*\" --res_dir %s --wire %d --import_padding 1 > /dev/null"
 
-vpr_template = "python -u run_benchmarks.py --arc %s --log_dir %s --circs \"*\" > /dev/null"
+vpr_template = "python -u run_benchmarks.py --arc %s --log_dir %s --circs \"*\" --cancel_failed 1 > /dev/null"
+
+cancel_grace = 60
+#Number of seconds the runner may take to cancel its jobs after a failure.
 
 clean = "rm -rf "
 for seed in seeds:
@@ -51,12 +78,7 @@ for seed in seeds:
 
 sort_log = "all_circs_N8_T%s.sort" % args.tech
 
-wires = []
-with open(sort_log, "r") as inf:
-    lines = inf.readlines()
-
-for line in lines[1:]:
-    wires.append(int(line.split()[0].split('W')[1]))
+wires = [ranking.get_wire(arc) for arc in ranking.read_sort_file(sort_log)]
 
 SKIP = 0
 try:
@@ -64,7 +86,25 @@ try:
 except:
     pass
 
-wires = wires[SKIP:]
+RESTART = False
+try:
+    RESTART = int(args.restart)
+except:
+    pass
+
+PLAN = False
+try:
+    PLAN = int(args.plan)
+except:
+    pass
+
+state_file = "cruncher_T%s.checkpoint.json" % args.tech
+if RESTART and not PLAN:
+    os.system("rm -f %s" % state_file)
+ckpt = checkpoint.Checkpoint(state_file if not (RESTART and PLAN) else None,\
+                             {"tech" : args.tech, "wires" : wires[SKIP:], "next" : 0, "succeeded" : 0}, read_only = PLAN)
+wires = ckpt.state["wires"]
+#A resumed campaign keeps the queue it started with.
 
 ##########################################################################
 def spawn_ret_pid(cmd):
@@ -102,10 +142,125 @@ def spawn_ret_pid(cmd):
 ##########################################################################
 
 ##########################################################################
-def watch_status(pid, log_dir, arc_dir, wire):
+def wait_pid(pid, poll_interval = 5):
+    """Waits until the process exits.
+
+    Parameters
+    ----------
+    pid : int
+        pid.
+    poll_interval : Optional[int], default = 5
+        Number of seconds between two checks.
+
+    Returns
+    -------
+    None
+    """
+
+    while checkpoint.is_alive(pid):
+        time.sleep(poll_interval)
+##########################################################################
+
+##########################################################################
+def clean_in_flight(step):
+    """Removes the stale processes and the partial files of a step
+    whose runner died with the previous invocation of the script.
+
+    Parameters
+    ----------
+    step : str
+        Step name (e.g., W15_N8_spice).
+
+    Returns
+    -------
+    None
+    """
+
+    wire, N = [int(w[1:]) for w in step.split('_')[:2]]
+    print "cleaning up ", step
+    print "killed ", ckpt.kill_in_flight()
+    #Orphaned VPR and architecture generation runs, which carry the lease token of the step.
+    arc_prefix = "magic_T%s_N%d_W%d_" % (args.tech, N, wire)
+    for seed in seeds:
+        for run_dir in glob.glob("%s*_%d" % (arc_prefix, seed)):
+            if not checkpoint.is_in_use(run_dir):
+                os.system("rm -rf %s" % run_dir)
+    gen_dir = "../../generate_architecture/"
+    if checkpoint.is_in_use(gen_dir):
+        print "generation running in ", gen_dir
+        return
+    for f in manifest.Manifest(arc_dir_template % (N, args.tech)).get_unregistered(gen_dir, arc_prefix):
+        os.system("rm -rf %s%s" % (gen_dir, f))
+    #Files of interrupted architecture generations, which are only moved
+    #into the architecture directory once complete.
+##########################################################################
+
+##########################################################################
+def launch(step, cmd, pattern):
+    """Spawns the command of the step, unless the runner of the step
+    survived the previous invocation of the script, and records the step as in flight.
+
+    Parameters
+    ----------
+    step : str
+        Step name.
+    cmd : str
+        Command.
+    pattern : str
+        Name of the script run by the command.
+
+    Returns
+    -------
+    int
+        pid of the runner.
+    """
+
+    pid = adopted if step == in_flight else None
+    if pid is None:
+        ckpt.begin(step)
+        #Exports the lease token to the runner.
+        pid = spawn_ret_pid(cmd)
+    else:
+        print "resuming ", step, pid
+    ckpt.begin(step, pid, pattern)
+
+    return pid
+##########################################################################
+
+##########################################################################
+def move_results(log_dir, arc_dir, wire):
+    """Moves the directories of a successfully completed run, with the results
+    database and the journals of the log directory (see >>results_db.py<<),
+    to their names suffixed by the wire number. Whatever was moved before
+    an interruption is skipped, so that the move can be completed on resume.
+
+    Parameters
+    ----------
+    log_dir : str
+        Log directory.
+    arc_dir : str
+        Architecture directory.
+    wire : int
+        Wire number.
+
+    Returns
+    -------
+    None
+    """
+
+    moves = [(arc_dir[:-1], "%s_%d" % (arc_dir[:-1], wire)), (log_dir[:-1], "%s_%d" % (log_dir[:-1], wire)),\
+             (results_db.get_filename(log_dir), results_db.get_filename("%s_%d" % (log_dir[:-1], wire))),\
+             (results_db.get_journal_dir(log_dir), results_db.get_journal_dir("%s_%d" % (log_dir[:-1], wire)))]
+    for src, dst in moves:
+        if os.path.exists(src) and not os.path.exists(dst):
+            os.rename(src, dst)
+##########################################################################
+
+##########################################################################
+def watch_status(pid, log_dir, arc_dir):
     """Watches the status of the run. If there is a failure in any routing,
     kills the run and returns False. If the >>pid<< runner completes without
-    failure, returns True.
+    failure, returns True (see >>move_results<<).
 
     Parameters
     ----------
@@ -115,53 +270,141 @@ def watch_status(pid, log_dir, arc_dir, wire):
         Directory to watch on.
     arc_dir : str
         Architecture directory.
-    wire : int
-        Wire number. Used to move the successfully completed directories.
 
     Returns
     -------
     bool
         True if completed without failures, False otherwise.
+
+    Notes
+    -----
+    Failures are reported by a watcher on the log directory (see >>log_watcher.py<<),
+    which reads only the newly written logs. The runner cancels its remaining jobs
+    on the first failure by itself (see >>run_benchmarks.py<<), so it is given
+    >>cancel_grace<< seconds to exit before all runs are killed. The results database
+    of the log directory (see >>results_db.py<<) and its journals are removed together
+    with it.
     """
 
+    db = results_db.get_filename(log_dir)
+    journal_dir = results_db.get_journal_dir(log_dir)
+    watcher = log_watcher.LogWatcher(log_dir)
     while True:
+        alive = True
         try:
             os.kill(pid, 0)
         except OSError:
-            os.system("mv %s %s_%d/" % (arc_dir, arc_dir[:-1], wire))
-            os.system("mv %s %s_%d/" % (log_dir, log_dir[:-1], wire))
+            alive = False
+
+        failed = watcher.get_failures(5 if alive else 0)
+        #The logs written just before the runner exited are checked too.
+        if failed:
+            break
+        if not alive:
+            watcher.close()
             return True
-        
-        os.system("grep -r fail %s | wc > failure_detect.dump" % log_dir)
-        with open("failure_detect.dump", "r") as inf:
-            txt = inf.read()
-        os.system("rm -rf failure_detect.dump")
-        if int(txt.split()[0]) != 0:
-            os.system("ps aux |grep python |grep -v \'cruncher.py\' |awk \'{print $2}\' |xargs kill")
-            os.system("pkill vpr")
-            os.system(clean)
-            os.system("rm -rf %s %s" % (arc_dir, log_dir))
-            return False
-
-        time.sleep(5)
+    watcher.close()
+
+    print "failed ", ' '.join(sorted(failed))
+    deadline = time.time() + cancel_grace
+    while time.time() < deadline:
+        try:
+            os.kill(pid, 0)
+        except OSError:
+            break
+        time.sleep(1)
+    else:
+        os.system("ps aux |grep python |grep -v \'cruncher.py\' |awk \'{print $2}\' |xargs kill")
+        os.system("pkill vpr")
+    os.system(clean)
+    os.system("rm -rf %s %s %s %s" % (arc_dir, log_dir, db, journal_dir))
+
+    return False
+##########################################################################
+
 ##########################################################################
+def plan_campaign():
+    """Prints the estimated cost of the remaining magic formulas.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+
+    plan = planner.Planner([arc_dir_template % (N, args.tech) for N in Ns])
+    wire_types = dict(planner.list_compositions("all_channels/", args.tech))
+    i = ckpt.state["next"]
+    for wire in wires[i : i + max(0, int(args.num) - ckpt.state["succeeded"])]:
+        for N in Ns:
+            step = "W%d_N%d" % (wire, N)
+            if ckpt.is_done(step):
+                continue
+            arc_dir = arc_dir_template % (N, args.tech)
+            grids = sorted(set(grid_sizes[N].values()))
+            if not ckpt.is_done(step + "_spice"):
+                plan.add_generation("N%d generation" % N, planner.get_pending_generation(arc_dir, args.tech, N,\
+                                    [(wire, wire_types.get(wire, planner.default_wire_types))], grids))
+            jobs = [(arc_dir + manifest.arc_name % (args.tech, N, wire, grid_sizes[N][c], grid_sizes[N][c]) + ".xml",\
+                     "benchmarks/%s.blif" % c, seed) for c in grid_sizes[N] for seed in seeds]
+            plan.add_vpr("N%d VPR" % N, jobs, log_dir_template % (N, args.tech))
+
+    plan.report("cruncher.py --tech %s" % args.tech)
+##########################################################################
+
+if PLAN:
+    plan_campaign()
+    exit(0)
 
+if not ckpt.claim():
+    print "campaign still run by ", ckpt.state["owner"]["pid"]
+    exit(1)
+in_flight, adopted = ckpt.get_in_flight()
+if in_flight is not None and adopted is None:
+    clean_in_flight(in_flight)
 
-i = 0
-succeeded = 0
+i = ckpt.state["next"]
+succeeded = ckpt.state["succeeded"]
+if ckpt.resumed:
+    print "resumed at ", i, " succeeded ", succeeded
 while succeeded < int(args.num):
     wire = wires[i]
     i += 1
     for N in Ns:
+        step = "W%d_N%d" % (wire, N)
+        if ckpt.is_done(step):
+            #Completed before the interruption.
+            not_failed = ckpt.get_outcome(step)
+            if not not_failed:
+                break
+            continue
         arc_dir = arc_dir_template % (N, args.tech)
         log_dir = log_dir_template % (N, args.tech)
         spice_call = spice_template % (args.tech, N, arc_dir, wire)
         vpr_call = vpr_template % (arc_dir, log_dir)
-        os.system(spice_call)
-        pid = spawn_ret_pid(vpr_call)
-        not_failed = watch_status(pid, log_dir, arc_dir, wire)
+        if not ckpt.is_done(step + "_spice"):
+            wait_pid(launch(step + "_spice", spice_call, "generate_files_for_magic_formula.py"))
+            ckpt.end(step + "_spice")
+        if ckpt.is_done(step + "_vpr"):
+            #Interrupted while moving the results.
+            move_results(log_dir, arc_dir, wire)
+            not_failed = True
+            ckpt.end(step, not_failed)
+            continue
+        pid = launch(step, vpr_call, "run_benchmarks.py")
+        not_failed = watch_status(pid, log_dir, arc_dir)
+        if not_failed:
+            ckpt.end(step + "_vpr")
+            #Recorded before the move, so that a resumed campaign completes it
+            #instead of running VPR again without the architecture directory.
+            move_results(log_dir, arc_dir, wire)
+        ckpt.end(step, not_failed)
         if not not_failed:
             break
     if not_failed:
         succeeded += 1
+    ckpt.end("W%d" % wire, not_failed, next = i, succeeded = succeeded)
     print succeeded
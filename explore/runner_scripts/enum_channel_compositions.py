@@ -29,28 +29,6 @@ sys.path.insert(0,'../../')
 import setenv
 import tech
 
-parser = argparse.ArgumentParser()
-parser.add_argument("--K")
-parser.add_argument("--N")
-parser.add_argument("--tech")
-parser.add_argument("--dump_dir")
-args = parser.parse_args()
-
-K = int(args.K)
-N = int(args.N)
-
-try:
-    tech_node = int(args.tech)
-except:
-    tech_node = float(args.tech)
-
-node_index = tech.nodes.index(tech_node)
-node_device_index = tech.node_names.index(int(tech_node))
-
-GP = tech.GP[node_device_index]
-FP = tech.FP[node_device_index]
-MyP = tech.MyP[node_index]
-
 prototype_mux = 16
 mux_w = float(21 + int(math.ceil(prototype_mux ** 0.5)))
 #Size of the assumed average multiplexer. This assumption is neccessary
@@ -64,23 +42,74 @@ lut_w = 16 * 10
 Wb = lut_w + crossbar_and_cb_cols * mux_w
 #Fixed width due to LUT and local multiplexers.
 
-lut_h = 2 ** (K - 4) * 12.0
-#LUT height in gate pitches.
+##########################################################################
+def parse_tech(tech_str):
+    """Parses the technology node argument.
+
+    Parameters
+    ----------
+    tech_str : str
+        Technology node (e.g., 4 or 3.1).
+
+    Returns
+    -------
+    Union[int, float]
+        Technology node, as listed in >>tech.nodes<<.
+    """
+
+    try:
+        return int(tech_str)
+    except ValueError:
+        return float(tech_str)
+##########################################################################
+
+##########################################################################
+def get_params(K, N, tech_node):
+    """Returns the parameters of the enumeration that depend on the architecture and technology.
+
+    Parameters
+    ----------
+    K : int
+        LUT size.
+    N : int
+        Cluster size.
+    tech_node : Union[int, float]
+        Technology node (see >>parse_tech<<).
+
+    Returns
+    -------
+    Dict[str, various]
+        Parameters.
+    """
+
+    node_index = tech.nodes.index(tech_node)
+    node_device_index = tech.node_names.index(int(tech_node))
 
-max_V_span = tech.max_V_span[node_index][K][N]
-max_H_span = 8 if tech_node not in (4, 3.0) else 4
+    max_V_span = tech.max_V_span[node_index][K][N]
+    max_H_span = 8 if tech_node not in (4, 3.0) else 4
 
-V_spans = [2 ** i for i in range(1, int(math.log(max_V_span, 2)) + 1)]
-H_spans = [2 ** i for i in range(1, int(math.log(max_H_span, 2)) + 1)]
+    lut_h = 2 ** (K - 4) * 12.0
+    #LUT height in gate pitches.
 
+    return {"K" : K, "N" : N,\
+            "GP" : tech.GP[node_device_index],\
+            "FP" : tech.FP[node_device_index],\
+            "MyP" : tech.MyP[node_index],\
+            "lut_h" : lut_h,\
+            "V_spans" : [2 ** i for i in range(1, int(math.log(max_V_span, 2)) + 1)],\
+            "H_spans" : [2 ** i for i in range(1, int(math.log(max_H_span, 2)) + 1)]}
 ##########################################################################
-def get_max_count(name, local_Wb = Wb):
+
+##########################################################################
+def get_max_count(name, params, local_Wb = Wb):
     """Returns the maximum number of wires of the given span per LUT.
 
     Parameters
     ----------
     name : str
         Wire identifier.
+    params : Dict[str, various]
+        Parameters (see >>get_params<<).
     local_Wb : Optional[int], default = Wb
         Current active width.
 
@@ -90,6 +119,7 @@ def get_max_count(name, local_Wb = Wb):
         Maximum number of occurences of the wire per LUT.
     """
 
+    K, N, GP, FP, MyP, lut_h = [params[p] for p in ("K", "N", "GP", "FP", "MyP", "lut_h")]
     L = int(name[1:])
     
     if name[0] == 'H':
@@ -102,12 +132,13 @@ def get_max_count(name, local_Wb = Wb):
 ##########################################################################
 
 ##########################################################################
-def enum_h_channels():
+def enum_h_channels(params):
     """Enumerates the legal horizontal channels.
 
     Parameters
     ----------
-    None
+    params : Dict[str, various]
+        Parameters (see >>get_params<<).
 
     Returns
     -------
@@ -115,6 +146,8 @@ def enum_h_channels():
         All legal horizontal channel compositions.
     """
 
+    GP, MyP, lut_h, H_spans = [params[p] for p in ("GP", "MyP", "lut_h", "H_spans")]
+
     #-------------------------------------------------------------------------#
     def check_feas(comb, wire_ids):
         """Checks whether the composition is feasible.
@@ -168,7 +201,7 @@ def enum_h_channels():
     max_counts = {}
     for h in H_spans:
         h_name = "H%d" % h
-        max_counts.update({h_name : get_max_count(h_name)})
+        max_counts.update({h_name : get_max_count(h_name, params)})
 
     all_counts = {}
     for h in max_counts:
@@ -202,13 +235,15 @@ def enum_h_channels():
 ##########################################################################
 
 ##########################################################################
-def enum_v_channels(h_wires):
+def enum_v_channels(h_wires, params):
     """Enumerates the legal vertical channels.
 
     Parameters
     ----------
     h_wires : int
         The number of used horizontal wires
+    params : Dict[str, various]
+        Parameters (see >>get_params<<).
 
     Returns
     -------
@@ -216,6 +251,8 @@ def enum_v_channels(h_wires):
         All legal horizontal channel compositions.
     """
 
+    K, N, FP, MyP, V_spans = [params[p] for p in ("K", "N", "FP", "MyP", "V_spans")]
+
     alpha = 2 ** (K - 4)
     #Number of multiplexers per LUT height (if surpassed, a new column must be appended).
 
@@ -277,7 +314,7 @@ def enum_v_channels(h_wires):
     max_counts = {}
     for v in V_spans:
         v_name = "V%d" % v
-        max_counts.update({v_name : get_max_count(v_name, Wb_local)})
+        max_counts.update({v_name : get_max_count(v_name, params, Wb_local)})
 
     all_counts = {}
     for v in max_counts:
@@ -346,14 +383,51 @@ def export_channel(channel):
     return txt
 ##########################################################################
    
-h_channels = enum_h_channels()
+##########################################################################
+def enum_channels(K, N, tech_node):
+    """Enumerates all legal channel compositions. The position of a composition
+    in the returned list is its identifier (wire number) used throughout the flow.
+
+    Parameters
+    ----------
+    K : int
+        LUT size.
+    N : int
+        Cluster size.
+    tech_node : Union[int, float]
+        Technology node (see >>parse_tech<<).
+
+    Returns
+    -------
+    List[Tuple[Dict[str, int]]]
+        Horizontal and vertical channel compositions.
+    """
+
+    params = get_params(K, N, tech_node)
+    h_channels = enum_h_channels(params)
+
+    channels = []
+    for h_chan in h_channels:
+        for v_chan in enum_v_channels(sum([h_chan[h] for h in h_chan]), params):
+            channels.append((h_chan, v_chan))
+
+    return channels
+##########################################################################
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--K")
+    parser.add_argument("--N")
+    parser.add_argument("--tech")
+    parser.add_argument("--dump_dir")
+    args = parser.parse_args()
+
+    K = int(args.K)
+    N = int(args.N)
 
-channels = []
-for h_chan in h_channels:
-    for v_chan in enum_v_channels(sum([h_chan[h] for h in h_chan])):
-        channels.append((h_chan, v_chan))
+    channels = enum_channels(K, N, parse_tech(args.tech))
 
-os.system("mkdir %s" % args.dump_dir)
-for i, c in enumerate(channels):
-    with open("%s/K%dN%dT%s_%d.wire" % (args.dump_dir, K, N, args.tech, i), "w") as outf:
-        outf.write(export_channel(c))
+    os.system("mkdir %s" % args.dump_dir)
+    for i, c in enumerate(channels):
+        with open("%s/K%dN%dT%s_%d.wire" % (args.dump_dir, K, N, args.tech, i), "w") as outf:
+            outf.write(export_channel(c))
@@ -18,6 +18,20 @@ pad_only : Optional[bool], default = False
     Specifies that only the padding log should be produced.
 import padding : Optional[bool], default = False
     Specifies that padding should be imported from N8 magic.
+rr_store : Optional[str], default = None
+    Store directory of the RR-graph bodies. If specified, each generated RR-graph
+    is split into a per-architecture header and a shared body (see >>rr_store.py<<).
+rr_codec : Optional[str], default = lz4
+    Codec of the RR-graph archives: {lz4, zstd} (see >>codec.py<<).
+rr_dict : Optional[str], default = None
+    zstd dictionary used to compress the RR-graphs (see >>helper_scripts/bench_codecs.py<<).
+    It is copied into the result directory, where the decompression finds it.
+queue : Optional[str], default = None
+    Shared queue directory (see >>work_queue.py<<). If specified, the architecture generation
+    jobs are enqueued and run by the workers serving the queue (see >>queue_worker.py<<).
+    At most HSPICE_CPU of them run at the same time over all workers.
+queue_workers : Optional[int], default = 0
+    Number of jobs run in parallel by a worker started on this host for the enqueued jobs.
 
 Returns
 -------
@@ -31,7 +45,12 @@ sys.path.insert(0,'..')
 sys.path.insert(0,'../..')
 
 import setenv
+import manifest
+import rr_store
+import codec
+import campaign_status
 from parallelize import Parallel
+from work_queue import WorkQueue
 from conf import *
 
 parser = argparse.ArgumentParser()
@@ -42,6 +61,11 @@ parser.add_argument("--wire")
 parser.add_argument("--res_dir")
 parser.add_argument("--pad_only")
 parser.add_argument("--import_padding")
+parser.add_argument("--rr_store")
+parser.add_argument("--rr_codec")
+parser.add_argument("--rr_dict")
+parser.add_argument("--queue")
+parser.add_argument("--queue_workers")
 args = parser.parse_args()
 
 PAD_ONLY = False
@@ -56,6 +80,34 @@ try:
 except:
     pass
 
+RR_STORE = None
+try:
+    RR_STORE = os.path.abspath(args.rr_store)
+except:
+    pass
+
+RR_CODEC = "lz4"
+if args.rr_codec in codec.codecs:
+    RR_CODEC = args.rr_codec
+
+RR_DICT = None
+try:
+    RR_DICT = os.path.abspath(args.rr_dict)
+except:
+    pass
+
+QUEUE = None
+try:
+    QUEUE = os.path.abspath(args.queue)
+except:
+    pass
+
+QUEUE_WORKERS = 0
+try:
+    QUEUE_WORKERS = int(args.queue_workers)
+except:
+    pass
+
 N = int(args.N)
 
 used_sizes = set()
@@ -79,7 +131,11 @@ if args.res_dir is not None:
     res_dir = args.res_dir
 os.system("mkdir " + res_dir)
 res_dir = os.path.abspath(res_dir) + '/'
+if RR_DICT is not None and RR_DICT != res_dir + codec.dict_filename:
+    #Already in place when regenerating evicted RR-graphs (see >>storage.rebuild<<).
+    os.system("cp %s %s%s" % (RR_DICT, res_dir, codec.dict_filename))
 call = "time python -u arc_gen.py --K 6 --N %d --wire_file %s --grid_w %d --grid_h %d --density 0.5 --tech %s --arc_name %s --physical_square 1"\
+     + (" --rr_codec %s" % RR_CODEC) + ((" --rr_dict %s" % RR_DICT) if RR_DICT is not None else '')\
      + (" --only_pad 1" if PAD_ONLY else '') + (" --import_padding \"../explore/runner_scripts/all_circs_magic_N8_T%s/magic_T%s_N8_W%d_W13_H13_padding.log\"" if IMPORT_PADDING else '')
 wd = os.getcwd()
 
@@ -97,24 +153,67 @@ if args.wire is not None:
 else:
     WIRE = None
 
-calls = []
-grid_h = grid_w = used_sizes[0]
-for c in os.listdir(chan_dir):
+channels = []
+for c in sorted(os.listdir(chan_dir)):
     if c.rsplit('T', 1)[1].split('_', 1)[0] != args.tech:
         continue
     c_cnt = int(c.split('_')[1].rsplit('.', 1)[0])
     if WIRE is not None and not c_cnt in WIRE:
         continue
+    channels.append((c, c_cnt))
+#The channel directory is listed only once.
+
+arc_manifest = manifest.Manifest(res_dir)
+needed = ("padding",) if PAD_ONLY else ("arc", "rr", "padding")
+generated = []
+
+##########################################################################
+def needs_generation(arc_name_concrete):
+    """Checks if the artifacts of the architecture must be (re)generated.
+
+    Parameters
+    ----------
+    arc_name_concrete : str
+        Architecture file name.
+
+    Returns
+    -------
+    bool
+        True if some artifacts are missing or stale.
+    """
+
+    state = arc_manifest.check(arc_name_concrete.rsplit('.', 1)[0], needed)
+    if state == "ok":
+        return False
+    generated.append(arc_name_concrete)
+    if manifest.is_complete('.', arc_name_concrete.rsplit('.', 1)[0], needed):
+        print("Adopting %s, generated by an interrupted invocation." % arc_name_concrete)
+        #Moved into the result directory and registered with the newly generated ones.
+        return False
+    if state != "missing":
+        print("Regenerating %s %s." % (state, arc_name_concrete))
+
+    return True
+##########################################################################
+
+calls = []
+grid_h = grid_w = used_sizes[0]
+for c, c_cnt in channels:
     print(c)
     arc_name_concrete = arc_name % (args.tech, N, c_cnt, grid_w, grid_h)
-    if arc_name_concrete in os.listdir(res_dir):
+    if not needs_generation(arc_name_concrete):
         continue
     if IMPORT_PADDING:
         calls.append(call % (N, chan_dir + c, grid_w, grid_h, args.tech, arc_name_concrete, args.tech, args.tech, c_cnt))
     else:
         calls.append(call % (N, chan_dir + c, grid_w, grid_h, args.tech, arc_name_concrete))
 
-runner = Parallel(min(max_spice, max_cpu), sleep_interval)
+if QUEUE is not None:
+    runner = WorkQueue(QUEUE, sleep_interval, max_running = max_spice, local_workers = QUEUE_WORKERS)
+    #The HSPICE licenses are shared by all hosts.
+else:
+    runner = Parallel(min(max_spice, max_cpu), sleep_interval, status_file = campaign_status.get_pool_filename("spice"),\
+                      status_fields = {"stage" : "spice", "cached" : len(channels) - len(calls)})
 runner.init_cmd_pool(calls)
 runner.run()
 
@@ -125,47 +224,43 @@ if not PAD_ONLY and len(used_sizes) > 1:
     for size in used_sizes[1:]:
         grid_w = size
         grid_h = size
-        for c in os.listdir(chan_dir):
-            if c.rsplit('T', 1)[1].split('_', 1)[0] != args.tech:
-                continue
-            c_cnt = int(c.split('_')[1].rsplit('.', 1)[0])
-            if WIRE is not None and not c_cnt in WIRE:
-                continue
+        for c, c_cnt in channels:
             print(c)
             arc_name_concrete = arc_name % (args.tech, N, c_cnt, grid_w, grid_h)
-            if arc_name_concrete in os.listdir(res_dir):
+            if not needs_generation(arc_name_concrete):
                 continue
+            base_arc = arc_name % (args.tech, N, c_cnt, used_sizes[0], used_sizes[0])
+            if not os.path.exists(base_arc):
+                #Generated by a previous invocation.
+                base_arc = res_dir + base_arc
             if IMPORT_PADDING:
                 calls.append(call % (N, chan_dir + c, grid_w, grid_h, args.tech, arc_name_concrete, args.tech, args.tech, c_cnt)\
-                             + " --change_grid_dimensions %s" % (arc_name % (args.tech, N, c_cnt, used_sizes[0], used_sizes[0])))
+                             + " --change_grid_dimensions %s" % base_arc)
             else:
                 calls.append(call % (N, chan_dir + c, grid_w, grid_h, args.tech, arc_name_concrete)\
-                             + " --change_grid_dimensions %s" % (arc_name % (args.tech, N, c_cnt, used_sizes[0], used_sizes[0])))
+                             + " --change_grid_dimensions %s" % base_arc)
 
-    runner = Parallel(max_cpu, sleep_interval)
+    if QUEUE is not None:
+        runner = WorkQueue(QUEUE, sleep_interval, local_workers = QUEUE_WORKERS)
+    else:
+        runner = Parallel(max_cpu, sleep_interval, status_file = campaign_status.get_pool_filename("generate"),\
+                          status_fields = {"stage" : "generate", "cached" : len(channels) * (len(used_sizes) - 1) - len(calls)})
     runner.init_cmd_pool(calls)
     runner.run()
 
-for size in used_sizes:
-    grid_w = size
-    grid_h = size
-    for c in os.listdir(chan_dir):
-        if c.rsplit('T', 1)[1].split('_', 1)[0] != args.tech:
-            continue
-        c_cnt = int(c.split('_')[1].rsplit('.', 1)[0])
-        if WIRE is not None and not c_cnt in WIRE:
-            continue
-        print(c)
-        arc_name_concrete = arc_name % (args.tech, N, c_cnt, grid_w, grid_h)
-        if arc_name_concrete in os.listdir(res_dir):
-            continue
-        rr_name = arc_name_concrete.rsplit('.', 1)[0] + "_rr.xml.lz4"
-        log_name = arc_name_concrete.rsplit('.', 1)[0] + "_padding.log"
-        os.system("mv %s %s" % (log_name, res_dir))
-        if not PAD_ONLY:
-            os.system("mv %s %s" % (arc_name_concrete, res_dir))
-            os.system("mv %s %s" % (rr_name, res_dir))
-    if PAD_ONLY:
-         break
+for arc_name_concrete in generated:
+    base = arc_name_concrete.rsplit('.', 1)[0]
+    moved = [base + manifest.kinds["padding"], base + manifest.kinds["meta"]]
+    if not PAD_ONLY:
+        moved += [arc_name_concrete, base + "_rr.xml" + codec.suffixes[RR_CODEC]]
+    for f in moved:
+        if os.path.exists(f):
+            os.system("mv %s %s" % (f, res_dir))
+            if RR_STORE is not None and f.endswith(rr_store.archive_suffixes):
+                header_file, shared = rr_store.split(res_dir + f, RR_STORE)
+                if header_file is not None:
+                    f = os.path.basename(header_file)
+            arc_manifest.register(res_dir + f)
+arc_manifest.save()
  
 os.chdir(wd)
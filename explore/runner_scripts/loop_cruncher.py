@@ -1,14 +1,27 @@
 """Simply loops through all technologies, calling >>cruncher.py<<.
 The name of the script is such that cruncher will not kill it.
+
+The completed technologies are checkpointed in loop_cruncher.checkpoint.json
+(see >>checkpoint.py<<), so that calling the script again after an interruption
+skips them and resumes the interrupted one (see >>cruncher.py<<).
 """
 
 import os
 import sys
 sys.path.insert(0,'..')
 
+import checkpoint
 from conf import tech_nodes
 
 num = 3
 
+ckpt = checkpoint.Checkpoint("loop_cruncher.checkpoint.json")
+if not ckpt.claim():
+    exit(1)
+
 for tech in tech_nodes:
-    os.system("time python -u cruncher.py --tech %s --num %d" % (str(tech), num))
+    if ckpt.is_done(str(tech)):
+        continue
+    ckpt.begin(str(tech))
+    if os.system("time python -u cruncher.py --tech %s --num %d" % (str(tech), num)) == 0:
+        ckpt.end(str(tech))
@@ -13,19 +13,103 @@ keep : Optional[bool], deafult = False
     Instructs the script to keep the VPR files.
 timeout : Optional[int], default = None
     Number of seconds until timeout of a single run.
+adaptive_timeout : Optional[bool], default = False
+    Derives the timeout of each run from the runtime history of the same circuit and
+    cluster size (see >>runtime_history.RuntimePredictor.get_timeout<<).
+    >>timeout<< is used for the runs without enough history.
+timeout_quantile : Optional[float], default = 0.95
+    Runtime quantile used for the adaptive timeout.
+timeout_slack : Optional[float], default = 2.0
+    Multiplier of the runtime quantile.
+min_timeout : Optional[int], default = 30
+    Lower bound of the adaptive timeout in seconds.
+early_abort : Optional[bool], default = False
+    Kills the runs whose routing is predicted not to converge (see >>run_vpr.py<<).
+pack_cache : Optional[str], default = None
+    Directory of the packed-netlist cache shared by the runs (see >>run_vpr.py<<).
+rr_cache : Optional[str], default = None
+    Directory of the decompressed RR-graph cache shared by the runs (see >>run_vpr.py<<).
+rr_cache_quota : Optional[float], default = 16
+    Size of the RR-graph cache in GB.
+result_cache : Optional[str], default = None
+    Directory of the content-addressed VPR result cache shared by the runs (see >>run_vpr.py<<).
 is_magic : Optional[bool], default = False
     Turns on the magic flags (turns off the final high-effort ones).
+seeds : Optional[str], default = None
+    Space-separated subset of placement seeds to run. All seeds from >>conf.py<< by default.
+wires : Optional[str], default = None
+    Space-separated list of channel composition identifiers. If specified,
+    only architectures from the directory matching one of them are run.
+adaptive_seeds : Optional[bool], default = False
+    Runs only the first two seeds and adds the remaining ones for an
+    (architecture, circuit) pair only if the first two results differ by more
+    than >>seed_tol<<, or if the architecture is close to the promotion cutoff.
+seed_tol : Optional[float], default = 0.02
+    Relative tolerance between the results of the first two seeds.
+cutoff : Optional[float], default = None
+    Fraction of the architectures that get promoted (e.g., to the next
+    successive-halving rung or to the final experiments).
+cutoff_margin : Optional[float], default = 0.02
+    Architectures whose provisional geomean delay is within this relative
+    margin of the delay at the cutoff get all seeds on all circuits.
+cancel_failed : Optional[bool], default = False
+    Watches the log directory (see >>log_watcher.py<<) and, as soon as a run fails,
+    cancels all pending and running jobs of the same channel composition.
+rebuild : Optional[bool], default = False
+    Regenerates the partial architectures (e.g., whose RR-graphs were evicted
+    by >>helper_scripts/manage_storage.py<<) before running them, instead of skipping them.
+queue : Optional[str], default = None
+    Shared queue directory (see >>work_queue.py<<). If specified, the jobs are enqueued
+    and run by the workers serving the queue (see >>queue_worker.py<<), on any host
+    mounting it, instead of being spawned on this host.
+queue_workers : Optional[int], default = 0
+    Number of jobs run in parallel by a worker started on this host for the enqueued jobs.
+speculate : Optional[str], default = None
+    Once all jobs have been issued and some cores are idle, launches a backup copy of each
+    straggler, i.e., a run exceeding its predicted runtime by >>straggler_factor<<. The copy
+    that finishes first is kept and the other one is killed (see >>run_vpr.py --backup<<).
+    "dup" reruns the same seed. "seed" runs an alternate seed from >>conf.reserve_seeds<<
+    instead, logged in place of the straggling one. Ignored with --queue.
+straggler_factor : Optional[float], default = 2.0
+    Multiplier of the predicted runtime above which a run is a straggler.
+min_straggler_time : Optional[float], default = 60
+    Number of seconds below which a run is never a straggler.
+mem_budget : Optional[float], default = 0.9 of the physical memory
+    Memory in GB that the running jobs may use together. A job is issued only if its
+    estimated peak memory fits, next to those of the running jobs; smaller jobs that fit
+    overtake it meanwhile. 0 turns the limit off. Ignored with --queue.
+plan : Optional[bool], default = False
+    Prints the estimated cost of the pending jobs (see >>planner.py<<) and exits without running them.
+    All seeds are priced, even with --adaptive_seeds. Architectures to be rebuilt are not.
+
+Notes
+-----
+Jobs are issued longest-expected-first, with the runtimes predicted from
+the history recorded by >>run_vpr.py<< (see >>runtime_history.py<<).
+The same predictions identify the stragglers (see >>speculate<<). Peak memory is predicted
+from the peaks that >>run_vpr.py<< recorded for the same architecture and circuit, or else
+from the RR-graph node and edge counts of the sidecar (see >>runtime_history.MemoryPredictor<<).
 """
 
 import os
+import time
+import math
 import argparse
 import sys
 sys.path.insert(0,'..')
 sys.path.insert(0,'../..')
 
 import setenv
+import runtime_history
+import log_watcher
+import manifest
+import storage
+import arc_meta
+import planner
+import campaign_status
 
 from parallelize import Parallel
+from work_queue import WorkQueue
 from conf import *
 
 parser = argparse.ArgumentParser()
@@ -34,7 +118,31 @@ parser.add_argument("--circs")
 parser.add_argument("--log_dir")
 parser.add_argument("--keep")
 parser.add_argument("--timeout")
+parser.add_argument("--adaptive_timeout")
+parser.add_argument("--timeout_quantile")
+parser.add_argument("--timeout_slack")
+parser.add_argument("--min_timeout")
+parser.add_argument("--early_abort")
+parser.add_argument("--pack_cache")
+parser.add_argument("--rr_cache")
+parser.add_argument("--rr_cache_quota")
+parser.add_argument("--result_cache")
 parser.add_argument("--is_magic")
+parser.add_argument("--seeds")
+parser.add_argument("--wires")
+parser.add_argument("--adaptive_seeds")
+parser.add_argument("--seed_tol")
+parser.add_argument("--cutoff")
+parser.add_argument("--cutoff_margin")
+parser.add_argument("--cancel_failed")
+parser.add_argument("--rebuild")
+parser.add_argument("--queue")
+parser.add_argument("--queue_workers")
+parser.add_argument("--speculate")
+parser.add_argument("--straggler_factor")
+parser.add_argument("--min_straggler_time")
+parser.add_argument("--mem_budget")
+parser.add_argument("--plan")
 args = parser.parse_args()
 
 KEEP = 0
@@ -49,39 +157,495 @@ try:
 except:
     pass
 
+ADAPTIVE_TIMEOUT = 0
+try:
+    ADAPTIVE_TIMEOUT = int(args.adaptive_timeout)
+except:
+    pass
+
+TIMEOUT_QUANTILE = 0.95
+try:
+    TIMEOUT_QUANTILE = float(args.timeout_quantile)
+except:
+    pass
+
+TIMEOUT_SLACK = 2.0
+try:
+    TIMEOUT_SLACK = float(args.timeout_slack)
+except:
+    pass
+
+MIN_TIMEOUT = 30
+try:
+    MIN_TIMEOUT = int(args.min_timeout)
+except:
+    pass
+
+EARLY_ABORT = 0
+try:
+    EARLY_ABORT = int(args.early_abort)
+except:
+    pass
+
 IS_MAGIC = 0
 try:
     IS_MAGIC = int(args.is_magic)
 except:
     pass
 
-os.system("mkdir %s" % args.log_dir)
+SEEDS = seeds
+try:
+    SEEDS = [int(seed) for seed in args.seeds.split()]
+except:
+    pass
+
+WIRES = None
+try:
+    WIRES = set([int(wire) for wire in args.wires.split()])
+except:
+    pass
+
+ADAPTIVE_SEEDS = False
+try:
+    ADAPTIVE_SEEDS = int(args.adaptive_seeds)
+except:
+    pass
+
+SEED_TOL = 0.02
+try:
+    SEED_TOL = float(args.seed_tol)
+except:
+    pass
+
+CUTOFF = None
+try:
+    CUTOFF = float(args.cutoff)
+except:
+    pass
+
+CUTOFF_MARGIN = 0.02
+try:
+    CUTOFF_MARGIN = float(args.cutoff_margin)
+except:
+    pass
+
+CANCEL_FAILED = False
+try:
+    CANCEL_FAILED = int(args.cancel_failed)
+except:
+    pass
+
+REBUILD = False
+try:
+    REBUILD = int(args.rebuild)
+except:
+    pass
+
+QUEUE_WORKERS = 0
+try:
+    QUEUE_WORKERS = int(args.queue_workers)
+except:
+    pass
+
+SPECULATE = args.speculate if args.speculate in ("dup", "seed") else None
+
+STRAGGLER_FACTOR = 2.0
+try:
+    STRAGGLER_FACTOR = float(args.straggler_factor)
+except:
+    pass
+
+MIN_STRAGGLER_TIME = 60
+try:
+    MIN_STRAGGLER_TIME = float(args.min_straggler_time)
+except:
+    pass
+
+MEM_BUDGET = runtime_history.get_mem_total()
+if MEM_BUDGET is not None:
+    MEM_BUDGET *= 0.9
+try:
+    MEM_BUDGET = 1e6 * float(args.mem_budget)
+except:
+    pass
+if not MEM_BUDGET:
+    MEM_BUDGET = None
+#In kB, like the peaks.
+
+PLAN = False
+try:
+    PLAN = int(args.plan)
+except:
+    pass
+
+if not PLAN:
+    os.system("mkdir %s" % args.log_dir)
 
 call = "python -u run_vpr.py --arc %s --circ %s --seed %d" + (" --log_dir %s" % args.log_dir)\
-     + (" --keep %d" % KEEP) + ((" --timeout %d" % TIMEOUT) if TIMEOUT is not None else '')\
-     + (" --is_magic %d"  % IS_MAGIC)
-calls = set()
+     + (" --keep %d" % KEEP)\
+     + (" --is_magic %d"  % IS_MAGIC) + (" --adaptive_timeout 1" if ADAPTIVE_TIMEOUT else '')\
+     + (" --early_abort 1" if EARLY_ABORT else '')\
+     + ((" --pack_cache %s" % os.path.abspath(args.pack_cache)) if args.pack_cache is not None else '')\
+     + ((" --rr_cache %s" % os.path.abspath(args.rr_cache)) if args.rr_cache is not None else '')\
+     + ((" --rr_cache_quota %s" % args.rr_cache_quota) if args.rr_cache_quota is not None else '')\
+     + ((" --result_cache %s" % os.path.abspath(args.result_cache)) if args.result_cache is not None else '')
+jobs = set()
 
 max_cpu = int(os.environ["VPR_CPU"])
 sleep_interval = 1
 
+arc_manifest = manifest.Manifest(args.arc) if os.path.isdir(args.arc) else None
+#The architecture directory is listed at most once, instead of once per circuit.
+
+rebuilt = []
 for N in grid_sizes:
     for circ in (grid_sizes[N] if args.circs == '*' else args.circs.split()):
         width = grid_sizes[N][circ]
-        if os.path.isdir(args.arc):
+        if arc_manifest is not None:
             grid_dir = args.arc
-            for f in os.listdir(grid_dir):
-                if not "N%d" % N in f:
+            for name in arc_manifest.find(N = N, grid = width, wires = WIRES):
+                state = arc_manifest.check(name, ("arc", "rr"))
+                if state != "ok":
+                    if REBUILD and state == "partial":
+                        rebuilt.append((name, circ))
+                        continue
+                    print("Skipping %s: %s artifacts." % (name, state))
                     continue
-                if f.endswith(".xml") and int(f.rsplit('W', 1)[1].rsplit("_H", 1)[0]) == width:
-                    for seed in seeds:
-                        calls.add(call % (grid_dir + f, "benchmarks/%s.blif" % circ, seed))
+                for seed in SEEDS:
+                    jobs.add((grid_dir + name + ".xml", "benchmarks/%s.blif" % circ, seed))
         else:
-            for seed in seeds:
-                calls.add(call % (args.arc, "benchmarks/%s.blif" % circ, seed))
+            for seed in SEEDS:
+                jobs.add((args.arc, "benchmarks/%s.blif" % circ, seed))
+if arc_manifest is not None:
+    arc_manifest.save()
+
+if rebuilt and not PLAN:
+    print("Rebuilding %d architectures." % len(set([r[0] for r in rebuilt])))
+    storage.rebuild(args.arc, sorted(set([r[0] for r in rebuilt])))
+    arc_manifest = manifest.Manifest(args.arc)
+    for name, circ in rebuilt:
+        state = arc_manifest.check(name, ("arc", "rr"))
+        if state != "ok":
+            print("Skipping %s: %s artifacts." % (name, state))
+            continue
+        for seed in SEEDS:
+            jobs.add((args.arc + name + ".xml", "benchmarks/%s.blif" % circ, seed))
+    arc_manifest.save()
+
+##########################################################################
+def get_log_filename(job):
+    """Returns the name of the log produced by >>run_vpr.py<< for the job.
+
+    Parameters
+    ----------
+    job : Tuple[str, str, int]
+        Architecture, circuit, and seed.
+
+    Returns
+    -------
+    str
+        Log file name.
+    """
+
+    arc, circ, seed = job
+
+    return "%s/%s_%s_%d.log" % (args.log_dir, os.path.basename(arc).rsplit(".xml", 1)[0],\
+                                os.path.basename(circ).rsplit(".blif", 1)[0], seed)
+##########################################################################
+
+##########################################################################
+def read_result(job):
+    """Reads the critical path delay of a completed run.
+
+    Parameters
+    ----------
+    job : Tuple[str, str, int]
+        Architecture, circuit, and seed.
+
+    Returns
+    -------
+    float
+        Critical path delay or None if the run failed or did not complete.
+    """
+
+    try:
+        with open(get_log_filename(job), "r") as inf:
+            return float(inf.read().strip())
+    except:
+        return None
+##########################################################################
+
+##########################################################################
+def get_extra_seed_jobs(jobs):
+    """Determines which (architecture, circuit) pairs need the remaining seeds,
+    after the first two have been run.
+
+    Parameters
+    ----------
+    jobs : Set[Tuple[str, str, int]]
+        All jobs, with all seeds.
+
+    Returns
+    -------
+    List[Tuple[str, str, int]]
+        Jobs to be run additionally.
+    """
+
+    first = SEEDS[:2]
+    pairs = {}
+    for arc, circ, seed in jobs:
+        if seed in first:
+            pairs.setdefault((arc, circ), []).append(read_result((arc, circ, seed)))
+
+    extra = set()
+    provisional = {}
+    for arc, circ in pairs:
+        tds = pairs[(arc, circ)]
+        if None in tds:
+            #Failed architectures are going to be discarded anyway.
+            provisional.update({arc : None})
+            continue
+        if (max(tds) - min(tds)) / min(tds) > SEED_TOL:
+            extra.add((arc, circ))
+        if provisional.get(arc, 1) is not None:
+            provisional.setdefault(arc, []).append(sum(tds) / len(tds))
+
+    if CUTOFF is not None:
+        #Provisional geomeans are compared by architecture name without the grid size,
+        #as each circuit runs on its own grid.
+        geoms = {}
+        for arc in provisional:
+            if provisional[arc] is None:
+                continue
+            name = '_'.join(os.path.basename(arc).split('_')[:4])
+            geoms.setdefault(name, []).extend(provisional[arc])
+        geoms = {name : math.exp(sum([math.log(td) for td in geoms[name]]) / len(geoms[name])) for name in geoms}
+        ranked = sorted(geoms, key = lambda name : geoms[name])
+        if ranked:
+            cut_td = geoms[ranked[min(len(ranked), int(math.ceil(CUTOFF * len(ranked)))) - 1]]
+            close = set([name for name in geoms if abs(geoms[name] - cut_td) / cut_td <= CUTOFF_MARGIN])
+            for arc, circ in pairs:
+                if '_'.join(os.path.basename(arc).split('_')[:4]) in close and provisional.get(arc, None) is not None:
+                    extra.add((arc, circ))
+
+    extra = [pair for pair in extra if provisional.get(pair[0], None) is not None]
+    print("Adding seeds to %d/%d (architecture, circuit) pairs." % (len(extra), len(pairs)))
+
+    return [(arc, circ, seed) for arc, circ in extra for seed in SEEDS[2:]]
+##########################################################################
+
+history = runtime_history.load()
+predictor = runtime_history.RuntimePredictor(history)
+mem_predictor = runtime_history.MemoryPredictor(history)
+timeout_predictor = runtime_history.RuntimePredictor([e for e in history if e.get("is_magic", 0) == IS_MAGIC])\
+                    if ADAPTIVE_TIMEOUT else None
+#Only runs with the same flags are comparable. The history is loaded once here,
+#instead of by each run (see >>run_vpr.py --adaptive_timeout<<).
+
+watcher = log_watcher.LogWatcher(args.log_dir) if CANCEL_FAILED else None
+
+##########################################################################
+def cancel_failed(timeout):
+    """Waits for new logs and returns the patterns matching the jobs
+    of the channel compositions that failed.
+
+    Parameters
+    ----------
+    timeout : float
+        Maximum number of seconds to wait.
+
+    Returns
+    -------
+    List[str]
+        Architecture name prefixes (e.g., magic_T4_N8_W15_).
+    """
+
+    failed = watcher.get_failures(timeout)
+
+    return sorted(set(['_'.join(arc.split('_')[:4]) + '_' for arc in (failed or [])]))
+##########################################################################
+
+predicted = {}
+#job -> predicted runtime
+cmd_jobs = {}
+#command -> job
+alternate_seeds = {}
+#(architecture, circuit) -> reserve seeds already used by backups
+predicted_mem = {}
+#job -> predicted peak memory in kB
+rr_elements = {}
+#architecture -> number of RR-graph nodes and edges
+
+##########################################################################
+def get_rr_elements(arc):
+    """Returns the number of RR-graph nodes and edges of the architecture, from its sidecar.
+
+    Parameters
+    ----------
+    arc : str
+        Architecture file name.
+
+    Returns
+    -------
+    int
+        Number of nodes and edges or None if the sidecar does not hold them.
+    """
+
+    if not arc in rr_elements:
+        meta = arc_meta.load(arc)
+        try:
+            rr_elements[arc] = meta["rr_graph"]["nodes"] + meta["rr_graph"]["edges"]
+        except:
+            rr_elements[arc] = None
+
+    return rr_elements[arc]
+##########################################################################
+
+##########################################################################
+def estimate_memory(cmd):
+    """Returns the predicted peak memory of a command (see >>parallelize.Parallel.admit<<).
+
+    Parameters
+    ----------
+    cmd : str
+        Command.
+
+    Returns
+    -------
+    float
+        Peak memory in kB.
+    """
+
+    return predicted_mem.get(cmd_jobs.get(cmd, None), 0)
+##########################################################################
+
+##########################################################################
+def find_stragglers(elapsed, idle):
+    """Selects the stragglers to back up, most overdue first (see >>parallelize.Parallel.speculate<<).
+
+    Parameters
+    ----------
+    elapsed : Dict[str, float]
+        Elapsed seconds of the running commands without a backup.
+    idle : int
+        Number of idle cores.
+
+    Returns
+    -------
+    List[Tuple[str, str, str]]
+        Commands, their backups, and the logs marking their completion.
+    """
+
+    overdue = []
+    for cmd in elapsed:
+        job = cmd_jobs.get(cmd, None)
+        if job is None or elapsed[cmd] < max(MIN_STRAGGLER_TIME, STRAGGLER_FACTOR * predicted[job]):
+            continue
+        overdue.append((elapsed[cmd] / predicted[job], cmd, job))
+
+    backups = []
+    for ratio, cmd, job in sorted(overdue, reverse = True)[:idle]:
+        backup = cmd + " --backup 1"
+        if SPECULATE == "seed":
+            arc, circ, seed = job
+            used = alternate_seeds.setdefault((arc, circ), set())
+            reserve = [s for s in reserve_seeds if not s in SEEDS and not s in used]
+            if reserve:
+                #Without unused reserve seeds, the same seed is rerun.
+                used.add(reserve[0])
+                backup += " --vpr_seed %d" % reserve[0]
+        print("Straggler at %.1fx the predicted runtime: %s" % (ratio, get_log_filename(job)))
+        cmd_jobs[backup] = job
+        backups.append((cmd, backup, get_log_filename(job)))
+
+    return backups
+##########################################################################
+
+##########################################################################
+def get_cmd(job):
+    """Returns the command of a job, with its timeout.
+
+    Parameters
+    ----------
+    job : Tuple[str, str, int]
+        Architecture, circuit, and seed.
+
+    Returns
+    -------
+    str
+        Command.
+    """
+
+    timeout = TIMEOUT
+    if timeout_predictor is not None:
+        adaptive_timeout = timeout_predictor.get_timeout(runtime_history.get_job_key(job[0], job[1]),\
+                                                         TIMEOUT_QUANTILE, TIMEOUT_SLACK)
+        if adaptive_timeout is not None:
+            timeout = max(MIN_TIMEOUT, int(math.ceil(adaptive_timeout)))
+
+    return call % job + ((" --timeout %d" % timeout) if timeout is not None else '')
+##########################################################################
+
+##########################################################################
+def run_jobs(job_list):
+    """Runs the jobs, longest-expected-first, and reports the predicted
+    and the achieved makespan.
+
+    Parameters
+    ----------
+    job_list : List[Tuple[str, str, int]]
+        Jobs to run.
+
+    Returns
+    -------
+    None
+    """
+
+    pending = [job for job in job_list if not os.path.exists(get_log_filename(job))]
+    #Jobs with an existing log return immediately.
+    predicted.update({job : predictor.predict(runtime_history.get_job_key(job[0], job[1])) for job in pending})
+    cmds = {job : get_cmd(job) for job in pending}
+    cmd_jobs.update({cmds[job] : job for job in pending})
+    predicted_mem.update({job : mem_predictor.predict(runtime_history.get_job_key(job[0], job[1]),\
+                                                      get_rr_elements(job[0])) for job in pending})
+    pending.sort(key = lambda job : (-predicted[job], job))
+    predicted_makespan = runtime_history.simulate_makespan([predicted[job] for job in pending], max_cpu)
+
+    start = time.time()
+    if args.queue is not None:
+        runner = WorkQueue(args.queue, sleep_interval, cancel_failed if CANCEL_FAILED else None, local_workers = QUEUE_WORKERS)
+    else:
+        speculator = find_stragglers if SPECULATE is not None and predictor.per_tile else None
+        #Without any history, the predictions only give the relative order of the jobs.
+        if MEM_BUDGET is not None and pending:
+            print("Memory budget: %.1f GB, largest predicted peak: %.1f GB"\
+                  % (MEM_BUDGET / 1e6, max([predicted_mem[job] for job in pending]) / 1e6))
+        runner = Parallel(max_cpu, sleep_interval, cancel_failed if CANCEL_FAILED else None, speculator,\
+                          MEM_BUDGET, estimate_memory if MEM_BUDGET is not None else None,\
+                          campaign_status.get_pool_filename("vpr"), {"stage" : "vpr", "cached" : len(job_list) - len(pending)})
+    runner.init_cmd_pool([cmds[job] for job in pending])
+    runner.run()
+    achieved_makespan = time.time() - start
+
+    report = "%s %s jobs: %d predicted makespan: %.0f s achieved makespan: %.0f s backups: %d"\
+           % (time.strftime("%Y-%m-%d %H:%M:%S"), args.log_dir, len(pending), predicted_makespan, achieved_makespan,\
+              runner.backups)
+    print(report)
+    with open(runtime_history.makespan_filename, "a") as outf:
+        outf.write(report + "\n")
+##########################################################################
 
-calls = list(calls)
+if PLAN:
+    plan = planner.Planner([args.arc] if arc_manifest is not None else None)
+    plan.add_vpr("VPR", list(jobs) + [(args.arc + name + ".xml", "benchmarks/%s.blif" % circ, seed)\
+                                      for name, circ in rebuilt for seed in SEEDS], args.log_dir)
+    if rebuilt:
+        print("Rebuilding %d architectures is not priced." % len(set([r[0] for r in rebuilt])))
+    plan.report(args.log_dir)
+    exit(0)
 
-runner = Parallel(max_cpu, sleep_interval)
-runner.init_cmd_pool(calls)
-runner.run()
+if ADAPTIVE_SEEDS and len(SEEDS) > 2:
+    run_jobs([job for job in jobs if job[2] in SEEDS[:2]])
+    run_jobs(get_extra_seed_jobs(jobs))
+else:
+    run_jobs(list(jobs))
@@ -1,9 +1,227 @@
+"""Generates and ranks the candidate channel compositions (magic formulas).
+
+Parameters
+----------
+successive_halving : Optional[bool], default = False
+    Instead of running all circuits and seeds on every architecture,
+    evaluates the candidates in rungs of increasing fidelity, promoting
+    only the best fraction of them to the next rung.
+eta : Optional[int], default = 3
+    Reduction factor of successive halving. Only 1 / eta of the architectures
+    survive each rung, while the number of circuits grows by the same factor.
+min_circs : Optional[int], default = 3
+    Number of (smallest) circuits used in the first rung.
+top_k : Optional[int], default = 3
+    Minimum number of architectures that must reach the final rung.
+reference : Optional[str], default = None
+    Template (%s for the technology) of an exhaustive sorting log
+    against which the successive-halving ranking is compared.
+surrogate : Optional[bool], default = False
+    Orders the VPR evaluation of architectures by the predictions of a
+    surrogate model (see >>surrogate.py<<), trained on the results obtained
+    so far, and stops once the budget is exhausted.
+batch : Optional[int], default = 24
+    Number of architectures evaluated between two surrogate updates.
+budget : Optional[float], default = 0.3
+    Fraction of all architectures that the surrogate-ordered search may evaluate.
+adaptive_seeds : Optional[bool], default = False
+    Runs the third seed only where the first two disagree or the architecture is close
+    to the promotion cutoff (see >>run_benchmarks.py<<) and ranks the architectures
+    on the available seeds. The cutoff is the fraction of the architectures promoted
+    to the next rung with successive halving, or the >>top_k<< otherwise.
+seed_tol : Optional[float], default = 0.02
+    Relative tolerance between the results of the first two seeds (see >>run_benchmarks.py<<).
+cutoff_margin : Optional[float], default = 0.02
+    Relative margin around the delay at the promotion cutoff (see >>run_benchmarks.py<<).
+adaptive_timeout : Optional[bool], default = False
+    Derives the VPR timeouts from the runtime history instead of using a fixed one.
+    Timed-out runs are then not treated as failures by >>clean_failed.py<<.
+early_abort : Optional[bool], default = False
+    Kills the VPR runs whose routing is predicted not to converge (see >>run_vpr.py<<).
+pack_cache : Optional[bool], default = False
+    Packs each circuit only once and reuses the netlist for all channel compositions
+    and seeds (see >>pack_cache.py<<). The netlists are stored in >>pack_cache/<<.
+rr_cache : Optional[bool], default = False
+    Decompresses each RR-graph only once per host, into >>rr_cache.default_dir<<
+    (see >>rr_cache.py<<), instead of once per run.
+result_cache : Optional[bool], default = False
+    Reuses the results of runs with identical inputs (see >>result_cache.py<<),
+    e.g., of architectures regenerated with the same content.
+    The results are stored in >>result_cache/<<.
+restart : Optional[bool], default = False
+    Discards the checkpoint of a previous campaign and starts a new one.
+plan : Optional[bool], default = False
+    Prints the estimated cost of the remaining campaign (see >>planner.py<<) and exits
+    without running it. The VPR estimate is an upper bound, as it assumes that all
+    architectures survive the filtering and that all seeds are run.
+status_port : Optional[int], default = None
+    Serves the live status of the campaign on http://127.0.0.1:<status_port>/,
+    and as JSON on /status.json (see >>campaign_status.py<<).
+
+Returns
+-------
+None
+
+Notes
+-----
+The completed stages of every technology (channel enumeration, architecture generation,
+filtering, VPR runs, and sorting), as well as the completed successive-halving rungs
+and surrogate batches, are checkpointed in run_magic.checkpoint.json (see >>checkpoint.py<<).
+If the script is interrupted, calling it again resumes at the interrupted stage,
+after killing the processes it left behind and removing their partial files.
+Generated architectures and finished VPR runs are reused.
+"""
+
 import os
+import time
+import math
+import random
+import argparse
+import tempfile
+import glob
 import sys
 sys.path.insert(0,'..')
+sys.path.insert(0,'../..')
+
+import rr_cache
+import ranking
+import checkpoint
+import manifest
+import planner
+import campaign_status
 
 from conf import *
 
+parser = argparse.ArgumentParser()
+parser.add_argument("--successive_halving")
+parser.add_argument("--eta")
+parser.add_argument("--min_circs")
+parser.add_argument("--top_k")
+parser.add_argument("--reference")
+parser.add_argument("--surrogate")
+parser.add_argument("--batch")
+parser.add_argument("--budget")
+parser.add_argument("--adaptive_seeds")
+parser.add_argument("--seed_tol")
+parser.add_argument("--cutoff_margin")
+parser.add_argument("--adaptive_timeout")
+parser.add_argument("--early_abort")
+parser.add_argument("--pack_cache")
+parser.add_argument("--rr_cache")
+parser.add_argument("--result_cache")
+parser.add_argument("--restart")
+parser.add_argument("--plan")
+parser.add_argument("--status_port")
+args = parser.parse_args()
+
+SUCCESSIVE_HALVING = False
+try:
+    SUCCESSIVE_HALVING = int(args.successive_halving)
+except:
+    pass
+
+ETA = 3
+try:
+    ETA = int(args.eta)
+except:
+    pass
+
+MIN_CIRCS = 3
+try:
+    MIN_CIRCS = int(args.min_circs)
+except:
+    pass
+
+TOP_K = 3
+try:
+    TOP_K = int(args.top_k)
+except:
+    pass
+
+SURROGATE = False
+try:
+    SURROGATE = int(args.surrogate)
+except:
+    pass
+
+BATCH = 24
+try:
+    BATCH = int(args.batch)
+except:
+    pass
+
+BUDGET = 0.3
+try:
+    BUDGET = float(args.budget)
+except:
+    pass
+
+ADAPTIVE_SEEDS = False
+try:
+    ADAPTIVE_SEEDS = int(args.adaptive_seeds)
+except:
+    pass
+
+SEED_TOL = 0.02
+try:
+    SEED_TOL = float(args.seed_tol)
+except:
+    pass
+
+CUTOFF_MARGIN = 0.02
+try:
+    CUTOFF_MARGIN = float(args.cutoff_margin)
+except:
+    pass
+
+ADAPTIVE_TIMEOUT = False
+try:
+    ADAPTIVE_TIMEOUT = int(args.adaptive_timeout)
+except:
+    pass
+
+EARLY_ABORT = False
+try:
+    EARLY_ABORT = int(args.early_abort)
+except:
+    pass
+
+PACK_CACHE = False
+try:
+    PACK_CACHE = int(args.pack_cache)
+except:
+    pass
+
+RR_CACHE = False
+try:
+    RR_CACHE = int(args.rr_cache)
+except:
+    pass
+
+RESULT_CACHE = False
+try:
+    RESULT_CACHE = int(args.result_cache)
+except:
+    pass
+
+RESTART = False
+try:
+    RESTART = int(args.restart)
+except:
+    pass
+
+PLAN = False
+try:
+    PLAN = int(args.plan)
+except:
+    pass
+
+STATUS_PORT = None
+try:
+    STATUS_PORT = int(args.status_port)
+except:
+    pass
+
 #Cluster size on which to perform the magic formula search.
 N = 8
 K = 6
@@ -28,15 +246,375 @@ ENUM_CHANNELS = True
 if os.path.isdir(channel_dir):
     ENUM_CHANNELS = False
 
+state_file = "run_magic.checkpoint.json"
+if RESTART and not PLAN:
+    os.system("rm -f %s" % state_file)
+ckpt = checkpoint.Checkpoint(state_file if not (RESTART and PLAN) else None, {"enum_channels" : ENUM_CHANNELS},\
+                             read_only = PLAN)
+#Whether to enumerate is decided when the campaign starts, as an interrupted
+#enumeration leaves the channel directory behind.
+ENUM_CHANNELS = ckpt.state["enum_channels"]
+
+timeout = 180
+
+vpr_call = "python -u run_benchmarks.py --timeout %d --is_magic 1 --arc %s --circs \"%s\" --log_dir %s --cancel_failed 1"
+if ADAPTIVE_TIMEOUT:
+    vpr_call += " --adaptive_timeout 1"
+if EARLY_ABORT:
+    vpr_call += " --early_abort 1"
+if PACK_CACHE:
+    vpr_call += " --pack_cache %s/pack_cache" % os.getcwd()
+if RR_CACHE:
+    vpr_call += " --rr_cache %s" % rr_cache.default_dir
+if RESULT_CACHE:
+    vpr_call += " --result_cache %s/result_cache" % os.getcwd()
+
+##########################################################################
+def get_adaptive_flags(promoted, total):
+    """Returns the flags of >>run_benchmarks.py<< adding seeds adaptively,
+    with the promotion cutoff of the call.
+
+    Parameters
+    ----------
+    promoted : int
+        Number of architectures promoted after the call.
+    total : int
+        Number of architectures evaluated by the call.
+
+    Returns
+    -------
+    str
+        Flags. Empty if the seeds are not added adaptively.
+    """
+
+    if not ADAPTIVE_SEEDS:
+        return ''
+
+    return " --adaptive_seeds 1 --seed_tol %f --cutoff %f --cutoff_margin %f"\
+           % (SEED_TOL, min(1.0, promoted / float(max(1, total))), CUTOFF_MARGIN)
+##########################################################################
+
+##########################################################################
+def get_rungs(circs):
+    """Returns the successive-halving schedule. Each rung uses
+    ETA times more circuits than the previous one and one more seed.
+    Circuits are added in the order of increasing grid size, so that
+    the early rungs are as cheap as possible.
+
+    Parameters
+    ----------
+    circs : List[str]
+        All circuits used in the search.
+
+    Returns
+    -------
+    List[Tuple[List[str], List[int]]]
+        Circuits and seeds of each rung.
+    """
+
+    circs = sorted(circs, key = lambda c : (grid_sizes[N][c], c))
+
+    rungs = []
+    r = 0
+    while True:
+        circ_cnt = min(len(circs), MIN_CIRCS * ETA ** r)
+        seed_cnt = min(len(seeds), 1 + r)
+        rungs.append((circs[:circ_cnt], seeds[:seed_cnt]))
+        if circ_cnt == len(circs) and seed_cnt == len(seeds):
+            return rungs
+        r += 1
+##########################################################################
+
+##########################################################################
+def successive_halving(T, arc_dir, log_dir, sort_file):
+    """Runs the successive-halving search for a single technology.
+
+    Parameters
+    ----------
+    T : str
+        Technology node.
+    arc_dir : str
+        Architecture directory.
+    log_dir : str
+        Log directory.
+    sort_file : str
+        Name of the final sorting log.
+
+    Returns
+    -------
+    None
+    """
+
+    wires = sorted(set([int(f.split('_')[3][1:]) for f in os.listdir(arc_dir) if f.endswith("_padding.log")]))
+    total_wires = len(wires)
+
+    #Relative costs of runs are approximated by the grid area.
+    cost = lambda rung_circs, rung_seeds : len(rung_seeds) * sum([grid_sizes[N][c] ** 2 for c in rung_circs])
+
+    all_circs = circs.split()
+    rungs = get_rungs(all_circs)
+    spent = 0
+    runs = 0
+    for r, rung in enumerate(rungs):
+        rung_circs, rung_seeds = rung
+        step = "T%s_rung%d" % (T, r)
+        if ckpt.is_done(step):
+            wires, spent, runs = [ckpt.get_outcome(step)[k] for k in ("wires", "spent", "runs")]
+            continue
+        ckpt.begin(step)
+        print("Rung %d: %d architectures, %d circuits, %d seeds"\
+              % (r, len(wires), len(rung_circs), len(rung_seeds)))
+        rung_circs = ' '.join(rung_circs)
+        promoted = max(TOP_K, int(math.ceil(len(wires) / float(ETA)))) if r < len(rungs) - 1 else TOP_K
+        os.system((vpr_call + " --seeds \"%s\" --wires \"%s\"")\
+                  % (timeout, arc_dir, rung_circs, log_dir,\
+                     ' '.join([str(s) for s in rung_seeds]), ' '.join([str(w) for w in wires]))\
+                  + get_adaptive_flags(promoted, len(wires)))
+        #Only rungs with more than two seeds add seeds adaptively.
+        spent += len(wires) * cost(rung[0], rung_seeds)
+        runs += len(wires) * len(rung[0]) * len(rung_seeds)
+
+        rung_sort_file = sort_file if r == len(rungs) - 1 else sort_file.rsplit(".sort", 1)[0] + "_rung%d.sort" % r
+        rank = ranking.Ranking(N, T, rung[0], arc_dir, rung_seeds,\
+                               min_seeds = min(2, len(rung_seeds)) if ADAPTIVE_SEEDS else None)
+        #With adaptive seeds, the circuits whose first two seeds agree never get the others.
+        rank.update(log_dir)
+        rank.write(rung_sort_file, confidence = ADAPTIVE_SEEDS)
+        ranked = [ranking.get_wire(entry[0]) for entry in rank.top()]
+        if r < len(rungs) - 1:
+            wires = [w for w in ranked if w in wires][:promoted]
+        ckpt.end(step, {"wires" : wires, "spent" : spent, "runs" : runs})
+
+    exhaustive = total_wires * cost(all_circs, seeds)
+    print("VPR runs: %d (exhaustive: %d)" % (runs, total_wires * len(all_circs) * len(seeds)))
+    print("Estimated cost: %.1f%% of the exhaustive search" % (100.0 * spent / max(1, exhaustive)))
+
+    if args.reference is not None and os.path.exists(args.reference % T):
+        os.system("python ../processing_scripts/compare_rankings.py --ref %s --test %s --top_k %d"\
+                  % (args.reference % T, sort_file, TOP_K))
+##########################################################################
+
+##########################################################################
+def surrogate_search(T, arc_dir, log_dir, sort_file):
+    """Evaluates the architectures in the order suggested by the surrogate
+    model, updating it after each batch, until the budget is exhausted.
+
+    Parameters
+    ----------
+    T : str
+        Technology node.
+    arc_dir : str
+        Architecture directory.
+    log_dir : str
+        Log directory.
+    sort_file : str
+        Name of the final sorting log.
+
+    Returns
+    -------
+    None
+    """
+
+    import surrogate
+    sys.path.insert(0, "../processing_scripts/")
+    from compare_rankings import spearman
+
+    #Features must be extracted before running VPR, as >>clean_failed.py<<
+    #removes the failing architectures.
+    feature_dict = surrogate.extract_features(channel_dir, arc_dir, N, T)
+    wires = sorted(feature_dict)
+    model = surrogate.Surrogate(feature_dict)
+
+    budget = int(math.ceil(BUDGET * len(wires)))
+    order = list(wires)
+    random.Random(0).shuffle(order)
+    #The first batch is a random sample.
+
+    evaluated = []
+    results = {}
+    rank = ranking.Ranking(N, T, circs.split(), arc_dir)
+    slot_hours = 0.0
+    max_cpu = int(os.environ.get("VPR_CPU", 1))
+    b = 0
+    while ckpt.is_done("T%s_batch%d" % (T, b)):
+        #Replays the batches completed before the interruption.
+        outcome = ckpt.get_outcome("T%s_batch%d" % (T, b))
+        new_results = {int(w) : outcome["results"][w] for w in outcome["results"]}
+        evaluated += outcome["batch"]
+        slot_hours += outcome["slot_hours"]
+        results.update(new_results)
+        model.update(new_results)
+        order = model.order([w for w in wires if not w in evaluated])
+        b += 1
+
+    while len(evaluated) < budget and len(evaluated) < len(wires):
+        batch = [w for w in order if not w in evaluated][:min(BATCH, budget - len(evaluated))]
+        ckpt.begin("T%s_batch%d" % (T, b))
+        pred = model.predict(batch)
+
+        start = time.time()
+        os.system((vpr_call + " --wires \"%s\"") % (timeout, arc_dir, circs, log_dir, ' '.join([str(w) for w in batch])))
+        batch_hours = (time.time() - start) * max_cpu / 3600.0
+        slot_hours += batch_hours
+        evaluated += batch
+
+        rank.update(log_dir)
+        rank.write(sort_file)
+        sorted_tds = {ranking.get_wire(entry[0]) : entry[1] for entry in rank.top()}
+        new_results = {w : sorted_tds.get(w, None) for w in batch}
+
+        if results:
+            routed = [w for w in batch if new_results[w] is not None]
+            rho, n = spearman(sorted(routed, key = lambda w : pred[w][0]), sorted(routed, key = lambda w : new_results[w]))
+            correct = len([w for w in batch if (pred[w][1] >= 0.5) == (new_results[w] is not None)])
+            print("Surrogate: delay rank correlation %.3f over %d routed; routability accuracy %d/%d"\
+                  % (rho, n, correct, len(batch)))
+
+        results.update(new_results)
+        model.update(new_results)
+        order = model.order([w for w in wires if not w in evaluated])
+        ckpt.end("T%s_batch%d" % (T, b), {"batch" : batch, "results" : new_results, "slot_hours" : batch_hours})
+        b += 1
+
+    skipped = len(wires) - len(evaluated)
+    print("Evaluated %d/%d architectures in %.1f slot-hours" % (len(evaluated), len(wires), slot_hours))
+    print("Estimated CPU-hours saved: %.1f" % (skipped * slot_hours / max(1, len(evaluated))))
+##########################################################################
+
+##########################################################################
+def clean_in_flight(step):
+    """Kills the processes left behind by an interrupted stage and removes their partial files.
+
+    Parameters
+    ----------
+    step : str
+        Stage name (e.g., T4_generate).
+
+    Returns
+    -------
+    None
+    """
+
+    T = step.split('_')[0][1:]
+    print("Cleaning up after the interrupted stage %s." % step)
+    print("Killed %d processes of the stage." % ckpt.kill_in_flight())
+    #Only the processes spawned for the stage carry its lease token.
+    prefix = "magic_T%s_N%d_W" % (T, N)
+    for seed in seeds:
+        for run_dir in glob.glob("%s*_%d" % (prefix, seed)):
+            if not checkpoint.is_in_use(run_dir):
+                os.system("rm -rf %s" % run_dir)
+        #Run directories of the killed VPR runs. Those of live runs
+        #(e.g., of another campaign) are kept.
+    gen_dir = "../../generate_architecture/"
+    if checkpoint.is_in_use(gen_dir):
+        print("Another generation runs in %s; its files are kept." % gen_dir)
+        return
+    for f in manifest.Manifest(dir_template % (N, T)).get_unregistered(gen_dir, prefix):
+        os.system("rm -rf %s%s" % (gen_dir, f))
+    #Files of interrupted architecture generations, which are only moved
+    #into the architecture directory once complete.
+##########################################################################
+
+##########################################################################
+def plan_campaign():
+    """Prints the estimated cost of the technologies not completed yet.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    None
+    """
+
+    all_circs = circs.split()
+    grids = sorted(set([grid_sizes[N][c] for c in all_circs]))
+    plan = planner.Planner([dir_template % (N, T) for T in techs])
+    for T in techs:
+        if ckpt.is_done("T%s" % T):
+            continue
+        compositions = planner.list_compositions(channel_dir, T)
+        if not compositions:
+            tmp_dir = tempfile.mkdtemp() + '/'
+            os.system("python -u enum_channel_compositions.py --K %d --N %d --tech %s --dump_dir %s > /dev/null 2>&1"\
+                      % (K, N, T, tmp_dir))
+            compositions = planner.list_compositions(tmp_dir, T)
+            os.system("rm -rf %s" % tmp_dir)
+
+        arc_dir = dir_template % (N, T)
+        log_dir = arc_dir[:-1] + "_logs/"
+        if not ckpt.is_done("T%s_generate" % T):
+            plan.add_generation("T%s generation" % T, planner.get_pending_generation(arc_dir, T, N, compositions, grids))
+
+        wires = [c[0] for c in compositions]
+        get_jobs = lambda wires, pairs : [(arc_dir + manifest.arc_name % (T, N, w, grid_sizes[N][c], grid_sizes[N][c]) + ".xml",\
+                                           "benchmarks/%s.blif" % c, seed) for w in wires for c, seed in pairs]
+        if SUCCESSIVE_HALVING:
+            done = set()
+            for r, rung in enumerate(get_rungs(all_circs)):
+                pairs = set([(c, seed) for c in rung[0] for seed in rung[1]])
+                step = "T%s_rung%d" % (T, r)
+                if ckpt.is_done(step):
+                    wires = ckpt.get_outcome(step)["wires"]
+                else:
+                    plan.add_vpr("T%s rung %d" % (T, r), get_jobs(wires, pairs - done), log_dir)
+                    #Stand-ins for the surviving architectures.
+                    wires = wires[:max(TOP_K, int(math.ceil(len(wires) / float(ETA))))]
+                done |= pairs
+        elif SURROGATE:
+            evaluated = []
+            b = 0
+            while ckpt.is_done("T%s_batch%d" % (T, b)):
+                evaluated += ckpt.get_outcome("T%s_batch%d" % (T, b))["batch"]
+                b += 1
+            budget = int(math.ceil(BUDGET * len(wires)))
+            remaining = [w for w in wires if not w in evaluated][:max(0, budget - len(evaluated))]
+            plan.add_vpr("T%s VPR" % T, get_jobs(remaining, [(c, seed) for c in all_circs for seed in seeds]), log_dir)
+        elif not ckpt.is_done("T%s_vpr" % T):
+            plan.add_vpr("T%s VPR" % T, get_jobs(wires, [(c, seed) for c in all_circs for seed in seeds]), log_dir)
+
+    plan.report("run_magic.py")
+    print("The VPR estimate is an upper bound: filtered and unroutable architectures are counted.")
+##########################################################################
+
+if PLAN:
+    plan_campaign()
+    exit(0)
+
+if not ckpt.claim():
+    print("The campaign is still being run by process %d." % ckpt.state["owner"]["pid"])
+    exit(1)
+in_flight, alive = ckpt.get_in_flight()
+if in_flight is not None:
+    clean_in_flight(in_flight)
+
+if STATUS_PORT is not None:
+    collector = campaign_status.Collector("run_magic.py", state_file,\
+                                          [dir_template[:-1] % (N, T) + "_logs/" for T in techs],\
+                                          campaign_status.init_dir(),\
+                                          (os.getcwd() + "/result_cache") if RESULT_CACHE else None)
+    campaign_status.StatusServer(STATUS_PORT, collector).start()
+    print("Status: http://127.0.0.1:%d/" % STATUS_PORT)
+
 for T in techs:
-    if ENUM_CHANNELS:
+    if ckpt.is_done("T%s" % T):
+        continue
+
+    if ENUM_CHANNELS and not ckpt.is_done("T%s_enum" % T):
+        ckpt.begin("T%s_enum" % T)
         os.system("python -u enum_channel_compositions.py --K % d --N %d --tech %s --dump_dir %s"\
                  % (K, N, T, channel_dir))
+        ckpt.end("T%s_enum" % T)
 
     arc_dir = dir_template % (N, T)
     #Generate the necessary architecture files:
-    os.system("python -u generate_files_for_magic_formula.py --N %d --tech %s --circs \"%s\" --res_dir %s/"\
-             % (N, T, circs, arc_dir))
+    if not ckpt.is_done("T%s_generate" % T):
+        ckpt.begin("T%s_generate" % T)
+        os.system("python -u generate_files_for_magic_formula.py --N %d --tech %s --circs \"%s\" --res_dir %s/"\
+                 % (N, T, circs, arc_dir))
+        ckpt.end("T%s_generate" % T)
 
     #Removes those architectures that have no H1 or V1 wire equivalents in the channel
     #compositions. Without taps and at least with the given switch pattern, these are almost
@@ -57,14 +635,30 @@ for T in techs:
     #Run VPR:
     log_dir = arc_dir[:-1] + "_logs/"
     os.system("python clean_failed.py --log_dir %s --watch 1 &" % log_dir)
-    os.system("python -u run_benchmarks.py --timeout 180 --is_magic 1 --arc %s --circs \"%s\" --log_dir %s" % (arc_dir, circs, log_dir))
 
-    #Sort the architectures:
     wd = os.getcwd() + '/'
-    arc_dir = wd + arc_dir
-    log_dir = wd + log_dir
     sort_file = "%sall_circs_N8_T%s.sort" % (wd, T)
-    os.system("python ../processing_scripts/sort_magic.py --arc_dir %s --log_dir %s --out_file %s --N 8 --tech %s --sort_key delay\
-              --ignore_circs \"~ %s\"" % (arc_dir, log_dir, sort_file, T, circs))
+    if SUCCESSIVE_HALVING:
+        successive_halving(T, wd + arc_dir, wd + log_dir, sort_file)
+        ckpt.end("T%s" % T)
+        continue
+    if SURROGATE:
+        surrogate_search(T, wd + arc_dir, wd + log_dir, sort_file)
+        ckpt.end("T%s" % T)
+        continue
 
+    wires = set([f.split('_')[3] for f in os.listdir(arc_dir) if f.endswith("_padding.log")])
+    adaptive_flags = get_adaptive_flags(TOP_K, len(wires))
+    #The top architectures go on to the final experiments.
+    if not ckpt.is_done("T%s_vpr" % T):
+        ckpt.begin("T%s_vpr" % T)
+        os.system(vpr_call % (timeout, arc_dir, circs, log_dir) + adaptive_flags)
+        ckpt.end("T%s_vpr" % T)
 
+    #Sort the architectures:
+    arc_dir = wd + arc_dir
+    log_dir = wd + log_dir
+    rank = ranking.Ranking(N, T, circs.split(), arc_dir, min_seeds = 2 if ADAPTIVE_SEEDS else None)
+    rank.update(log_dir)
+    rank.write(sort_file, confidence = ADAPTIVE_SEEDS)
+    ckpt.end("T%s" % T)
@@ -1,5 +1,6 @@
 """Runs VPR on the specified circuit and architecture.
-Results are stored in a log file.
+Results are stored in a log file and, if >>log_dir<< is specified,
+in the results database of the log directory (see >>results_db.py<<).
 
 Parameters
 ----------
@@ -20,19 +21,79 @@ timeout : Optional[int], default = None
     Specifies a timeout for VPR in seconds.
 is_magic : Optional[bool], default = False
     Turns on the magic flags (turns off the final high-effort ones).
+adaptive_timeout : Optional[bool], default = False
+    Marks >>timeout<< as derived from the runtime history of the same circuit and cluster
+    size, which >>run_benchmarks.py<< computes once for all of its jobs.
+early_abort : Optional[bool], default = False
+    Follows the router progress in >>vpr_stdout.log<< and kills VPR once the
+    routing is predicted not to converge (see >>route_monitor.py<<).
+abort_min_iter : Optional[int], default = 10
+    Number of router iterations before the first prediction.
+abort_window : Optional[int], default = 5
+    Number of most recent router iterations used for the prediction.
+abort_slack : Optional[float], default = 1.5
+    Multiplier of the router iteration limit that the projected convergence may reach.
+abort_min_overused : Optional[int], default = 10
+    Number of overused nodes below which the run is never aborted.
+pack_cache : Optional[str], default = None
+    Directory of the packed-netlist cache (see >>pack_cache.py<<). If specified, the circuit
+    is packed only once per logic-block description and the run only places and routes it.
+pack_strict : Optional[bool], default = False
+    Distinguish the logic-block descriptions by their delays as well.
+rr_cache : Optional[str], default = None
+    Directory of the host-level cache of decompressed RR-graphs (see >>rr_cache.py<<).
+    If not specified, the RR-graph is decompressed into the run directory.
+rr_cache_quota : Optional[float], default = 16
+    Size of the RR-graph cache in GB, above which the unused entries are evicted.
+result_cache : Optional[str], default = None
+    Directory of the content-addressed result cache (see >>result_cache.py<<). If a run
+    with identical inputs, seed, flags, and VPR version was already routed, its
+    critical path delay is logged without running VPR.
+backup : Optional[bool], default = False
+    Runs as a backup copy of a straggling run (see >>run_benchmarks.py --speculate<<),
+    in a run directory of its own.
+vpr_seed : Optional[int], default = seed
+    Placement seed passed to VPR. The result is logged under >>seed<<, which lets a backup
+    run an alternate seed in place of the straggling one.
 
 Returns
 -------
 None
+
+Notes
+-----
+With --adaptive_timeout, a run killed by the timeout is logged as "timeout", distinct from
+a routing failure ("failed"). A fixed timeout is treated as a failure, as it always was.
+A run killed by the early abort is logged as "predicted_fail". The router iterations of
+every run are recorded in >>route_monitor.trace_filename<<, together with the abort iteration.
+The peak resident set size of VPR is recorded in the results database and the runtime history,
+together with the RR-graph size, to refine the memory estimates of >>run_benchmarks.py<<.
+A run receiving SIGTERM (e.g., cancelled by >>run_benchmarks.py --cancel_failed 1<<) kills VPR
+and exits without writing a log. So does a run whose log was written by another copy
+of it (see >>backup<<) in the meantime: only the copy that finishes first is recorded.
 """
 
 import os
+import time
+import signal
+import resource
+import subprocess
 import argparse
 import sys
 sys.path.insert(0,'..')
 sys.path.insert(0,'../..')
 
 import setenv
+import runtime_history
+import route_monitor
+import pack_cache
+import rr_cache
+import arc_meta
+import results_db
+import result_cache
+import rr_store
+import codec
+import storage
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--arc")
@@ -43,23 +104,51 @@ parser.add_argument("--log_dir")
 parser.add_argument("--force")
 parser.add_argument("--timeout")
 parser.add_argument("--is_magic")
+parser.add_argument("--adaptive_timeout")
+parser.add_argument("--early_abort")
+parser.add_argument("--abort_min_iter")
+parser.add_argument("--abort_window")
+parser.add_argument("--abort_slack")
+parser.add_argument("--abort_min_overused")
+parser.add_argument("--pack_cache")
+parser.add_argument("--pack_strict")
+parser.add_argument("--rr_cache")
+parser.add_argument("--rr_cache_quota")
+parser.add_argument("--result_cache")
+parser.add_argument("--backup")
+parser.add_argument("--vpr_seed")
 args = parser.parse_args()
 
 arc_file = os.path.abspath(args.arc)
-rr_archive = arc_file.rsplit(".xml", 1)[0] + "_rr.xml.lz4"
+rr_archive = codec.get_archive(arc_file.rsplit(".xml", 1)[0] + "_rr.xml")
 circ_file = os.path.abspath(args.circ)
 seed = int(args.seed)
 
+VPR_SEED = seed
+try:
+    VPR_SEED = int(args.vpr_seed)
+except:
+    pass
+
+BACKUP = False
+try:
+    BACKUP = int(args.backup)
+except:
+    pass
+
 resdir = "%s_%s_%d" % (os.path.basename(arc_file).rsplit(".xml", 1)[0],\
                        os.path.basename(circ_file).rsplit(".blif", 1)[0],\
                        seed)
+log_resdir = resdir
+if BACKUP:
+    resdir += "_backup"
 log_dir = None
 try:
     log_dir = args.log_dir + '/'
 except:
     pass
 
-log_filename = (log_dir if log_dir is not None else '') + resdir + ".log"
+log_filename = (log_dir if log_dir is not None else '') + log_resdir + ".log"
 FORCE = False
 try:
     FORCE = args.force
@@ -76,28 +165,177 @@ try:
 except:
     pass
 
+KEEP = False
+try:
+    KEEP = int(args.keep)
+except:
+    pass
+
+PACK_CACHE = None
+try:
+    PACK_CACHE = os.path.abspath(args.pack_cache)
+except:
+    pass
+
+PACK_STRICT = False
+try:
+    PACK_STRICT = int(args.pack_strict)
+except:
+    pass
+
+RR_CACHE = None
+try:
+    RR_CACHE = os.path.abspath(args.rr_cache)
+except:
+    pass
+
+RR_CACHE_QUOTA = 16e9
+try:
+    RR_CACHE_QUOTA = 1e9 * float(args.rr_cache_quota)
+except:
+    pass
+
+##########################################################################
+def get_vpr_flags(chan_w, rr_file):
+    """Returns the VPR flags of the run.
+
+    Parameters
+    ----------
+    chan_w : int
+        Channel width.
+    rr_file : str
+        RR-graph file name.
+
+    Returns
+    -------
+    List[str]
+        Flags.
+    """
+
+    #NOTE: Some increase in horizontal wire congestion was observed for the
+    #smaller cluster sizes with normal VPR's length-based base cost scaling,
+    #likely due to the logically scaled vertical wires appearing much longer
+    #than for N=8. Also, in some cases, mismatch between the placed and routed
+    #delay was somewhat larger for smaller clusters, due to the delays being
+    #sampled at the I/O periphery, which has different connectivity than the
+    #the rest of the chip. In principle, changing the --place_delay_model_reducer
+    #could help in mitigating that, but in the end, after little experimentation,
+    #it was concluded that the most roubst results come from the default settings.
+    #In case of need, this may be revisited.
+    #
+    #Finally, the routability predictor was found to produce false positives 
+    #even if the circuit was routable on a particular architecture with prediction
+    #switched off. Hence, the predictor was kept during the search for magic formulas,
+    #as this is a process that requires routing a lot of different architectures, many
+    #of which are pathological, but it was turned off in the final experiments.
+    #Comment and uncomment the switches as needed.
+    base_vpr_flags = ["--seed %d" % VPR_SEED,\
+                      "--route_chan_width %s" % chan_w,\
+                      "--read_rr_graph %s" % rr_file,\
+                      "--router_lookahead map",\
+                      #"--place_delay_model_reducer arithmean",\
+                      #"--base_cost_type delay_normalized_frequency",\
+                     ]
+    final_vpr_flags = ["--routing_failure_predictor off",\
+                       "--router_max_convergence_count 5",\
+                       "--max_router_iterations 100",\
+                      ]
+
+    return base_vpr_flags + (final_vpr_flags if not IS_MAGIC else [])
+##########################################################################
+
+RESULT_CACHE = None
+try:
+    RESULT_CACHE = os.path.abspath(args.result_cache)
+except:
+    pass
+
+result_key = None
+if RESULT_CACHE is not None:
+    #The channel width and the RR-graph file are determined by the RR-graph content.
+    key_flags = get_vpr_flags("<rr_graph>", "<rr_graph>")
+    if PACK_CACHE is not None:
+        key_flags.append("<packed %s>" % ("strict" if PACK_STRICT else "loose"))
+    result_key = result_cache.get_key(arc_file, rr_store.get_source(rr_archive), circ_file, VPR_SEED, key_flags,\
+                                      result_cache.get_vpr_version(os.environ["VPR"]))
+    cached = result_cache.lookup(RESULT_CACHE, result_key)
+    if cached is not None:
+        print("Result found in the cache (run %s)." % cached["run"])
+        with open(log_filename, "w") as outf:
+            outf.write(str(cached["td"]))
+        if log_dir is not None:
+            results_db.record(log_dir, arc_file, circ_file, seed, "success", cached["td"], 0.0)
+        event = runtime_history.get_job_key(arc_file, circ_file)
+        event.update({"seed" : seed, "log_dir" : os.path.abspath(log_dir if log_dir is not None else '.'),\
+                      "event" : "hit", "runtime" : cached["runtime"], "time" : time.time()})
+        result_cache.record_event(RESULT_CACHE, event)
+        exit(0)
+
 wd = os.getcwd()
+proc = None
+
+##########################################################################
+def cancel(signum, frame):
+    """Kills VPR, if started, releases the cached RR-graph, and removes the run directory
+    when the run is cancelled (see >>parallelize.Parallel.cancel<<). No log is written.
+
+    Parameters
+    ----------
+    signum : int
+        Signal number.
+    frame : frame
+        Interrupted stack frame.
+
+    Returns
+    -------
+    None
+    """
+
+    if proc is not None:
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+        except OSError:
+            pass
+    if RR_CACHE is not None:
+        rr_cache.release(RR_CACHE, rr_archive)
+    os.chdir(wd)
+    if not KEEP:
+        os.system("rm -rf %s" % resdir)
+    os._exit(128 + signum)
+##########################################################################
+
+signal.signal(signal.SIGTERM, cancel)
+#Installed before anything is acquired, so that a cancelled run never leaks a reference
+#to the RR-graph cache (releasing one that was not acquired is harmless) or its run directory.
+
 os.system("mkdir %s" % resdir)
 os.chdir(resdir)
 
-os.system("cp %s ./" % arc_file)
-os.system("cp %s ./" % rr_archive)
-os.system("cp %s ./" % circ_file)
+meta = arc_meta.load(arc_file)
+
+#The inputs are only read, so they are linked instead of copied.
+rr_cache.stage(arc_file, os.path.basename(arc_file))
+rr_cache.stage(circ_file, os.path.basename(circ_file))
 
 arc_file = os.path.basename(arc_file)
-rr_archive = os.path.basename(rr_archive)
 circ_file = os.path.basename(circ_file)
-rr_file = rr_archive.rsplit(".lz4", 1)[0]
+rr_file = codec.strip_suffix(os.path.basename(rr_archive))
 
-os.system("lz4 -d %s %s" % (rr_archive, rr_file))
-with open(rr_file, "r") as inf:
-    lines = inf.readlines()
-for line in lines:
-    if "chan_width_max" in line:
-        words = line.split()
-        for w in words:
-            if "chan_width_max" in w:
-                chan_w = int(w.split('"')[1])
+storage.touch(rr_store.get_source(rr_archive))
+#Marks the last use of the RR-graph for eviction (see >>storage.py<<).
+
+rr_hit = None
+if RR_CACHE is not None:
+    chan_w, rr_hit = rr_cache.acquire(RR_CACHE, rr_archive, rr_file, RR_CACHE_QUOTA)
+else:
+    if rr_store.get_source(rr_archive) != rr_archive:
+        rr_store.materialize(rr_store.get_source(rr_archive), rr_file)
+    else:
+        codec.decompress(rr_archive, rr_file)
+    try:
+        chan_w = meta["rr_graph"]["chan_width_max"]
+    except:
+        chan_w = rr_cache.read_chan_width(rr_file)
 
 TIMEOUT = None
 try:
@@ -105,41 +343,98 @@ try:
 except:
     pass
 
+ADAPTIVE_TIMEOUT = False
+try:
+    ADAPTIVE_TIMEOUT = int(args.adaptive_timeout)
+except:
+    pass
+
+EARLY_ABORT = False
+try:
+    EARLY_ABORT = int(args.early_abort)
+except:
+    pass
+
+ABORT_MIN_ITER = 10
+try:
+    ABORT_MIN_ITER = int(args.abort_min_iter)
+except:
+    pass
+
+ABORT_WINDOW = 5
+try:
+    ABORT_WINDOW = int(args.abort_window)
+except:
+    pass
+
+ABORT_SLACK = 1.5
+try:
+    ABORT_SLACK = float(args.abort_slack)
+except:
+    pass
+
+ABORT_MIN_OVERUSED = 10
+try:
+    ABORT_MIN_OVERUSED = int(args.abort_min_overused)
+except:
+    pass
+
+job_key = runtime_history.get_job_key(arc_file, circ_file)
+if ADAPTIVE_TIMEOUT and TIMEOUT is not None:
+    print("Adaptive timeout: %d s" % TIMEOUT)
+
 precall = [("timeout %d " % TIMEOUT) if TIMEOUT is not None else '']
 
-#NOTE: Some increase in horizontal wire congestion was observed for the
-#smaller cluster sizes with normal VPR's length-based base cost scaling,
-#likely due to the logically scaled vertical wires appearing much longer
-#than for N=8. Also, in some cases, mismatch between the placed and routed
-#delay was somewhat larger for smaller clusters, due to the delays being
-#sampled at the I/O periphery, which has different connectivity than the
-#the rest of the chip. In principle, changing the --place_delay_model_reducer
-#could help in mitigating that, but in the end, after little experimentation,
-#it was concluded that the most roubst results come from the default settings.
-#In case of need, this may be revisited.
-#
-#Finally, the routability predictor was found to produce false positives 
-#even if the circuit was routable on a particular architecture with prediction
-#switched off. Hence, the predictor was kept during the search for magic formulas,
-#as this is a process that requires routing a lot of different architectures, many
-#of which are pathological, but it was turned off in the final experiments.
-#Comment and uncomment the switches as needed.
-base_vpr_flags = ["--seed %d" % seed,\
-                  "--route_chan_width %d" % chan_w,\
-                  "--read_rr_graph %s" % rr_file,\
-                  "--router_lookahead map",\
-                  #"--place_delay_model_reducer arithmean",\
-                  #"--base_cost_type delay_normalized_frequency",\
-                 ]
-final_vpr_flags = ["--routing_failure_predictor off",\
-                   "--router_max_convergence_count 5",\
-                   "--max_router_iterations 100",\
-                  ]
-vpr_flags = base_vpr_flags + (final_vpr_flags if not IS_MAGIC else [])
+vpr_flags = get_vpr_flags(chan_w, rr_file)
 
 vpr_args = [arc_file, circ_file]
 
-os.system(' '.join(precall + [os.environ["VPR"]] + vpr_args + vpr_flags))
+pack_hit = None
+if PACK_CACHE is not None:
+    pack_call = ' '.join(precall + [os.environ["VPR"]] + vpr_args + ["--pack"])
+    net_file, pack_hit = pack_cache.get_packed_netlist(PACK_CACHE, arc_file, circ_file, pack_call, PACK_STRICT)
+    if net_file is not None:
+        #The digest of the architecture differs from the one used for packing.
+        vpr_args += ["--net_file %s" % net_file, "--place", "--route", "--verify_file_digests off"]
+    if os.path.exists("vpr_stdout.log"):
+        os.rename("vpr_stdout.log", "vpr_pack_stdout.log")
+
+max_router_iterations = 50 if IS_MAGIC else 100
+#VPR's default and the limit set in >>final_vpr_flags<<, respectively.
+
+monitor = route_monitor.ConvergencePredictor(max_router_iterations, ABORT_MIN_ITER, ABORT_WINDOW,\
+                                             ABORT_SLACK, ABORT_MIN_OVERUSED)
+tail = route_monitor.RouteLogTail("vpr_stdout.log")
+abort_iter = None
+
+start = time.time()
+#A new session lets the shell, timeout, and VPR be killed together.
+proc = subprocess.Popen(' '.join(precall + [os.environ["VPR"]] + vpr_args + vpr_flags),\
+                        shell = True, preexec_fn = os.setsid)
+
+while EARLY_ABORT and proc.poll() is None:
+    time.sleep(2)
+    for it in tail.read():
+        monitor.add(*it)
+    if abort_iter is None and monitor.predict_fail():
+        abort_iter = monitor.trace[-1][0]
+        print("Routing predicted not to converge. Aborting at iteration %d." % abort_iter)
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+        except OSError:
+            pass
+exit_code = proc.wait()
+runtime = time.time() - start
+peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+#In kB. The largest of all waited-for descendants, i.e., VPR (packing included).
+signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+for it in tail.read():
+    monitor.add(*it)
+
+TIMED_OUT = ADAPTIVE_TIMEOUT and TIMEOUT is not None and exit_code == 124
+#124 is the exit status of timeout when the command times out.
+#Only the adaptive timeouts are told apart from the routing failures.
 
 with open("vpr_stdout.log", "r") as inf:
     lines = inf.readlines()
@@ -149,17 +444,61 @@ for line in lines:
         break
 
 os.chdir(wd)
-with open(log_filename, "w") as outf:
+try:
+    log_fd = os.open(log_filename, os.O_WRONLY | os.O_CREAT | (os.O_TRUNC if FORCE else os.O_EXCL), 0o644)
+except OSError:
+    print("Log written by another copy of the run.")
+    if RR_CACHE is not None:
+        rr_cache.release(RR_CACHE, rr_archive)
+    if not KEEP:
+        os.system("rm -rf %s" % resdir)
+    exit(0)
+with os.fdopen(log_fd, "w") as outf:
     try:
         outf.write(str(td))
+        outcome = "success"
     except:
-        outf.write("failed")
+        outcome = "predicted_fail" if abort_iter is not None else ("timeout" if TIMED_OUT else "failed")
+        outf.write(outcome)
+        td = None
 
-KEEP = False
+if log_dir is not None:
+    results_db.record(log_dir, arc_file, circ_file, seed, outcome, td, runtime, peak_rss)
+
+if RESULT_CACHE is not None:
+    if outcome == "success":
+        result_cache.store(RESULT_CACHE, result_key, {"td" : td, "runtime" : runtime, "run" : resdir})
+    event = dict(job_key)
+    event.update({"seed" : seed, "log_dir" : os.path.abspath(log_dir if log_dir is not None else '.'),\
+                  "event" : "miss", "outcome" : outcome, "runtime" : runtime, "time" : time.time()})
+    result_cache.record_event(RESULT_CACHE, event)
+
+history_entry = dict(job_key)
+history_entry.update({"seed" : seed, "runtime" : runtime, "outcome" : outcome, "is_magic" : IS_MAGIC,\
+                      "timeout" : TIMEOUT, "peak_rss" : peak_rss})
 try:
-    KEEP = int(args.keep)
+    history_entry.update({"rr_elements" : meta["rr_graph"]["nodes"] + meta["rr_graph"]["edges"]})
 except:
     pass
+if BACKUP:
+    history_entry.update({"backup" : 1})
+if VPR_SEED != seed:
+    history_entry.update({"vpr_seed" : VPR_SEED})
+if pack_hit is not None:
+    history_entry.update({"pack_cache" : "hit" if pack_hit else "miss"})
+if rr_hit is not None:
+    history_entry.update({"rr_cache" : "hit" if rr_hit else "miss"})
+runtime_history.record(history_entry)
+
+if monitor.trace:
+    trace_entry = dict(job_key)
+    trace_entry.update({"seed" : seed, "outcome" : outcome, "is_magic" : IS_MAGIC,\
+                        "max_iter" : max_router_iterations, "abort_iter" : abort_iter,\
+                        "trace" : [list(it) for it in monitor.trace]})
+    runtime_history.record(trace_entry, route_monitor.trace_filename)
+
+if RR_CACHE is not None:
+    rr_cache.release(RR_CACHE, rr_archive)
 
 if not KEEP:
     os.system("rm -rf %s" % resdir)
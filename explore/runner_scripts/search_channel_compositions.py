@@ -0,0 +1,338 @@
+"""Searches for good channel compositions by simulated annealing (or hill climbing)
+instead of generating and routing all compositions listed by >>enum_channel_compositions.py<<.
+
+A move changes the track count of a single wire length by one step of the count
+ladder used in the enumeration (0, 1, 2, 4, ...). Only moves landing on a composition
+that satisfies the same feasibility and multiplexer-width constraints are considered,
+so that each visited composition keeps the identifier it has in the exhaustive enumeration.
+This lets the search reuse the architectures and VPR logs from any earlier runs.
+Architectures are generated and evaluated on demand. The search state is stored after each
+evaluation, so an interrupted search resumes where it stopped.
+
+Parameters
+----------
+K : int
+    LUT size.
+N : int
+    Cluster size.
+tech : float
+    Technology node (16, 7, 5, 4, 3.0, 3.1).
+    3.0 corresponds to F3a in the paper and 3.1 to F3b.
+circs : str
+    Space-separated list of circuits used for evaluation.
+state_file : Optional[str], default = search_N%d_T%s.state
+    File holding the search state.
+time_budget : Optional[float], default = inf
+    Wall-clock budget in hours, accumulated over all resumptions.
+cpu_budget : Optional[float], default = inf
+    Budget in VPR slot-hours (wall-clock time of evaluation times >>VPR_CPU<<).
+T0 : Optional[float], default = 0.02
+    Initial temperature, relative to the geomean delay. Zero gives hill climbing.
+cooling : Optional[float], default = 0.95
+    Temperature multiplier per step.
+start : Optional[int], default = None
+    Identifier of the starting composition. By default, the best cached result,
+    or a random composition if there are none.
+rng_seed : Optional[int], default = 0
+    Seed of the move generator.
+
+Returns
+-------
+None
+"""
+
+import os
+import time
+import math
+import json
+import random
+import argparse
+import sys
+sys.path.insert(0,'..')
+sys.path.insert(0,'../..')
+
+import ranking
+
+from conf import *
+from enum_channel_compositions import enum_channels, export_channel, parse_tech
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--K")
+parser.add_argument("--N")
+parser.add_argument("--tech")
+parser.add_argument("--circs")
+parser.add_argument("--state_file")
+parser.add_argument("--time_budget")
+parser.add_argument("--cpu_budget")
+parser.add_argument("--T0")
+parser.add_argument("--cooling")
+parser.add_argument("--start")
+parser.add_argument("--rng_seed")
+args = parser.parse_args()
+
+K = int(args.K)
+N = int(args.N)
+
+TIME_BUDGET = float("inf")
+try:
+    TIME_BUDGET = 3600 * float(args.time_budget)
+except:
+    pass
+
+CPU_BUDGET = float("inf")
+try:
+    CPU_BUDGET = float(args.cpu_budget)
+except:
+    pass
+
+T0 = 0.02
+try:
+    T0 = float(args.T0)
+except:
+    pass
+
+COOLING = 0.95
+try:
+    COOLING = float(args.cooling)
+except:
+    pass
+
+RNG_SEED = 0
+try:
+    RNG_SEED = int(args.rng_seed)
+except:
+    pass
+
+state_file = "search_N%d_T%s.state" % (N, args.tech)
+if args.state_file is not None:
+    state_file = args.state_file
+
+channel_dir = "all_channels/"
+wd = os.getcwd() + '/'
+arc_dir = wd + "all_circs_magic_N%d_T%s/" % (N, args.tech)
+log_dir = arc_dir[:-1] + "_logs/"
+sort_file = wd + "search_N%d_T%s.sort" % (N, args.tech)
+
+no_V1 = {2 : "V4 0", 4 : "V2 0", 8 : "V1 0", 16 : "V1 0"}
+no_H1 = {2 : "H1 0", 4 : "H1 0", 8 : "H1 0", 16 : "H1 0"}
+
+spice_call = "python -u generate_files_for_magic_formula.py --N %d --tech %s --circs \"%s\" --res_dir %s --wire %d"
+vpr_call = "python -u run_benchmarks.py --timeout 180 --is_magic 1 --arc %s --circs \"%s\" --log_dir %s --wires %d"
+rank = ranking.Ranking(N, args.tech, args.circs.split(), arc_dir)
+
+channels = enum_channels(K, N, parse_tech(args.tech))
+
+get_key = lambda c : tuple(sorted([(w, c[0][w]) for w in c[0] if w != "H1"] + list(c[1].items())))
+#H1 does not enter the key, as it is not a free variable: it is the padding of the rest of
+#the horizontal channel (see >>enum_channel_compositions.enum_h_channels<<), so a move on
+#another wire length lands on the composition with the matching H1.
+
+index = {get_key(c) : i for i, c in enumerate(channels)}
+if len(index) != len(channels):
+    print("Compositions differing only in H1 share a key.")
+    exit(1)
+
+ladders = {}
+for key in index:
+    for w, cnt in key:
+        ladders.setdefault(w, set()).add(cnt)
+ladders = {w : sorted(ladders[w]) for w in ladders}
+
+##########################################################################
+def get_neighbours(i):
+    """Returns all feasible compositions reachable by changing the track
+    count of a single wire length by one ladder step.
+
+    Parameters
+    ----------
+    i : int
+        Composition identifier.
+
+    Returns
+    -------
+    List[int]
+        Identifiers of the neighbours.
+    """
+
+    key = get_key(channels[i])
+    neighbours = []
+    for pos, entry in enumerate(key):
+        w, cnt = entry
+        ladder = ladders[w]
+        step = ladder.index(cnt)
+        for d in (-1, 1):
+            if step + d < 0 or step + d >= len(ladder):
+                continue
+            moved = list(key)
+            moved[pos] = (w, ladder[step + d])
+            moved = tuple(moved)
+            if moved in index:
+                neighbours.append(index[moved])
+
+    return neighbours
+##########################################################################
+
+##########################################################################
+def read_sorted():
+    """Reads the geomean delays of all fully evaluated compositions.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    Dict[int, float]
+        Geomean delay per composition identifier.
+    """
+
+    if not os.path.isdir(log_dir):
+        return {}
+
+    rank.update(log_dir)
+    rank.write(sort_file)
+
+    return {ranking.get_wire(entry[0]) : entry[1] for entry in rank.top()}
+##########################################################################
+
+##########################################################################
+def evaluate(i):
+    """Generates the architecture for the composition and routes all circuits on it.
+
+    Parameters
+    ----------
+    i : int
+        Composition identifier.
+
+    Returns
+    -------
+    float
+        Geomean delay or None if the architecture is unroutable.
+    """
+
+    wire_file = "%s/K%dN%dT%s_%d.wire" % (channel_dir, K, N, args.tech, i)
+    if not os.path.exists(wire_file):
+        os.system("mkdir -p %s" % channel_dir)
+        with open(wire_file, "w") as outf:
+            outf.write(export_channel(channels[i]))
+
+    os.system(spice_call % (N, args.tech, args.circs, arc_dir, i))
+
+    #Same filter as in >>run_magic.py<<:
+    for f in os.listdir(arc_dir):
+        if f.endswith("_padding.log") and int(f.split('_')[3][1:]) == i:
+            with open(arc_dir + f, "r") as inf:
+                txt = inf.read()
+            if no_V1[N] in txt or no_H1[N] in txt:
+                os.system("rm -rf %s/%s*" % (arc_dir, f.split("_padding.log")[0]))
+                return None
+
+    os.system(vpr_call % (arc_dir, args.circs, log_dir, i))
+
+    return read_sorted().get(i, None)
+##########################################################################
+
+##########################################################################
+def store_state(state):
+    """Atomically stores the search state.
+
+    Parameters
+    ----------
+    state : Dict
+        Search state.
+
+    Returns
+    -------
+    None
+    """
+
+    with open(state_file + ".tmp", "w") as outf:
+        json.dump(state, outf, indent = 1)
+    os.rename(state_file + ".tmp", state_file)
+##########################################################################
+
+state = {"step" : 0, "current" : None, "best" : None, "elapsed" : 0.0, "slot_hours" : 0.0, "cache" : {}}
+if os.path.exists(state_file):
+    with open(state_file, "r") as inf:
+        state = json.load(inf)
+    print("Resuming from step %d." % state["step"])
+
+cache = {int(i) : state["cache"][i] for i in state["cache"]}
+#JSON keys are strings.
+for i, td in read_sorted().items():
+    cache.update({i : td})
+
+score = lambda i : cache[i] if cache.get(i, None) is not None else float("inf")
+
+if state["current"] is None:
+    if args.start is not None:
+        state["current"] = int(args.start)
+    elif [i for i in cache if cache[i] is not None]:
+        state["current"] = min(cache, key = score)
+    else:
+        state["current"] = random.Random(RNG_SEED).randint(0, len(channels) - 1)
+
+max_cpu = int(os.environ.get("VPR_CPU", 1))
+start_time = time.time() - state["elapsed"]
+
+##########################################################################
+def cached_evaluate(i):
+    """Evaluates the composition unless its result is already cached,
+    and stores the search state.
+
+    Parameters
+    ----------
+    i : int
+        Composition identifier.
+
+    Returns
+    -------
+    None
+    """
+
+    if not i in cache:
+        eval_start = time.time()
+        cache.update({i : evaluate(i)})
+        state["slot_hours"] += (time.time() - eval_start) * max_cpu / 3600.0
+    if state["best"] is None or score(i) < score(state["best"]):
+        state["best"] = i
+
+    state["elapsed"] = time.time() - start_time
+    state["cache"] = {str(c) : cache[c] for c in cache}
+    store_state(state)
+##########################################################################
+
+cached_evaluate(state["current"])
+while True:
+    cur = state["current"]
+    print("Step %d: current W%d (%s), best W%d (%s), %.2f slot-hours"\
+          % (state["step"], cur, cache[cur], state["best"], cache[state["best"]], state["slot_hours"]))
+
+    if state["elapsed"] >= TIME_BUDGET or state["slot_hours"] >= CPU_BUDGET:
+        print("Budget exhausted.")
+        break
+
+    neighbours = get_neighbours(cur)
+    if not neighbours:
+        break
+    T = T0 * COOLING ** state["step"]
+    if T <= 1e-6 and not [nb for nb in neighbours if not nb in cache or score(nb) < score(cur)]:
+        print("Local optimum reached.")
+        break
+
+    rng = random.Random(RNG_SEED * 1000003 + state["step"])
+    #Seeding by the step makes the sequence of moves reproducible across resumptions.
+    nb = rng.choice(neighbours)
+    state["step"] += 1
+    cached_evaluate(nb)
+
+    if score(cur) == float("inf"):
+        state["current"] = nb
+        #Random walk until a routable composition is found.
+    elif score(nb) < float("inf"):
+        delta = (score(nb) - score(cur)) / score(cur)
+        if delta < 0 or (T > 1e-6 and rng.random() < math.exp(-delta / T)):
+            state["current"] = nb
+    store_state(state)
+
+print("Best composition: W%d, geomean delay %s" % (state["best"], cache[state["best"]]))
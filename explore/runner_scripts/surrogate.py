@@ -0,0 +1,354 @@
+"""Surrogate model predicting the results of >>sort_magic.py<< (geomean delay
+and routability) of a channel composition from cheap features, without running VPR.
+The features are the track counts per wire length, LEN-1 padding results, the multiplexer-size
+histogram, and the SPICE delays stored in the generated architecture, all read
+from the metadata sidecar of the architecture if it exists.
+
+The delay is predicted by ridge regression on the logarithm of the geomean delay
+and routability by L2-regularized logistic regression. Both models are refitted
+each time new results are added, so that they are trained incrementally on the
+results that have completed so far. Only NumPy is required.
+"""
+
+import os
+import math
+import numpy as np
+import sys
+sys.path.insert(0,'../..')
+
+import arc_meta
+
+get_val = lambda line, key : line.split("%s=\"" % key, 1)[1].split('"', 1)[0]
+
+mux_bins = [0, 8, 12, 16, 24, 32]
+#Bin edges of the multiplexer-size histogram.
+
+##########################################################################
+def read_wire_file(filename):
+    """Reads the track counts from a channel composition file.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the channel composition file.
+
+    Returns
+    -------
+    Dict[str, float]
+        Track count per wire type.
+    """
+
+    features = {}
+    with open(filename, "r") as inf:
+        lines = inf.readlines()
+    for line in lines:
+        words = line.split()
+        if len(words) == 3:
+            features.update({"wire_%s%s" % (words[0], words[1]) : float(words[2])})
+
+    return features
+##########################################################################
+
+##########################################################################
+def read_padding_log(filename):
+    """Reads the padding results, tile dimensions, and multiplexer sizes.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the padding log.
+
+    Returns
+    -------
+    Dict[str, float]
+        Features extracted from the log.
+    """
+
+    with open(filename, "r") as inf:
+        lines = inf.readlines()
+
+    features = {}
+    sizes = []
+    rd_muxes = False
+    for line in lines:
+        if line.startswith("Multiplexer sizes:"):
+            rd_muxes = True
+        elif rd_muxes and ':' in line:
+            size = int(line.split(':')[0])
+            sizes += [size] * len(line.split(':')[1].split())
+        elif line.startswith('H') or line.startswith('V'):
+            words = line.split()
+            if len(words) == 2:
+                features.update({"pad_%s" % words[0] : float(words[1])})
+        elif line.startswith("Active dimensions:"):
+            wa = int(line.split()[-4])
+            ha = int(line.split()[-2])
+        elif line.startswith("Metal dimensions:"):
+            wm = int(line.split()[-4])
+            hm = int(line.split()[-2])
+
+    features.update({"active_w" : wa, "active_h" : ha, "metal_w" : wm, "metal_h" : hm,\
+                     "area" : max(wa, wm) * max(ha, hm) / 1000000.0})
+
+    if sizes:
+        features.update({"mux_mean" : np.mean(sizes), "mux_max" : max(sizes), "mux_cnt" : len(sizes)})
+        hist = np.histogram(sizes, bins = mux_bins + [float("inf")])[0]
+        for i, h in enumerate(hist):
+            features.update({"mux_hist_%d" % mux_bins[i] : float(h) / len(sizes)})
+
+    return features
+##########################################################################
+
+##########################################################################
+def read_arc_delays(filename):
+    """Reads the switch delays and the LUT access and feedback delays
+    from an architecture file.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the architecture file.
+
+    Returns
+    -------
+    Dict[str, float]
+        Delays in picoseconds.
+    """
+
+    with open(filename, "r") as inf:
+        lines = inf.readlines()
+
+    features = {}
+    for line in lines:
+        if "<switch " in line and "Tdel" in line:
+            features.update({"td_%s" % get_val(line, "name") : 1e12 * float(get_val(line, "Tdel"))})
+        elif "delay_constant" in line:
+            if "out_port=\"clb.O\"" in line:
+                name = "td_lut_access"
+            elif "in_port=\"ble" in line and "out_port=\"ble" in line:
+                name = "td_feedback"
+            else:
+                continue
+            features.update({name : 1e12 * float(get_val(line, "max"))})
+
+    return features
+##########################################################################
+
+##########################################################################
+def read_sidecar(meta):
+    """Extracts the features of >>read_padding_log<< and >>read_arc_delays<<
+    from the metadata sidecar of the architecture (see >>arc_meta.py<<).
+
+    Parameters
+    ----------
+    meta : Dict[str, various]
+        Metadata.
+
+    Returns
+    -------
+    Dict[str, float]
+        Features.
+    """
+
+    features = {}
+    for d in meta["composition"]:
+        for L in meta["composition"][d]:
+            features.update({"pad_%s%s" % (d, L) : float(meta["composition"][d][L])})
+
+    tile = meta["tile"]
+    features.update({k : tile[k] for k in ("active_w", "active_h", "metal_w", "metal_h")})
+    features.update({"area" : arc_meta.get_area(meta)})
+
+    sizes = []
+    for mux_type in meta["mux_sizes"]:
+        for size in meta["mux_sizes"][mux_type]:
+            sizes += [int(size)] * meta["mux_sizes"][mux_type][size]
+    if sizes:
+        features.update({"mux_mean" : np.mean(sizes), "mux_max" : max(sizes), "mux_cnt" : len(sizes)})
+        hist = np.histogram(sizes, bins = mux_bins + [float("inf")])[0]
+        for i, h in enumerate(hist):
+            features.update({"mux_hist_%d" % mux_bins[i] : float(h) / len(sizes)})
+
+    for name in meta["switch_delays"]:
+        features.update({"td_%s" % name : 1e12 * meta["switch_delays"][name]})
+    for ports in meta["block_delays"]:
+        in_port, out_port = ports.split(" -> ")
+        if out_port == "clb.O":
+            features.update({"td_lut_access" : 1e12 * meta["block_delays"][ports]})
+        elif in_port.startswith("ble") and out_port.startswith("ble"):
+            features.update({"td_feedback" : 1e12 * meta["block_delays"][ports]})
+
+    return features
+##########################################################################
+
+##########################################################################
+def extract_features(chan_dir, arc_dir, N, tech):
+    """Extracts the features of all architectures present in the directory.
+
+    Parameters
+    ----------
+    chan_dir : str
+        Directory holding the channel composition files.
+    arc_dir : str
+        Directory holding the architectures.
+    N : int
+        Cluster size.
+    tech : str
+        Technology node.
+
+    Returns
+    -------
+    Dict[int, Dict[str, float]]
+        Features of each architecture, indexed by the wire identifier.
+    """
+
+    logs = {}
+    for f in sorted(os.listdir(arc_dir)):
+        if f.endswith("_padding.log") and "_N%d_" % N in f:
+            wire = int(f.split('_')[3][1:])
+            if not wire in logs:
+                logs.update({wire : f})
+
+    feature_dict = {}
+    for wire in logs:
+        features = {}
+        try:
+            features.update(read_wire_file("%s/K6N%dT%s_%d.wire" % (chan_dir, N, tech, wire)))
+            meta = arc_meta.load("%s/%s" % (arc_dir, logs[wire]))
+            if meta is not None and "switch_delays" in meta:
+                features.update(read_sidecar(meta))
+            else:
+                features.update(read_padding_log("%s/%s" % (arc_dir, logs[wire])))
+                features.update(read_arc_delays("%s/%s" % (arc_dir, logs[wire].replace("_padding.log", ".xml"))))
+        except:
+            continue
+        feature_dict.update({wire : features})
+
+    return feature_dict
+##########################################################################
+
+##########################################################################
+class Surrogate(object):
+    """Ridge-regression delay and logistic-regression routability predictor.
+
+    Parameters
+    ----------
+    feature_dict : Dict[int, Dict[str, float]]
+        Features of all candidate architectures, as returned by >>extract_features<<.
+        They are used to fix the feature names and the standardization,
+        which does not require any VPR results.
+    l2 : Optional[float], default = 1.0
+        Regularization strength.
+    """
+
+    #------------------------------------------------------------------------#
+    def __init__(self, feature_dict, l2 = 1.0):
+        """Constructor of the Surrogate class.
+        """
+
+        self.names = sorted(set([k for wire in feature_dict for k in feature_dict[wire]]))
+        self.wires = sorted(feature_dict)
+        X = np.array([[feature_dict[w].get(k, 0.0) for k in self.names] for w in self.wires], dtype = float)
+        self.mean = X.mean(axis = 0)
+        self.std = X.std(axis = 0)
+        self.std[self.std == 0] = 1.0
+        self.X = {w : np.append((X[i] - self.mean) / self.std, 1.0) for i, w in enumerate(self.wires)}
+        self.l2 = l2
+        self.delays = {}
+        self.routable = {}
+        self.w_delay = np.zeros(len(self.names) + 1)
+        self.w_route = np.zeros(len(self.names) + 1)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def update(self, results):
+        """Adds new results and refits the models.
+
+        Parameters
+        ----------
+        results : Dict[int, float]
+            Geomean delay per evaluated wire identifier.
+            None marks an architecture that could not be routed.
+
+        Returns
+        -------
+        None
+        """
+
+        for wire in results:
+            if not wire in self.X:
+                continue
+            self.routable.update({wire : results[wire] is not None})
+            if results[wire] is not None:
+                self.delays.update({wire : math.log(results[wire])})
+
+        reg = self.l2 * np.eye(len(self.names) + 1)
+        reg[-1, -1] = 0
+
+        if self.delays:
+            X = np.array([self.X[w] for w in self.delays])
+            y = np.array([self.delays[w] for w in self.delays])
+            self.w_delay = np.linalg.solve(X.T.dot(X) + reg, X.T.dot(y))
+
+        #Newton iterations, warm-started from the previous solution:
+        X = np.array([self.X[w] for w in self.routable])
+        y = np.array([1.0 if self.routable[w] else 0.0 for w in self.routable])
+        for i in range(0, 20):
+            p = 1.0 / (1.0 + np.exp(-X.dot(self.w_route)))
+            grad = X.T.dot(p - y) + reg.dot(self.w_route)
+            hess = (X.T * (p * (1 - p))).dot(X) + reg + 1e-9 * np.eye(len(self.w_route))
+            step = np.linalg.solve(hess, grad)
+            self.w_route -= step
+            if np.abs(step).max() < 1e-6:
+                break
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def predict(self, wires):
+        """Predicts the geomean delay and the probability of routability.
+
+        Parameters
+        ----------
+        wires : List[int]
+            Wire identifiers.
+
+        Returns
+        -------
+        Dict[int, Tuple[float]]
+            Predicted delay and routability probability per wire.
+        """
+
+        pred = {}
+        for w in wires:
+            td = math.exp(self.X[w].dot(self.w_delay)) if self.delays else float("nan")
+            p = 1.0 / (1.0 + math.exp(-self.X[w].dot(self.w_route))) if self.routable else 0.5
+            pred.update({w : (td, p)})
+
+        return pred
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def order(self, wires, p_min = 0.5):
+        """Orders the wires for evaluation. Those predicted routable come first,
+        sorted by the predicted delay, followed by the rest, sorted by decreasing
+        routability probability.
+
+        Parameters
+        ----------
+        wires : List[int]
+            Wire identifiers.
+        p_min : Optional[float], default = 0.5
+            Routability probability above which the architecture is deemed routable.
+
+        Returns
+        -------
+        List[int]
+            Ordered wire identifiers.
+        """
+
+        pred = self.predict(wires)
+
+        return sorted(wires, key = lambda w : (pred[w][1] < p_min,\
+                                               pred[w][0] if pred[w][1] >= p_min else -pred[w][1], w))
+    #------------------------------------------------------------------------#
+##########################################################################
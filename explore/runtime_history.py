@@ -0,0 +1,495 @@
+"""Persistent history of VPR job runtimes and peak memory, used for predicting
+the runtime of new jobs (e.g., for scheduling the longest ones first) and their
+peak memory (e.g., for admitting only as many jobs as fit into the memory).
+
+Each finished job appends one JSON line to the history file. Lines are short
+and written with a single append, so concurrent writers on one host do not interleave.
+Appends from different hosts to a file on a network file system are not atomic,
+so the jobs run by the workers of a work queue (see >>work_queue.py<<) append to
+a journal of their host instead, <file>.<host>.jsonl, which is read together
+with the file (see >>get_filenames<<). The same holds for the other logs written
+through >>record<< (e.g., the routing traces and the result-cache events).
+"""
+
+import os
+import json
+import glob
+import socket
+
+history_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vpr_runtime.hist")
+#Default location of the history, shared by all campaigns.
+
+makespan_filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vpr_makespan.log")
+#Log of predicted and achieved makespans of the runner batches.
+
+journal_var = "WORK_QUEUE_WORKER"
+#Set for the jobs run by a queue worker (see >>work_queue.worker_var<<).
+
+host = socket.gethostname().split('.')[0]
+
+default_kb_per_element = 0.15
+#Peak kB per RR-graph node and edge, used until peaks are measured.
+default_kb_per_tile = 1024
+#Peak kB per grid tile, used for architectures without node and edge counts.
+
+##########################################################################
+def get_job_key(arc, circ):
+    """Extracts the attributes determining the runtime from the file names.
+
+    Parameters
+    ----------
+    arc : str
+        Architecture file name (e.g., magic_T4_N8_W15_W13_H13.xml).
+    circ : str
+        Circuit file name.
+
+    Returns
+    -------
+    Dict[str, various]
+        Circuit, cluster size, grid size, technology, and wire identifier.
+        Attributes that can not be parsed are None.
+    """
+
+    arc = os.path.basename(arc).rsplit(".xml", 1)[0]
+    key = {"circ" : os.path.basename(circ).rsplit(".blif", 1)[0],\
+           "N" : None, "grid" : None, "tech" : None, "wire" : None}
+
+    words = arc.split('_')
+    for w in words[1:4]:
+        try:
+            if w[0] == 'T' and key["tech"] is None:
+                key["tech"] = w[1:]
+            elif w[0] == 'N' and key["N"] is None:
+                key["N"] = int(w[1:])
+            elif w[0] == 'W' and key["wire"] is None:
+                key["wire"] = int(w[1:])
+        except:
+            pass
+    try:
+        key["grid"] = int(arc.rsplit('W', 1)[1].rsplit("_H", 1)[0])
+    except:
+        pass
+
+    return key
+##########################################################################
+
+##########################################################################
+def get_filenames(filename = history_filename):
+    """Returns the files holding the entries of the history, i.e., the file and
+    the journals of the hosts of queue workers.
+
+    Parameters
+    ----------
+    filename : Optional[str], default = history_filename
+        History file.
+
+    Returns
+    -------
+    List[str]
+        File names.
+    """
+
+    return [filename] + sorted(glob.glob(filename + ".*.jsonl"))
+##########################################################################
+
+##########################################################################
+def record(entry, filename = history_filename):
+    """Appends an entry to the history, or to the journal of this host if run
+    by a queue worker.
+
+    Parameters
+    ----------
+    entry : Dict[str, various]
+        Job key (see >>get_job_key<<), extended by the runtime [s],
+        outcome, and any other measurements.
+    filename : Optional[str], default = history_filename
+        History file.
+
+    Returns
+    -------
+    None
+    """
+
+    if os.environ.get(journal_var, None):
+        filename = "%s.%s.jsonl" % (filename, host)
+    line = json.dumps(entry, sort_keys = True) + "\n"
+    fd = os.open(filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode("utf-8"))
+    finally:
+        os.close(fd)
+##########################################################################
+
+##########################################################################
+def load(filename = history_filename):
+    """Loads the entire history, including the journals of the hosts.
+
+    Parameters
+    ----------
+    filename : Optional[str], default = history_filename
+        History file.
+
+    Returns
+    -------
+    List[Dict[str, various]]
+        All recorded entries.
+    """
+
+    entries = []
+    lines = []
+    for f in get_filenames(filename):
+        try:
+            with open(f, "r") as inf:
+                lines += inf.readlines()
+        except:
+            continue
+
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except:
+            #Partially written line of a killed job.
+            continue
+
+    return entries
+##########################################################################
+
+##########################################################################
+def median(values):
+    """Returns the median of the values.
+
+    Parameters
+    ----------
+    values : List[float]
+        Values.
+
+    Returns
+    -------
+    float
+        Median.
+    """
+
+    values = sorted(values)
+    if len(values) % 2:
+        return values[len(values) // 2]
+
+    return 0.5 * (values[len(values) // 2 - 1] + values[len(values) // 2])
+##########################################################################
+
+##########################################################################
+def quantile(values, q):
+    """Returns the q-quantile of the values, interpolating linearly.
+
+    Parameters
+    ----------
+    values : List[float]
+        Values.
+    q : float
+        Quantile in [0, 1].
+
+    Returns
+    -------
+    float
+        Quantile.
+    """
+
+    values = sorted(values)
+    pos = q * (len(values) - 1)
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+
+    return values[lo] + (pos - lo) * (values[hi] - values[lo])
+##########################################################################
+
+##########################################################################
+class RuntimePredictor(object):
+    """Predicts job runtimes from the history. The prediction is the median
+    runtime over the most specific group of past jobs that is not empty:
+    (circuit, N, grid, tech), (circuit, N, grid), (circuit, N), and (circuit).
+    Groups that do not match the grid size are scaled by the grid area.
+    If the circuit was never run, the runtime per grid tile averaged
+    over the entire history is used.
+
+    Parameters
+    ----------
+    entries : Optional[List[Dict[str, various]]], default = None
+        History entries. Loaded from the default file if not specified.
+    outcomes : Optional[Tuple[str]], default = ("success",)
+        Outcomes of the runs taken into account.
+    """
+
+    #------------------------------------------------------------------------#
+    def __init__(self, entries = None, outcomes = ("success",)):
+        """Constructor of the RuntimePredictor class.
+        """
+
+        if entries is None:
+            entries = load()
+
+        self.groups = {}
+        self.per_tile = []
+        for e in entries:
+            if e.get("outcome", "success") not in outcomes or e.get("runtime", None) is None:
+                continue
+            for key in self.get_group_keys(e):
+                self.groups.setdefault(key, []).append((e["runtime"], e.get("grid", None)))
+            if e.get("grid", None):
+                self.per_tile.append(e["runtime"] / float(e["grid"] ** 2))
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_group_keys(self, key):
+        """Returns the group keys, from the most to the least specific.
+
+        Parameters
+        ----------
+        key : Dict[str, various]
+            Job key.
+
+        Returns
+        -------
+        List[Tuple]
+            Group keys.
+        """
+
+        circ = key.get("circ", None)
+        N = key.get("N", None)
+        grid = key.get("grid", None)
+        tech = key.get("tech", None)
+
+        return [(circ, N, grid, tech), (circ, N, grid), (circ, N), (circ,)]
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_samples(self, key):
+        """Returns the runtimes of the most specific nonempty group of comparable jobs,
+        scaled to the grid size of the job.
+
+        Parameters
+        ----------
+        key : Dict[str, various]
+            Job key.
+
+        Returns
+        -------
+        List[float]
+            Runtimes in seconds (empty if no comparable job was run).
+        """
+
+        grid = key.get("grid", None)
+        for group in self.get_group_keys(key):
+            samples = self.groups.get(group, [])
+            if samples:
+                return [t * (float(grid) / g) ** 2 if grid and g else t for t, g in samples]
+
+        return []
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def predict(self, key):
+        """Predicts the runtime of a job.
+
+        Parameters
+        ----------
+        key : Dict[str, various]
+            Job key.
+
+        Returns
+        -------
+        float
+            Predicted runtime in seconds.
+        """
+
+        samples = self.get_samples(key)
+        if samples:
+            return median(samples)
+
+        grid = key.get("grid", None) or 1
+        if self.per_tile:
+            return median(self.per_tile) * grid ** 2
+
+        return float(grid ** 2)
+        #Without any history, only the relative order matters.
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_timeout(self, key, q = 0.95, slack = 2.0, min_samples = 5):
+        """Derives a timeout for the job from the runtimes of comparable jobs
+        (same circuit and cluster size; tech is ignored).
+
+        Parameters
+        ----------
+        key : Dict[str, various]
+            Job key.
+        q : Optional[float], default = 0.95
+            Runtime quantile.
+        slack : Optional[float], default = 2.0
+            Multiplier of the quantile.
+        min_samples : Optional[int], default = 5
+            Minimum number of comparable jobs needed for deriving the timeout.
+
+        Returns
+        -------
+        float
+            Timeout in seconds, or None if there are not enough comparable jobs.
+        """
+
+        key = dict(key)
+        key["tech"] = None
+        samples = []
+        for group in self.get_group_keys(key)[1:3]:
+            samples = self.groups.get(group, [])
+            if len(samples) >= min_samples:
+                break
+        if len(samples) < min_samples:
+            return None
+
+        grid = key.get("grid", None)
+        samples = [t * (float(grid) / g) ** 2 if grid and g else t for t, g in samples]
+
+        return slack * quantile(samples, q)
+    #------------------------------------------------------------------------#
+##########################################################################
+
+##########################################################################
+class MemoryPredictor(object):
+    """Predicts the peak resident set size of jobs from the history. A job whose
+    architecture and circuit were run before is predicted to reach the largest peak
+    measured for them. Otherwise, the peak is proportional to the number of RR-graph
+    nodes and edges (see >>arc_meta.py<<), at the >>q<<-quantile of the peaks per node
+    and edge measured for the same circuit, or for all circuits if it was never run.
+    Architectures without node and edge counts are predicted per grid tile instead.
+
+    Parameters
+    ----------
+    entries : Optional[List[Dict[str, various]]], default = None
+        History entries. Loaded from the default file if not specified.
+    q : Optional[float], default = 0.9
+        Quantile of the peaks per node and edge, or per tile.
+    """
+
+    #------------------------------------------------------------------------#
+    def __init__(self, entries = None, q = 0.9):
+        """Constructor of the MemoryPredictor class.
+        """
+
+        if entries is None:
+            entries = load()
+
+        self.q = q
+        self.peaks = {}
+        self.per_element = {}
+        self.per_tile = {}
+        #circuit -> ratios; None -> ratios of all circuits
+        for e in entries:
+            if not e.get("peak_rss", None):
+                continue
+            key = self.get_arc_key(e)
+            self.peaks[key] = max(self.peaks.get(key, 0), e["peak_rss"])
+            for circ in (e.get("circ", None), None):
+                if e.get("rr_elements", None):
+                    self.per_element.setdefault(circ, []).append(e["peak_rss"] / float(e["rr_elements"]))
+                if e.get("grid", None):
+                    self.per_tile.setdefault(circ, []).append(e["peak_rss"] / float(e["grid"] ** 2))
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_arc_key(self, key):
+        """Returns the key identifying the architecture and the circuit of a job.
+
+        Parameters
+        ----------
+        key : Dict[str, various]
+            Job key.
+
+        Returns
+        -------
+        Tuple
+            Circuit, N, grid, tech, and wire.
+        """
+
+        return tuple([key.get(k, None) for k in ("circ", "N", "grid", "tech", "wire")])
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def predict(self, key, rr_elements = None):
+        """Predicts the peak resident set size of a job.
+
+        Parameters
+        ----------
+        key : Dict[str, various]
+            Job key.
+        rr_elements : Optional[int], default = None
+            Number of RR-graph nodes and edges.
+
+        Returns
+        -------
+        float
+            Predicted peak in kB.
+        """
+
+        peak = self.peaks.get(self.get_arc_key(key), None)
+        if peak is not None:
+            return float(peak)
+
+        circ = key.get("circ", None)
+        if rr_elements:
+            ratios = self.per_element.get(circ, None) or self.per_element.get(None, None)
+            return rr_elements * (quantile(ratios, self.q) if ratios else default_kb_per_element)
+
+        grid = key.get("grid", None) or 1
+        ratios = self.per_tile.get(circ, None) or self.per_tile.get(None, None)
+
+        return grid ** 2 * (quantile(ratios, self.q) if ratios else default_kb_per_tile)
+    #------------------------------------------------------------------------#
+##########################################################################
+
+##########################################################################
+def get_mem_total():
+    """Returns the physical memory of the host.
+
+    Parameters
+    ----------
+    None
+
+    Returns
+    -------
+    float
+        Memory in kB, or None if unknown.
+    """
+
+    try:
+        with open("/proc/meminfo", "r") as inf:
+            for line in inf:
+                if line.startswith("MemTotal:"):
+                    return float(line.split()[1])
+    except:
+        pass
+
+    return None
+##########################################################################
+
+##########################################################################
+def simulate_makespan(runtimes, slots):
+    """Simulates list scheduling of the jobs, in the given order, on the given number of slots.
+
+    Parameters
+    ----------
+    runtimes : List[float]
+        Job runtimes, in the order of issuing.
+    slots : int
+        Number of parallel slots.
+
+    Returns
+    -------
+    float
+        Makespan.
+    """
+
+    finish = [0.0] * max(1, slots)
+    for t in runtimes:
+        i = finish.index(min(finish))
+        finish[i] += t
+
+    return max(finish)
+##########################################################################
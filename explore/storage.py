@@ -0,0 +1,363 @@
+"""Storage lifecycle of a campaign: disk usage, pinning, and eviction of regenerable artifacts.
+
+The artifacts of a campaign are inventoried with their sizes and last uses:
+the files of the architecture directories (through their manifests, see >>manifest.py<<),
+the RR-graph bodies of the store (see >>rr_store.py<<), the entries of the decompressed
+RR-graph cache (see >>rr_cache.py<<), and the run directories kept by >>run_vpr.py<< (--keep).
+Only the regenerable artifacts are ever evicted:
+
+rr : RR-graph archives. Regenerated by >>generate_files_for_magic_formula.py<<, which
+     finds the architecture partial in the manifest (see >>rebuild<<).
+rr_body : RR-graph bodies no longer referenced by any header, in any campaign using the store
+          (see >>rr_store.is_referenced<<). Evicted first.
+rr_cache : Decompressed RR-graphs, unless referenced by a running VPR.
+run : Run directories.
+
+The architectures, padding logs, sidecars, headers, logs, and results are never evicted.
+Artifacts of the architectures listed in the final sorting logs are pinned, as are the
+artifacts used within the last >>min_age<< seconds, which running jobs may still need.
+
+The last use of an archive is its access time, which >>run_vpr.py<< sets explicitly
+(see >>touch<<), so that it does not depend on the mount options. That of a cache entry
+is the modification time of its sidecar and that of a run directory the latest
+modification time of its files.
+"""
+
+import os
+import re
+import time
+
+import manifest
+import ranking
+import rr_cache
+import rr_store
+import codec
+
+from conf import grid_sizes
+
+evictable = ["rr_body", "rr_cache", "run", "rr"]
+
+run_dir_name = re.compile(r"^(magic_T[^_]+_N\d+_W\d+_W\d+_H\d+)_.+_\d+(_backup)?$")
+#<architecture>_<circuit>_<seed>[_backup] (see >>run_vpr.py<<).
+
+##########################################################################
+def touch(filename):
+    """Marks the file as used now, without changing its modification time,
+    on which the caches and the manifests rely.
+
+    Parameters
+    ----------
+    filename : str
+        File name.
+
+    Returns
+    -------
+    None
+    """
+
+    os.system("touch -a -c %s" % filename)
+    #os.utime would round the modification time to microseconds.
+##########################################################################
+
+##########################################################################
+def get_pins(sort_files, top_k = None):
+    """Returns the architectures referenced by the sorting logs.
+
+    Parameters
+    ----------
+    sort_files : List[str]
+        Sorting log names.
+    top_k : Optional[int], default = None
+        Number of architectures pinned from the top of each log. All if not specified.
+
+    Returns
+    -------
+    Set[str]
+        Architecture names (e.g., magic_T4_N8_W15).
+    """
+
+    pins = set()
+    for sort_file in sort_files:
+        pins.update([ranking.get_arc(arc) for arc in ranking.read_sort_file(sort_file)[:top_k]])
+
+    return pins
+##########################################################################
+
+##########################################################################
+def get_dir_usage(path):
+    """Returns the size and the latest modification time of a directory tree.
+
+    Parameters
+    ----------
+    path : str
+        Directory.
+
+    Returns
+    -------
+    int
+        Size in bytes.
+    float
+        Latest modification time.
+    """
+
+    size = 0
+    last_use = os.path.getmtime(path)
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            try:
+                st = os.lstat(os.path.join(root, f))
+            except OSError:
+                continue
+            if st.st_nlink > 1:
+                #Hard links to the inputs or to the cache take no space of their own.
+                continue
+            size += st.st_size
+            last_use = max(last_use, st.st_mtime)
+
+    return size, last_use
+##########################################################################
+
+##########################################################################
+def scan_arc_dir(arc_dir):
+    """Inventories the artifacts of an architecture directory.
+
+    Parameters
+    ----------
+    arc_dir : str
+        Architecture directory.
+
+    Returns
+    -------
+    List[Dict[str, various]]
+        Artifacts: "kind", "name", "path", "size", and "last_use".
+        Artifacts not evicted have the kind "kept".
+    """
+
+    artifacts = []
+    arc_manifest = manifest.Manifest(arc_dir)
+    arc_manifest.save()
+    for name in arc_manifest.artifacts:
+        for kind in arc_manifest.artifacts[name]:
+            path = os.path.join(arc_dir, name + manifest.kinds[kind])
+            entry = arc_manifest.artifacts[name][kind]
+            last_use = entry["mtime"]
+            if kind in ("rr", "rr_zst"):
+                try:
+                    last_use = max(last_use, os.stat(path).st_atime)
+                except OSError:
+                    continue
+            artifacts.append({"kind" : "rr" if kind in ("rr", "rr_zst") else "kept", "name" : name,\
+                              "path" : path, "size" : entry["size"], "last_use" : last_use})
+
+    return artifacts
+##########################################################################
+
+##########################################################################
+def scan_rr_store(store_dir):
+    """Inventories the bodies of the RR-graph store.
+
+    Parameters
+    ----------
+    store_dir : str
+        Store directory.
+
+    Returns
+    -------
+    List[Dict[str, various]]
+        Artifacts. The bodies still referenced by a header, wherever it is, are kept.
+    """
+
+    artifacts = []
+    if not os.path.isdir(store_dir):
+        return artifacts
+    for root, dirs, files in os.walk(store_dir):
+        for f in files:
+            path = os.path.abspath(os.path.join(root, f))
+            if not f.endswith(".xml.lz4"):
+                #Temporary files of a split in progress and back-references.
+                continue
+            st = os.stat(path)
+            artifacts.append({"kind" : "kept" if rr_store.is_referenced(path) else "rr_body", "name" : f,\
+                              "path" : path, "size" : st.st_size, "last_use" : st.st_mtime})
+
+    return artifacts
+##########################################################################
+
+##########################################################################
+def scan_rr_cache(cache_dir):
+    """Inventories the entries of the decompressed RR-graph cache.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Cache directory.
+
+    Returns
+    -------
+    List[Dict[str, various]]
+        Artifacts.
+    """
+
+    artifacts = []
+    if not os.path.isdir(cache_dir):
+        return artifacts
+    for f in os.listdir(cache_dir):
+        if not f.endswith(".meta"):
+            continue
+        entry = os.path.join(cache_dir, f.rsplit(".meta", 1)[0])
+        try:
+            size = os.path.getsize(entry)
+            last_use = os.path.getmtime(entry + ".meta")
+        except OSError:
+            continue
+        name = os.path.basename(entry).split('_', 1)[1].rsplit("_rr.xml", 1)[0]
+        artifacts.append({"kind" : "rr_cache", "name" : name, "path" : entry, "size" : size, "last_use" : last_use})
+
+    return artifacts
+##########################################################################
+
+##########################################################################
+def scan_run_dirs(run_dir):
+    """Inventories the VPR run directories.
+
+    Parameters
+    ----------
+    run_dir : str
+        Directory in which >>run_vpr.py<< was called.
+
+    Returns
+    -------
+    List[Dict[str, various]]
+        Artifacts.
+    """
+
+    artifacts = []
+    for f in os.listdir(run_dir):
+        path = os.path.join(run_dir, f)
+        match = run_dir_name.match(f)
+        if match is None or not os.path.isdir(path):
+            continue
+        size, last_use = get_dir_usage(path)
+        artifacts.append({"kind" : "run", "name" : match.group(1), "path" : path, "size" : size, "last_use" : last_use})
+
+    return artifacts
+##########################################################################
+
+##########################################################################
+def select(artifacts, quota, pins = set(), min_age = 3600, policy = "lru"):
+    """Selects the artifacts to be evicted for the total size to fit the quota.
+
+    Parameters
+    ----------
+    artifacts : List[Dict[str, various]]
+        Inventory.
+    quota : float
+        Quota in bytes.
+    pins : Optional[Set[str]], default = set()
+        Pinned architectures (e.g., magic_T4_N8_W15).
+    min_age : Optional[float], default = 3600
+        Number of seconds since the last use below which an artifact is not evicted.
+    policy : Optional[str], default = "lru"
+        Order of eviction: least recently used first ("lru") or largest first ("size").
+        Unreferenced bodies always go first.
+
+    Returns
+    -------
+    List[Dict[str, various]]
+        Artifacts to be evicted, in order.
+    """
+
+    total = sum([a["size"] for a in artifacts])
+    now = time.time()
+    candidates = [a for a in artifacts if a["kind"] in evictable and now - a["last_use"] >= min_age\
+                  and not (a["kind"] != "rr_body" and ranking.get_arc(a["name"]) in pins)]
+    if policy == "size":
+        order = lambda a : (a["kind"] != "rr_body", -a["size"])
+    else:
+        order = lambda a : (a["kind"] != "rr_body", a["last_use"])
+
+    selected = []
+    for a in sorted(candidates, key = order):
+        if total <= quota:
+            break
+        selected.append(a)
+        total -= a["size"]
+
+    return selected
+##########################################################################
+
+##########################################################################
+def evict(artifact):
+    """Removes an artifact.
+
+    Parameters
+    ----------
+    artifact : Dict[str, various]
+        Artifact.
+
+    Returns
+    -------
+    bool
+        True if removed.
+    """
+
+    if artifact["kind"] == "rr_cache":
+        return rr_cache.remove(artifact["path"])
+    if artifact["kind"] == "run":
+        os.system("rm -rf %s" % artifact["path"])
+        return True
+    if artifact["kind"] == "rr_body":
+        if rr_store.is_referenced(artifact["path"]):
+            #Named by a header split since the inventory.
+            return False
+        os.system("rm -rf %s" % rr_store.get_refs_dir(artifact["path"]))
+    try:
+        os.remove(artifact["path"])
+    except OSError:
+        return False
+
+    return True
+##########################################################################
+
+##########################################################################
+def rebuild(res_dir, names):
+    """Regenerates the missing artifacts (e.g., evicted RR-graphs) of the architectures,
+    by calling >>generate_files_for_magic_formula.py<< on their channel compositions
+    and grid sizes. The smallest grid size of each channel composition in the directory
+    is always included, so that the other sizes are derived from it (if present) instead
+    of being generated from scratch.
+
+    Parameters
+    ----------
+    res_dir : str
+        Architecture directory.
+    names : List[str]
+        Architecture names.
+
+    Returns
+    -------
+    None
+    """
+
+    res_dir = os.path.abspath(res_dir) + '/'
+    arc_manifest = manifest.Manifest(res_dir)
+    rr_codec = "zstd" if any(["rr_zst" in arc_manifest.artifacts[name] for name in arc_manifest.artifacts]) else "lz4"
+    rr_dict = os.path.join(res_dir, codec.dict_filename)
+
+    groups = {}
+    for name in names:
+        tech, N, wire, grid = manifest.get_key(name)
+        group = groups.setdefault((tech, N), {"wires" : set(), "grids" : set()})
+        group["wires"].add(wire)
+        group["grids"].add(grid)
+        group["grids"].add(min([manifest.get_key(n)[3] for n in arc_manifest.find(tech, N, wires = set([wire]))] + [grid]))
+
+    runner_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "runner_scripts")
+    for tech, N in sorted(groups):
+        grids = groups[(tech, N)]["grids"]
+        circs = sorted(set([sorted([c for c in grid_sizes[N] if grid_sizes[N][c] == grid])[0] for grid in grids]))
+        #One circuit per grid size suffices.
+        os.system("cd %s && python -u generate_files_for_magic_formula.py --tech %s --N %d --circs \"%s\" --wire \"%s\" --res_dir %s --rr_codec %s%s"\
+                  % (runner_dir, tech, N, ' '.join(circs), ' '.join([str(w) for w in sorted(groups[(tech, N)]["wires"])]),\
+                     res_dir, rr_codec, (" --rr_dict %s" % rr_dict) if os.path.exists(rr_dict) else ''))
+##########################################################################
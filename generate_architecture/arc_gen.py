@@ -45,6 +45,10 @@ robustness_level : Optional[int], default = 2
     Note that in all cases, the horizontal wire is assumed to be at the
     middle height of its LUT and vertical wire in the middle of the tile.
     What changes is the location of the driving multiplexer.
+rr_codec : Optional[str], default = lz4
+    Codec of the RR-graph archive: {lz4, zstd} (see >>codec.py<<).
+rr_dict : Optional[str], default = None
+    zstd dictionary used to compress the RR-graph.
 
 Returns
 -------
@@ -52,6 +56,7 @@ None
 """ 
 
 import os
+import time
 import networkx as nx
 import math
 import argparse
@@ -60,6 +65,13 @@ sys.path.insert(0,'..')
 
 import setenv
 import tech
+import arc_meta
+import codec
+
+start_time = time.time()
+spice_stats = {"runs" : 0, "runtime" : 0.0}
+#HSPICE calls and their total duration, recorded in the sidecar for
+#the cost estimates of the campaigns (see >>explore/planner.py<<).
 
 parser = argparse.ArgumentParser()
 parser.add_argument("--K")
@@ -75,6 +87,8 @@ parser.add_argument("--physical_square")
 parser.add_argument("--only_pad")
 parser.add_argument("--import_padding")
 parser.add_argument("--robustness_level")
+parser.add_argument("--rr_codec")
+parser.add_argument("--rr_dict")
 
 args = parser.parse_args()
 K = int(args.K)
@@ -212,6 +226,10 @@ try:
 except:
     pass
 
+RR_CODEC = "lz4"
+if args.rr_codec in codec.codecs:
+    RR_CODEC = args.rr_codec
+
 ##########################################################################
 def read_buffer_cache(tech_name):
     """Reads the buffer sizes from the cache.
@@ -1771,10 +1789,12 @@ def export_rr_graph(G, grid, filename):
         outf.write(txt)
         txt, counts, io_fanin_dict, io_fanout_dict = export_rr_nodes(G, grid)
         outf.write(txt)
+        node_cnt = sum([len(counts[u]) for u in counts])
         txt = export_rr_edges(G, counts, io_fanin_dict, io_fanout_dict) + footer
         outf.write(txt)
+        edge_cnt = txt.count("<edge ")
     if COMPRESS_RR:
-        os.system("lz4 --rm %s %s.lz4" % (filename, filename)) 
+        codec.compress(filename, filename + codec.suffixes[RR_CODEC], RR_CODEC, dictionary = args.rr_dict, remove = True)
 
     if inherit is None:
         fill_in_template(G, cb_delay, td_dict)
@@ -1792,6 +1812,54 @@ def export_rr_graph(G, grid, filename):
                 txt += line
         with open(args.arc_name, "w") as outf:
             outf.write(txt)
+
+    export_sidecar(td_dict, node_cnt, edge_cnt, filename + (codec.suffixes[RR_CODEC] if COMPRESS_RR else ''))
+##########################################################################
+
+##########################################################################
+def export_sidecar(td_dict, node_cnt, edge_cnt, rr_filename):
+    """Completes the metadata sidecar of the architecture (see >>arc_meta.py<<)
+    once the architecture and the RR-graph are written. The padding results are
+    added to it by >>pad_LEN1<<.
+
+    Parameters
+    ----------
+    td_dict : Dict[str, float]
+        Measured (or inherited) delays.
+    node_cnt : int
+        Number of RR-graph nodes.
+    edge_cnt : int
+        Number of RR-graph edges.
+    rr_filename : str
+        Name of the stored RR-graph.
+
+    Returns
+    -------
+    None
+    """
+
+    h_width = get_chan_width(H)
+    v_width = get_chan_width(V)
+
+    generator = {"K" : K, "N" : N, "tech" : args.tech, "density" : density, "grid_w" : grid_w, "grid_h" : grid_h,\
+                 "wire_file" : os.path.abspath(args.wire_file), "physical_square" : PHYSICAL_SQUARE,\
+                 "robustness_level" : ROBUSTNESS_LEVEL, "import_padding" : args.import_padding,\
+                 "change_grid_dimensions" : args.change_grid_dimensions, "cluster_inputs" : cluster_inputs,\
+                 "io_capacity" : IO_CAPACITY, "disjoint_sb" : DISJOINT_SB, "disjoint_cb" : DISJOINT_CB,\
+                 "len_1_twists" : ADD_LEN_1_TWISTS, "separate_taps" : SEPARATE_TAPS}
+
+    arc_meta.update(args.arc_name, {"generator" : generator,\
+                                    "measured_delays" : td_dict,\
+                                    "switch_delays" : parse_switch_delays(args.arc_name),\
+                                    "block_delays" : parse_block_delays(args.arc_name),\
+                                    "rr_graph" : {"nodes" : node_cnt, "edges" : edge_cnt,\
+                                                  "chan_width_max" : max(h_width, v_width),\
+                                                  "chan_width_x" : h_width, "chan_width_y" : v_width},\
+                                    "hashes" : {"arc" : arc_meta.hash_file(args.arc_name),\
+                                                "rr_graph" : arc_meta.hash_file(rr_filename),\
+                                                "wire_file" : arc_meta.hash_file(args.wire_file)},\
+                                    "spice" : spice_stats,\
+                                    "runtime" : time.time() - start_time})
 ##########################################################################
 
 ##########################################################################
@@ -2183,6 +2251,7 @@ def pad_LEN1(G, max_mux_width = 16):
         v = V.pop(i)[1]
 
     V.append((VL, v))
+    orig_H1, orig_V1 = h, v
 
     #-------------------------------------------------------------------------#
     def get_largest_mux(G):
@@ -2265,6 +2334,11 @@ def pad_LEN1(G, max_mux_width = 16):
         txt += "Metal dimensions: %d X %d nm\n\n" % (metal_w, metal_h)
 
         cb_sizes, sb_sizes = export_mux_sizes(G)
+        mux_hist = {}
+        for mux_type, sizes in (("cb", cb_sizes), ("sb", sb_sizes)):
+            mux_hist.update({mux_type : {}})
+            for mux in sizes:
+                mux_hist[mux_type][sizes[mux]] = mux_hist[mux_type].get(sizes[mux], 0) + 1
         mux_sizes = cb_sizes
         mux_sizes.update(sb_sizes)
         size_indexed = {}
@@ -2285,6 +2359,12 @@ def pad_LEN1(G, max_mux_width = 16):
 
         with open(filename, "w") as outf:
             outf.write(txt[:-1])
+
+        arc_meta.update(args.arc_name, {"composition" : {"H" : {h[0] : h[1] for h in H}, "V" : {v[0] : v[1] for v in V}},\
+                                        "padding" : {"H1" : H[-1][1] - orig_H1, "V%d" % VL : V[-1][1] - orig_V1},\
+                                        "tile" : {"active_w" : active_w, "active_h" : active_h,\
+                                                  "metal_w" : metal_w, "metal_h" : metal_h},\
+                                        "mux_sizes" : mux_hist})
     
         print("\n" + txt)
     #------------------------------------------------------------------------#
@@ -3017,7 +3097,10 @@ def measure(G, wire, get_cb_delay = False, meas_lut_access = False):
            outf.write(conv_nx_to_spice(net, meas_lut_access = meas_lut_access))
        
         hspice_call = os.environ["HSPICE"] + " %s > %s" % (netlist_filename, hspice_dump)
+        spice_start = time.time()
         os.system(hspice_call)
+        spice_stats["runs"] += 1
+        spice_stats["runtime"] += time.time() - spice_start
        
         scale_dict = {'f' : 1e-15, 'p' : 1e-12, 'n' : 1e-9}
        
@@ -3198,7 +3281,30 @@ def spice_all_wires(G):
 
 ##########################################################################
 def read_delays_from_arc(arc_filename):
-    """Reads the switch delays from an architecture file.
+    """Reads the switch delays of an architecture, from its sidecar
+    if available, or from the architecture file otherwise.
+
+    Parameters
+    ----------
+    arc_filename : str
+        Name of the architecture file from which to read the delays.
+
+    Returns
+    -------
+    Dict[str, float]
+        A dictionary of delays.
+    """
+
+    meta = arc_meta.load(arc_filename)
+    if meta is not None and "switch_delays" in meta:
+        return meta["switch_delays"]
+
+    return parse_switch_delays(arc_filename)
+##########################################################################
+
+##########################################################################
+def parse_switch_delays(arc_filename):
+    """Parses the switch delays from an architecture file.
 
     Parameters
     ----------
@@ -3224,6 +3330,36 @@ def read_delays_from_arc(arc_filename):
             td_dict.update({name : td})
 ##########################################################################
 
+##########################################################################
+def parse_block_delays(arc_filename):
+    """Parses the maximum delays of the logic and I/O blocks from an architecture file.
+
+    Parameters
+    ----------
+    arc_filename : str
+        Name of the architecture file from which to read the delays.
+
+    Returns
+    -------
+    Dict[str, float]
+        A dictionary of delays, indexed by the input and the output port.
+    """
+
+    with open(arc_filename, "r") as inf:
+        lines = inf.readlines()
+
+    get_val = lambda line, key : line.split("%s=\"" % key, 1)[1].split('"', 1)[0]
+
+    td_dict = {}
+    for line in lines:
+        if "<delay_constant " in line:
+            td_dict.update({"%s -> %s" % (get_val(line, "in_port"), get_val(line, "out_port")) : float(get_val(line, "max"))})
+        elif "<T_clock_to_Q " in line:
+            td_dict.update({"%s -> %s" % (get_val(line, "clock"), get_val(line, "port")) : float(get_val(line, "max"))})
+
+    return td_dict
+##########################################################################
+
 ##########################################################################
 def fill_in_template(G, cb_delay, td_sb):
     """Fills in the architecture xml template.
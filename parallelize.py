@@ -1,6 +1,11 @@
 import os
 import time
 import copy
+import json
+import signal
+
+status_interval = 5
+#Minimum number of seconds between two writes of the status file.
 
 ##########################################################################
 class Parallel(object):
@@ -12,17 +17,59 @@ class Parallel(object):
         Maximum number of parallel threads.
     sleep_interval : int
         Number of seconds to wait between to polls for available threads.
+    canceller : Optional[Callable[[float], List[str]]], default = None
+        Called instead of sleeping between two polls, with the number of seconds
+        to wait at most. Returns the patterns of the commands to cancel
+        (see >>cancel<<). It may return early, e.g., as soon as a job reports
+        a failure (see >>explore/log_watcher.py<<).
+    speculator : Optional[Callable[[Dict[str, float], int], List[Tuple[str, str, str]]]], default = None
+        Called while the last commands run and some threads are idle, with the elapsed
+        seconds of each running command without a backup and the number of idle threads.
+        Returns the stragglers to back up, as (command, backup command, result file) triples
+        (see >>speculate<<).
+    mem_budget : Optional[float], default = None
+        Memory available to the commands. Unlimited if not specified.
+    mem_estimator : Optional[Callable[[str], float]], default = None
+        Returns the estimated peak memory of a command, in the unit of >>mem_budget<<
+        (see >>admit<<).
+    status_file : Optional[str], default = None
+        File to which the state of the pool is written while it runs, for the status page
+        of the campaign (see >>explore/campaign_status.py<<). Not written if not specified.
+    status_fields : Optional[Dict[str, various]], default = None
+        Fields describing the pool, added to the status (e.g., the stage).
     """
 
     #------------------------------------------------------------------------#
-    def __init__(self, max_cpu, sleep_interval):
+    def __init__(self, max_cpu, sleep_interval, canceller = None, speculator = None,\
+                 mem_budget = None, mem_estimator = None, status_file = None, status_fields = None):
         """Constructor of the Parallel class.
         """
 
         self.max_cpu = max_cpu
         self.sleep_interval = sleep_interval
+        self.canceller = canceller
+        self.speculator = speculator
         self.cmds = []
         self.running = []
+        self.running_cmds = {}
+        self.started = {}
+        self.partners = {}
+        #pid -> (pid of the other copy, result file)
+        self.backups = 0
+        self.mem_budget = mem_budget if mem_estimator is not None else None
+        self.mem_estimator = mem_estimator
+        self.mem_used = {}
+        #pid -> estimated peak memory
+        self.cancelled = set()
+        self.status_file = status_file
+        self.status_fields = status_fields or {}
+        self.issued = 0
+        self.finished = 0
+        self.busy_s = 0.0
+        #Integral of the number of running commands over time.
+        self.run_start = None
+        self.last_poll = time.time()
+        self.last_status = None
     #------------------------------------------------------------------------#
 
     #------------------------------------------------------------------------#
@@ -64,15 +111,17 @@ class Parallel(object):
     
         print cmd
     
-        cmd += " & echo $! > pid"
-    
-        os.system(cmd)
+        os.system(cmd + " & echo $! > pid")
         pid_file = open("pid", "r")
         pid = int(pid_file.read())
         pid_file.close()
     
         print "pid ", pid
         os.system("rm pid")
+        self.running_cmds[pid] = cmd
+        self.started[pid] = time.time()
+        if self.mem_budget is not None:
+            self.mem_used[pid] = self.mem_estimator(cmd)
     
         return pid
     #------------------------------------------------------------------------#
@@ -121,6 +170,10 @@ class Parallel(object):
                 return True
         #........................................................................#
 
+        now = time.time()
+        self.busy_s += len(self.running) * (now - self.last_poll)
+        self.last_poll = now
+
         removal_list = []
         for pid in self.running:
             if not check_pid_alive(pid):
@@ -129,10 +182,210 @@ class Parallel(object):
         if clean:
             for pid in removal_list:
                 self.running.remove(pid)
+                self.running_cmds.pop(pid, None)
+                self.started.pop(pid, None)
+                self.mem_used.pop(pid, None)
+                if pid in self.partners:
+                    partner, result_file = self.partners.pop(pid)
+                    if partner is None:
+                        continue
+                    self.partners.pop(partner, None)
+                    if os.path.exists(result_file):
+                        #The first copy to finish wins. A copy that exited
+                        #without a result leaves the other one running.
+                        self.partners[partner] = (None, result_file)
+                        #Not backed up again while it exits.
+                        print "kill ", partner
+                        try:
+                            os.kill(partner, signal.SIGTERM)
+                        except OSError:
+                            pass
+            self.finished += len(removal_list)
+        self.write_status()
 
         return len(removal_list)            
     #------------------------------------------------------------------------#
     
+    #------------------------------------------------------------------------#
+    def is_cancelled(self, cmd):
+        """Checks if the command matches any of the cancelled patterns.
+
+        Parameters
+        ----------
+        cmd : str
+            Command.
+
+        Returns
+        -------
+        bool
+            True if cancelled.
+        """
+
+        for pattern in self.cancelled:
+            if pattern in cmd:
+                return True
+
+        return False
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def cancel(self, pattern):
+        """Cancels all commands containing the pattern. The pending ones are
+        never issued, while the running ones receive SIGTERM.
+
+        Parameters
+        ----------
+        pattern : str
+            Substring of the commands to cancel.
+
+        Returns
+        -------
+        int
+            Number of running commands that were terminated.
+        """
+
+        self.cancelled.add(pattern)
+
+        killed = 0
+        for pid in self.running:
+            if pattern in self.running_cmds.get(pid, ''):
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                    killed += 1
+                except OSError:
+                    pass
+
+        return killed
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def wait(self):
+        """Waits between two polls, cancelling the commands reported by the canceller.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        if self.canceller is None:
+            time.sleep(self.sleep_interval)
+            return
+
+        for pattern in self.canceller(self.sleep_interval):
+            if not pattern in self.cancelled:
+                print "cancel ", pattern, self.cancel(pattern)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def speculate(self):
+        """Launches backup copies of the stragglers selected by the speculator on the idle threads.
+        Once either copy exits with its result file written, the other one receives SIGTERM.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            Number of backups launched.
+        """
+
+        idle = self.max_cpu - len(self.running)
+        if self.speculator is None or idle <= 0:
+            return 0
+
+        now = time.time()
+        elapsed = {}
+        for pid in self.running:
+            if not pid in self.partners and pid in self.started:
+                elapsed[self.running_cmds[pid]] = now - self.started[pid]
+        pids = dict([(self.running_cmds[pid], pid) for pid in self.running])
+
+        launched = 0
+        for cmd, backup_cmd, result_file in self.speculator(elapsed, idle)[:idle]:
+            if not cmd in pids or self.is_cancelled(cmd) or os.path.exists(result_file):
+                continue
+            if self.mem_budget is not None and sum(self.mem_used.values()) + self.mem_estimator(backup_cmd) > self.mem_budget:
+                continue
+            backup = self.spawn_ret_pid(backup_cmd)
+            self.running.append(backup)
+            self.partners[pids[cmd]] = (backup, result_file)
+            self.partners[backup] = (pids[cmd], result_file)
+            launched += 1
+        self.backups += launched
+
+        return launched
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def admit(self, i):
+        """Finds the first command, from the i-th one on, whose estimated peak memory fits
+        into the budget, together with those of the running commands. A command is always
+        admitted if nothing runs, so that a command exceeding the budget alone still runs.
+
+        Parameters
+        ----------
+        i : int
+            Index of the first command not issued yet.
+
+        Returns
+        -------
+        int
+            Index of the command or None if none fits.
+        """
+
+        if self.mem_budget is None or not self.running:
+            return i
+
+        free = self.mem_budget - sum(self.mem_used.values())
+        for j in range(i, len(self.cmds)):
+            if self.is_cancelled(self.cmds[j]) or self.mem_estimator(self.cmds[j]) <= free:
+                return j
+
+        return None
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def write_status(self, final = False):
+        """Writes the state of the pool to the status file, at most once per >>status_interval<<.
+        The file is replaced atomically.
+
+        Parameters
+        ----------
+        final : Optional[bool], default = False
+            Specifies that the pool completed. Always written.
+
+        Returns
+        -------
+        None
+        """
+
+        if self.status_file is None:
+            return
+        now = time.time()
+        if not final and self.last_status is not None and now - self.last_status < status_interval:
+            return
+        self.last_status = now
+
+        status = dict(self.status_fields)
+        status.update({"pid" : os.getpid(), "slots" : self.max_cpu, "queued" : len(self.cmds) - self.issued,\
+                       "running" : len(self.running), "finished" : self.finished, "backups" : self.backups,\
+                       "busy_s" : self.busy_s, "started" : self.run_start, "updated" : now, "done" : final})
+        tmp = "%s.tmp" % self.status_file
+        try:
+            with open(tmp, "w") as outf:
+                json.dump(status, outf)
+            os.rename(tmp, self.status_file)
+        except (IOError, OSError):
+            #The status page is never worth stopping the pool for.
+            pass
+    #------------------------------------------------------------------------#
+
     #------------------------------------------------------------------------#
     def run(self):
         """Runs the initialized pool.
@@ -146,16 +399,27 @@ class Parallel(object):
         None
         """
         
+        self.run_start = self.last_poll = time.time()
         i = 0
         done = False
         while i < len(self.cmds) or done:
             if done:
                 while self.running:
-                    self.poll_pids()
+                    freed = self.poll_pids()
+                    if self.speculate() == 0 and freed == 0:
+                        self.wait()
                 break
             while len(self.running) < self.max_cpu:
-                self.running.append(self.spawn_ret_pid(self.cmds[i]))
+                j = self.admit(i)
+                if j is None:
+                    #Waits for memory to be freed.
+                    break
+                self.cmds.insert(i, self.cmds.pop(j))
+                #The commands that fit go ahead of those that do not.
+                if not self.is_cancelled(self.cmds[i]):
+                    self.running.append(self.spawn_ret_pid(self.cmds[i]))
                 i += 1
+                self.issued = i
                 if i == len(self.cmds):
                     done = True
                     break
@@ -164,6 +428,7 @@ class Parallel(object):
             freed = 0
             while freed == 0:
                 freed = self.poll_pids()
-                time.sleep(self.sleep_interval)
+                self.wait()
+        self.write_status(True)
     #------------------------------------------------------------------------#
 ##########################################################################
@@ -0,0 +1,95 @@
+"""Runs the jobs of a shared work queue (see >>work_queue.py<<). Any number of workers
+can serve the same queue, on this host or on other hosts mounting it, e.g.:
+
+python -u queue_worker.py --queue_dir /shared/queue --slots 47
+
+Scripts enqueue their jobs when called with --queue (e.g., >>explore/runner_scripts/run_benchmarks.py<<).
+On SIGTERM or SIGINT, the worker terminates its running jobs and puts them back into the queue.
+
+Parameters
+----------
+queue_dir : str
+    Queue directory.
+slots : Optional[int], default = VPR_CPU
+    Number of jobs run in parallel.
+poll_interval : Optional[float], default = 2
+    Number of seconds between two polls of the queue.
+lease_timeout : Optional[float], default = 600
+    Number of seconds after which the lease of a job that was not renewed expires.
+idle_timeout : Optional[float], default = None
+    Number of seconds without any job after which the worker exits. Never by default.
+batch : Optional[str], default = None
+    Serves only the jobs of this batch and exits once it is complete.
+
+Returns
+-------
+None
+"""
+
+import os
+import signal
+import argparse
+
+import setenv
+import work_queue
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--queue_dir")
+parser.add_argument("--slots")
+parser.add_argument("--poll_interval")
+parser.add_argument("--lease_timeout")
+parser.add_argument("--idle_timeout")
+parser.add_argument("--batch")
+args = parser.parse_args()
+
+SLOTS = int(os.environ["VPR_CPU"])
+try:
+    SLOTS = int(args.slots)
+except:
+    pass
+
+POLL_INTERVAL = 2
+try:
+    POLL_INTERVAL = float(args.poll_interval)
+except:
+    pass
+
+LEASE_TIMEOUT = 600
+try:
+    LEASE_TIMEOUT = float(args.lease_timeout)
+except:
+    pass
+
+IDLE_TIMEOUT = None
+try:
+    IDLE_TIMEOUT = float(args.idle_timeout)
+except:
+    pass
+
+worker = work_queue.Worker(args.queue_dir, SLOTS, POLL_INTERVAL, LEASE_TIMEOUT, args.batch)
+
+##########################################################################
+def stop(signum, frame):
+    """Requeues the running jobs and exits.
+
+    Parameters
+    ----------
+    signum : int
+        Signal number.
+    frame : frame
+        Current stack frame.
+
+    Returns
+    -------
+    None
+    """
+
+    worker.stop()
+    exit(0)
+##########################################################################
+
+signal.signal(signal.SIGTERM, stop)
+signal.signal(signal.SIGINT, stop)
+
+print("Worker %s serving %s with %d slots." % (worker.name, os.path.abspath(args.queue_dir), SLOTS))
+worker.run(IDLE_TIMEOUT)
@@ -0,0 +1,652 @@
+"""Work queue in a directory shared by any number of workers, on this host or on
+other hosts mounting the same file system (see >>queue_worker.py<<).
+
+The queue directory holds:
+
+pending/<job> : Job descriptions (command and working directory), claimed in name order.
+running/<job>.<worker> : Claimed jobs. The modification time of the file is the lease
+                         of the worker, renewed at every poll.
+done/<job> : Outcomes (return code, worker, and runtime).
+tokens/<batch>/<k> : Tokens of the batches whose number of running jobs is limited
+                     over all workers (e.g., by the HSPICE licenses). A taken token
+                     is renamed to <k>.<job>.
+cancel/<batch> : Patterns of the cancelled commands of the batch, one per line.
+
+Jobs and tokens are claimed by renaming them, which is atomic on a shared file system,
+so that exactly one claimant succeeds. A lease that was not renewed for >>lease_timeout<<
+seconds (e.g., the worker was killed or its host went down) expires, and any worker or
+submitter puts the job back into pending/. Leases are compared with the time of the file
+server (see >>get_fs_time<<), not with the clocks of the hosts. The lease timeout must
+exceed the attribute caching of the mounts (e.g., actimeo of NFS).
+
+Jobs are named <batch>_<index>, with <batch> = <time>_<host>_<pid>, so that older
+batches are served first and each batch in the order of its commands. The working
+directory must exist under the same path on all hosts.
+"""
+
+import os
+import json
+import time
+import socket
+import signal
+import subprocess
+
+from parallelize import Parallel
+
+subdirs = ["pending", "running", "done", "tokens", "cancel", "tmp"]
+
+host = socket.gethostname().split('.')[0].replace('_', '-')
+
+worker_var = "WORK_QUEUE_WORKER"
+#Set to the name of the worker for the jobs it runs (e.g., so that they do not write
+#databases that are unsafe to share between hosts, see >>explore/results_db.py<<).
+
+##########################################################################
+def init_dir(queue_dir):
+    """Creates the subdirectories of the queue.
+
+    Parameters
+    ----------
+    queue_dir : str
+        Queue directory.
+
+    Returns
+    -------
+    None
+    """
+
+    for d in subdirs:
+        os.system("mkdir -p %s/%s" % (queue_dir, d))
+##########################################################################
+
+##########################################################################
+def get_batch(job):
+    """Returns the batch of the job.
+
+    Parameters
+    ----------
+    job : str
+        Job name, possibly followed by the worker (e.g., a file of running/).
+
+    Returns
+    -------
+    str
+        Batch name.
+    """
+
+    return '_'.join(job.split('.', 1)[0].split('_')[:3])
+##########################################################################
+
+##########################################################################
+def get_fs_time(queue_dir):
+    """Returns the current time of the file server, as the modification
+    time of a newly written file.
+
+    Parameters
+    ----------
+    queue_dir : str
+        Queue directory.
+
+    Returns
+    -------
+    float
+        Time.
+    """
+
+    probe = "%s/tmp/clock.%s-%d" % (queue_dir, host, os.getpid())
+    open(probe, "w").close()
+    now = os.path.getmtime(probe)
+    os.remove(probe)
+
+    return now
+##########################################################################
+
+##########################################################################
+def write_json(queue_dir, filename, data):
+    """Writes a JSON file atomically, so that readers never see it partially written.
+
+    Parameters
+    ----------
+    queue_dir : str
+        Queue directory.
+    filename : str
+        File name.
+    data : Dict[str, various]
+        Content.
+
+    Returns
+    -------
+    None
+    """
+
+    tmp = "%s/tmp/%s.%s-%d" % (queue_dir, os.path.basename(filename), host, os.getpid())
+    with open(tmp, "w") as outf:
+        json.dump(data, outf)
+    os.rename(tmp, filename)
+##########################################################################
+
+##########################################################################
+def take_token(queue_dir, job):
+    """Takes a token of the batch of the job, if its number of running jobs is limited.
+
+    Parameters
+    ----------
+    queue_dir : str
+        Queue directory.
+    job : str
+        Job name.
+
+    Returns
+    -------
+    bool
+        True if a token was taken or none is needed.
+    """
+
+    token_dir = "%s/tokens/%s" % (queue_dir, get_batch(job))
+    try:
+        tokens = sorted(os.listdir(token_dir))
+    except OSError:
+        return True
+
+    for t in tokens:
+        if '.' in t:
+            continue
+        try:
+            os.rename("%s/%s" % (token_dir, t), "%s/%s.%s" % (token_dir, t, job))
+            return True
+        except OSError:
+            #Taken by another worker in the meantime.
+            continue
+
+    return False
+##########################################################################
+
+##########################################################################
+def release_token(queue_dir, job):
+    """Returns the token held by the job, if any.
+
+    Parameters
+    ----------
+    queue_dir : str
+        Queue directory.
+    job : str
+        Job name.
+
+    Returns
+    -------
+    None
+    """
+
+    token_dir = "%s/tokens/%s" % (queue_dir, get_batch(job))
+    try:
+        tokens = os.listdir(token_dir)
+    except OSError:
+        return
+
+    for t in tokens:
+        if t.endswith('.' + job):
+            try:
+                os.rename("%s/%s" % (token_dir, t), "%s/%s" % (token_dir, t.split('.', 1)[0]))
+            except OSError:
+                pass
+##########################################################################
+
+##########################################################################
+def requeue_expired(queue_dir, lease_timeout):
+    """Puts the jobs whose leases expired back into the queue.
+
+    Parameters
+    ----------
+    queue_dir : str
+        Queue directory.
+    lease_timeout : float
+        Number of seconds after which a lease that was not renewed expires.
+
+    Returns
+    -------
+    int
+        Number of requeued jobs.
+    """
+
+    now = get_fs_time(queue_dir)
+    requeued = 0
+    for f in os.listdir("%s/running" % queue_dir):
+        try:
+            if now - os.path.getmtime("%s/running/%s" % (queue_dir, f)) < lease_timeout:
+                continue
+        except OSError:
+            continue
+        job = f.split('.', 1)[0]
+        try:
+            os.rename("%s/running/%s" % (queue_dir, f), "%s/pending/%s" % (queue_dir, job))
+        except OSError:
+            #Requeued by someone else, or renewed and finished in the meantime.
+            continue
+        release_token(queue_dir, job)
+        print("requeue %s (lease of %s expired)" % (job, f.split('.', 1)[1]))
+        requeued += 1
+
+    return requeued
+##########################################################################
+
+##########################################################################
+def read_cancelled(queue_dir, batch):
+    """Reads the cancelled patterns of the batch.
+
+    Parameters
+    ----------
+    queue_dir : str
+        Queue directory.
+    batch : str
+        Batch name.
+
+    Returns
+    -------
+    List[str]
+        Patterns.
+    """
+
+    try:
+        with open("%s/cancel/%s" % (queue_dir, batch), "r") as inf:
+            return [line.rstrip("\n") for line in inf if line.strip()]
+    except IOError:
+        return []
+##########################################################################
+
+##########################################################################
+class WorkQueue(Parallel):
+    """Issues the commands through a shared work queue, instead of spawning them,
+    and waits until all have been run by the workers. The interface is that of >>Parallel<<.
+
+    Parameters
+    ----------
+    queue_dir : str
+        Queue directory.
+    sleep_interval : int
+        Number of seconds to wait between two polls of the queue.
+    canceller : Optional[Callable[[float], List[str]]], default = None
+        See >>Parallel<<.
+    max_running : Optional[int], default = None
+        Maximum number of commands running at the same time over all workers.
+        Unlimited if not specified.
+    local_workers : Optional[int], default = 0
+        Number of jobs run in parallel by a worker started on this host for the batch
+        (see >>queue_worker.py<<). If 0, the commands are run only by external workers.
+    lease_timeout : Optional[float], default = 600
+        Number of seconds after which a lease that was not renewed expires.
+    """
+
+    #------------------------------------------------------------------------#
+    def __init__(self, queue_dir, sleep_interval, canceller = None, max_running = None,\
+                 local_workers = 0, lease_timeout = 600):
+        """Constructor of the WorkQueue class.
+        """
+
+        Parallel.__init__(self, max_running, sleep_interval, canceller)
+        self.queue_dir = os.path.abspath(queue_dir)
+        self.local_workers = local_workers
+        self.lease_timeout = lease_timeout
+        self.batch = "%010d_%s_%d" % (time.time(), host, os.getpid())
+        self.jobs = {}
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def enqueue(self):
+        """Writes the jobs of the command pool into the queue.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        init_dir(self.queue_dir)
+        if self.max_cpu is not None:
+            token_dir = "%s/tokens/%s" % (self.queue_dir, self.batch)
+            os.system("mkdir -p %s" % token_dir)
+            for k in range(self.max_cpu):
+                open("%s/%d" % (token_dir, k), "w").close()
+
+        cwd = os.getcwd()
+        for i, cmd in enumerate(self.cmds):
+            job = "%s_%06d" % (self.batch, i)
+            self.jobs[job] = cmd
+            write_json(self.queue_dir, "%s/pending/%s" % (self.queue_dir, job), {"cmd" : cmd, "cwd" : cwd})
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def cancel(self, pattern):
+        """Cancels all commands containing the pattern. The pending ones are
+        removed from the queue, while the workers terminate the running ones.
+
+        Parameters
+        ----------
+        pattern : str
+            Substring of the commands to cancel.
+
+        Returns
+        -------
+        int
+            Number of pending commands that were removed.
+        """
+
+        self.cancelled.add(pattern)
+        with open("%s/cancel/%s" % (self.queue_dir, self.batch), "a") as outf:
+            outf.write(pattern + "\n")
+
+        removed = 0
+        for job in sorted(self.jobs):
+            if not pattern in self.jobs[job]:
+                continue
+            claimed = "%s/tmp/%s" % (self.queue_dir, job)
+            try:
+                os.rename("%s/pending/%s" % (self.queue_dir, job), claimed)
+            except OSError:
+                #Running or done.
+                continue
+            os.remove(claimed)
+            write_json(self.queue_dir, "%s/done/%s" % (self.queue_dir, job), {"returncode" : None, "worker" : None,\
+                                                                             "runtime" : 0.0, "cancelled" : True})
+            removed += 1
+
+        return removed
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def run(self):
+        """Enqueues the initialized pool and waits until all jobs are done.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        self.enqueue()
+        workers = []
+        if self.local_workers:
+            workers.append(subprocess.Popen(["python", "-u", os.path.join(os.path.dirname(os.path.abspath(__file__)),\
+                                             "queue_worker.py"), "--queue_dir", self.queue_dir, "--slots",\
+                                             str(self.local_workers), "--batch", self.batch,\
+                                             "--lease_timeout", str(self.lease_timeout)]))
+
+        done = set()
+        while len(done) < len(self.jobs):
+            done = set([f for f in os.listdir("%s/done" % self.queue_dir) if f in self.jobs])
+            if len(done) == len(self.jobs):
+                break
+            requeue_expired(self.queue_dir, self.lease_timeout)
+            self.wait()
+
+        for worker in workers:
+            worker.wait()
+
+        outcomes = {}
+        for job in sorted(done):
+            filename = "%s/done/%s" % (self.queue_dir, job)
+            with open(filename, "r") as inf:
+                outcomes[job] = json.load(inf)
+            os.remove(filename)
+        os.system("rm -rf %s/tokens/%s %s/cancel/%s" % (self.queue_dir, self.batch, self.queue_dir, self.batch))
+
+        used = sorted(set([outcomes[job]["worker"] for job in outcomes if outcomes[job]["worker"] is not None]))
+        failed = len([job for job in outcomes if outcomes[job]["returncode"]])
+        print("%d jobs run by %d workers (%s), %d returned an error." % (len(outcomes), len(used), ' '.join(used), failed))
+    #------------------------------------------------------------------------#
+##########################################################################
+
+##########################################################################
+class Worker(object):
+    """Claims jobs from the queue and runs them.
+
+    Parameters
+    ----------
+    queue_dir : str
+        Queue directory.
+    slots : int
+        Number of jobs run in parallel.
+    poll_interval : Optional[float], default = 2
+        Number of seconds between two polls of the queue. The leases are renewed at every poll.
+    lease_timeout : Optional[float], default = 600
+        Number of seconds after which a lease that was not renewed expires.
+    batch : Optional[str], default = None
+        Serve only the jobs of this batch and exit once it is complete.
+    """
+
+    #------------------------------------------------------------------------#
+    def __init__(self, queue_dir, slots, poll_interval = 2, lease_timeout = 600, batch = None):
+        """Constructor of the Worker class.
+        """
+
+        self.queue_dir = os.path.abspath(queue_dir)
+        self.slots = slots
+        self.poll_interval = poll_interval
+        self.lease_timeout = lease_timeout
+        self.batch = batch
+        self.name = "%s-%d" % (host, os.getpid())
+        self.running = {}
+        #job -> (process, start time, command)
+
+        init_dir(self.queue_dir)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def get_lease(self, job):
+        """Returns the name of the lease file of the job.
+
+        Parameters
+        ----------
+        job : str
+            Job name.
+
+        Returns
+        -------
+        str
+            File name.
+        """
+
+        return "%s/running/%s.%s" % (self.queue_dir, job, self.name)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def claim(self):
+        """Claims the first pending job and starts it.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        bool
+            True if a job was claimed.
+        """
+
+        full = set()
+        #Batches without free tokens.
+        for job in sorted(os.listdir("%s/pending" % self.queue_dir)):
+            batch = get_batch(job)
+            if (self.batch is not None and batch != self.batch) or batch in full:
+                continue
+            if not take_token(self.queue_dir, job):
+                full.add(batch)
+                continue
+            pending = "%s/pending/%s" % (self.queue_dir, job)
+            try:
+                os.utime(pending, None)
+                #The fresh modification time is the initial lease, carried over by the rename.
+                os.rename(pending, self.get_lease(job))
+            except OSError:
+                #Claimed by another worker in the meantime.
+                release_token(self.queue_dir, job)
+                continue
+
+            with open(self.get_lease(job), "r") as inf:
+                desc = json.load(inf)
+            if any([pattern in desc["cmd"] for pattern in read_cancelled(self.queue_dir, get_batch(job))]):
+                self.finish(job, None, 0.0)
+                continue
+
+            print("%s %s" % (job, desc["cmd"]))
+            env = dict(os.environ)
+            env[worker_var] = self.name
+            proc = subprocess.Popen(desc["cmd"], shell = True, cwd = desc["cwd"], env = env, preexec_fn = os.setsid)
+            #A process group of its own, so that cancelling terminates the entire command.
+            self.running[job] = (proc, time.time(), desc["cmd"])
+
+            return True
+
+        return False
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def finish(self, job, returncode, runtime):
+        """Records the outcome of the job and releases it.
+
+        Parameters
+        ----------
+        job : str
+            Job name.
+        returncode : int
+            Return code (None if cancelled).
+        runtime : float
+            Runtime in seconds.
+
+        Returns
+        -------
+        None
+        """
+
+        write_json(self.queue_dir, "%s/done/%s" % (self.queue_dir, job),\
+                   {"returncode" : returncode, "worker" : self.name, "runtime" : runtime,\
+                    "cancelled" : returncode is None})
+        release_token(self.queue_dir, job)
+        try:
+            os.remove(self.get_lease(job))
+        except OSError:
+            pass
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def poll(self):
+        """Reaps the finished jobs, renews the leases of the running ones,
+        and terminates the cancelled and the lost ones.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        for job in sorted(self.running):
+            proc, start, cmd = self.running[job]
+            if proc.poll() is not None:
+                self.finish(job, proc.returncode, time.time() - start)
+                del self.running[job]
+                continue
+            lost = False
+            try:
+                os.utime(self.get_lease(job), None)
+            except OSError:
+                #Expired and requeued, e.g., after the host was unreachable.
+                lost = True
+            cancelled = any([pattern in cmd for pattern in read_cancelled(self.queue_dir, get_batch(job))])
+            if lost or cancelled:
+                try:
+                    os.killpg(proc.pid, signal.SIGTERM)
+                except OSError:
+                    pass
+                proc.wait()
+                if lost:
+                    print("lost %s" % job)
+                else:
+                    self.finish(job, None, time.time() - start)
+                del self.running[job]
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def is_batch_complete(self):
+        """Checks if all jobs of the served batch are done.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        bool
+            True if no job of the batch is pending or running.
+        """
+
+        for d in ("pending", "running"):
+            if any([get_batch(f) == self.batch for f in os.listdir("%s/%s" % (self.queue_dir, d))]):
+                return False
+
+        return True
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def run(self, idle_timeout = None):
+        """Serves the queue.
+
+        Parameters
+        ----------
+        idle_timeout : Optional[float], default = None
+            Number of seconds without any job after which the worker exits.
+            Serves forever if not specified, unless restricted to a batch.
+
+        Returns
+        -------
+        None
+        """
+
+        idle_since = time.time()
+        while True:
+            self.poll()
+            requeue_expired(self.queue_dir, self.lease_timeout)
+            while len(self.running) < self.slots and self.claim():
+                pass
+            if self.running:
+                idle_since = time.time()
+            elif self.batch is not None and self.is_batch_complete():
+                break
+            elif idle_timeout is not None and time.time() - idle_since > idle_timeout:
+                break
+            time.sleep(self.poll_interval)
+    #------------------------------------------------------------------------#
+
+    #------------------------------------------------------------------------#
+    def stop(self):
+        """Terminates the running jobs and puts them back into the queue.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        for job in sorted(self.running):
+            try:
+                os.killpg(self.running[job][0].pid, signal.SIGTERM)
+            except OSError:
+                pass
+            try:
+                os.rename(self.get_lease(job), "%s/pending/%s" % (self.queue_dir, job))
+            except OSError:
+                pass
+            release_token(self.queue_dir, job)
+        self.running = {}
+    #------------------------------------------------------------------------#
+##########################################################################